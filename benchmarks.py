@@ -0,0 +1,421 @@
+# Benchmarks de linha de comando (--bench, --bench-conexao, --bench-render e
+# --bench-ndjson). O main() de ollama_gui.py só os importa quando pedidos
+import io
+import os
+import sys
+import json
+import http.client
+import socket
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from threading import Thread
+from typing import Optional, List
+
+from PySide6.QtCore import QTimer
+from PySide6.QtWidgets import QApplication
+
+from ollama_gui import (
+    TIMEOUT_CONEXAO, ClienteHTTP, DecodificadorNDJSON, ErroConexaoError, ErroServidorError, Geracao,
+    InterfaceOllama, Mensagem, MetricasDesempenho, orjson, transmitir_chat
+)
+from simulador_ollama import ManipuladorOllamaSimulado
+
+
+# Compara o custo de abrir uma conexão nova por requisição (urlopen) com o
+# reuso de conexões do ClienteHTTP
+def benchmark_conexao(api_url: str, repeticoes: int = 20) -> int:
+    url = urllib.parse.urljoin(api_url, "/api/tags")
+
+    def medir(requisitar):
+        tempos = []
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            requisitar()
+            tempos.append(time.perf_counter() - inicio)
+        return tempos
+
+    def sem_pool():
+        with urllib.request.urlopen(url, timeout=TIMEOUT_CONEXAO) as resposta:
+            resposta.read()
+
+    cliente = ClienteHTTP()
+
+    def com_pool():
+        with cliente.requisitar(url) as resposta:
+            resposta.read()
+
+    try:
+        com_pool()  # Aquece a conexão do pool
+        tempos_sem = medir(sem_pool)
+        tempos_com = medir(com_pool)
+    except (urllib.error.URLError, socket.timeout) as e:
+        print(f"Falha ao conectar em {api_url}: {e}")
+        return 1
+    finally:
+        cliente.fechar()
+
+    media_sem = sum(tempos_sem) / len(tempos_sem) * 1000
+    media_com = sum(tempos_com) / len(tempos_com) * 1000
+    print(f"Host: {api_url} ({repeticoes} requisições GET /api/tags)")
+    print(f"Conexão nova por requisição: {media_sem:8.2f} ms/req")
+    print(f"Conexão persistente (pool):  {media_com:8.2f} ms/req")
+    print(f"Economia por requisição:     {media_sem - media_com:8.2f} ms")
+    return 0
+
+
+PROMPTS_BENCHMARK = (
+    "Explique em um parágrafo o que é um modelo de linguagem.",
+    "Escreva uma função Python que verifica se um número é primo.",
+    "Liste cinco capitais europeias e um fato sobre cada uma.",
+)
+
+
+def percentil(valores: List[float], p: float) -> Optional[float]:
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    posicao = (len(ordenados) - 1) * p / 100
+    base = int(posicao)
+    fracao = posicao - base
+    if base + 1 < len(ordenados):
+        return ordenados[base] + (ordenados[base + 1] - ordenados[base]) * fracao
+    return ordenados[base]
+
+
+def medir_chat(cliente: ClienteHTTP, api_url: str, modelo: str, prompt: str) -> dict:
+    geracao = Geracao()
+    geracao.modelo = modelo
+    inicio = time.perf_counter()
+    trechos = 0
+    try:
+        for parte in transmitir_chat(cliente, api_url, modelo, [{"role": "user", "content": prompt}], geracao):
+            trechos += 1 if parte else 0
+    except (ErroConexaoError, ErroServidorError) as e:
+        return {"erro": str(e)}
+    total = time.perf_counter() - inicio
+    metricas = MetricasDesempenho.derivar(geracao.metricas)
+    if "tokens_s" not in metricas and "ttft" in metricas and total > metricas["ttft"]:
+        # Servidor sem estatísticas: aproxima tokens por trechos recebidos
+        metricas["tokens_s"] = trechos / (total - metricas["ttft"])
+    metricas["total"] = total
+    return metricas
+
+
+# Executa os prompts contra cada modelo, sem interface gráfica, usando o mesmo
+# caminho de requisição e leitura do stream que o chat
+def executar_benchmark(api_url: str, modelos: List[str], prompts: List[str], iteracoes: int = 3,
+                       concorrencia: int = 1, aquecimento: int = 1) -> dict:
+    from concurrent.futures import ThreadPoolExecutor
+
+    cliente = ClienteHTTP(max_ociosas_por_host=max(4, concorrencia))
+    resultados = {}
+    try:
+        for modelo in modelos:
+            for _ in range(aquecimento):
+                medir_chat(cliente, api_url, modelo, prompts[0])
+
+            tarefas = [prompt for _ in range(iteracoes) for prompt in prompts]
+            inicio = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=concorrencia) as executor:
+                medicoes = list(executor.map(lambda prompt: medir_chat(cliente, api_url, modelo, prompt), tarefas))
+            duracao = time.perf_counter() - inicio
+
+            validas = [m for m in medicoes if "erro" not in m]
+            resumo = {
+                "requisicoes": len(medicoes),
+                "erros": len(medicoes) - len(validas),
+                "duracao_s": duracao,
+                "tokens_gerados": sum(m.get("eval_count", 0) for m in validas),
+            }
+            for campo in ("ttft", "tokens_s", "total"):
+                valores = [m[campo] for m in validas if m.get(campo) is not None]
+                for p in (50, 95, 99):
+                    resumo[f"{campo}_p{p}"] = percentil(valores, p)
+            resumo["tokens_s_agregado"] = resumo["tokens_gerados"] / duracao if duracao else None
+            resultados[modelo] = resumo
+    finally:
+        cliente.fechar()
+
+    return {
+        "host": api_url,
+        "iteracoes": iteracoes,
+        "concorrencia": concorrencia,
+        "prompts": len(prompts),
+        "modelos": resultados,
+    }
+
+
+def formatar_tabela_benchmark(relatorio: dict) -> str:
+    colunas = [("ttft", "1º token (s)", "{:.3f}"), ("tokens_s", "tok/s", "{:.1f}"), ("total", "total (s)", "{:.2f}")]
+    cabecalho = f"{'Modelo':<28} {'Req':>4} {'Erros':>5}"
+    for _, nome, _ in colunas:
+        cabecalho += f" {nome + ' p50/p95/p99':>30}"
+    linhas = [cabecalho, "-" * len(cabecalho)]
+    for modelo, resumo in relatorio["modelos"].items():
+        linha = f"{modelo[:28]:<28} {resumo['requisicoes']:>4} {resumo['erros']:>5}"
+        for campo, _, formato in colunas:
+            valores = [resumo[f"{campo}_p{p}"] for p in (50, 95, 99)]
+            texto = "/".join("-" if v is None else formato.format(v) for v in valores)
+            linha += f" {texto:>30}"
+        linhas.append(linha)
+    return "\n".join(linhas)
+
+
+# Limites padrão do benchmark de renderização; acima deles o benchmark falha
+LIMITES_RENDERIZACAO = {
+    "descarga_p95_ms": 16.0,
+    "travamento_max_ms": 250.0,
+    "rss_pico_mb": 1024.0,
+}
+# Intervalo sem eventos processados considerado travamento da interface
+LIMIAR_TRAVAMENTO_MS = 50.0
+
+
+def rss_pico_mb() -> Optional[float]:
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux informa em KiB, macOS em bytes
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _alimentar_cenario(janela, cenario: str, escala: float, id_geracao: int):
+    buffer = janela.aba.buffer_chat
+
+    def resposta(trechos, pausa_a_cada: int = 1000):
+        mensagem = Mensagem("assistant", tipo="modelo", modelo="benchmark")
+        buffer.adicionar(mensagem, "nome_modelo", id_geracao)
+        for i, trecho in enumerate(trechos, 1):
+            buffer.adicionar(trecho, "modelo", id_geracao)
+            if i % pausa_a_cada == 0:
+                time.sleep(0.001)  # Deixa o thread da interface competir, como num stream real
+        buffer.adicionar(mensagem, "concluida", id_geracao)
+
+    if cenario == "tokens":
+        resposta(("tok " for _ in range(int(100_000 * escala))))
+    elif cenario == "codigo":
+        linha = "    resultado = [valor * 2 for valor in dados if valor % 3 == 0]  # comentário\n"
+        for bloco in range(max(1, int(20 * escala))):
+            buffer.adicionar(Mensagem("user", f"Gere o bloco {bloco}", "usuario"), "usuario", id_geracao)
+            texto = "```python\ndef funcao():\n" + linha * 300 + "```\n"
+            resposta((texto[i:i + 5] for i in range(0, len(texto), 5)))
+    elif cenario == "turnos":
+        for turno in range(int(3000 * escala)):
+            buffer.adicionar(Mensagem("user", f"Pergunta {turno}", "usuario"), "usuario", id_geracao)
+            resposta((f"palavra{i} " for i in range(50)), pausa_a_cada=50)
+
+
+# Alimenta a superfície do chat com streams sintéticos sob a plataforma
+# offscreen do Qt e mede o custo de cada descarga, travamentos do loop de
+# eventos, memória e tamanho dos documentos renderizados
+def executar_benchmark_render(cenarios: List[str], escala: float = 1.0) -> dict:
+    app = QApplication.instance() or QApplication([sys.argv[0]])
+    janela = InterfaceOllama(caminho_conversas=None)  # O benchmark não grava conversas
+    janela.resize(900, 700)
+    janela.show()
+    app.processEvents()
+
+    resultados = {}
+    for cenario in cenarios:
+        janela.limpar_chat()
+        app.processEvents()
+        aba = janela.aba
+
+        duracoes = []
+        renderizar_original = aba.buffer_chat.renderizar
+
+        def renderizar_medindo(segmentos):
+            inicio = time.perf_counter()
+            renderizar_original(segmentos)
+            duracoes.append((time.perf_counter() - inicio) * 1000)
+        aba.buffer_chat.renderizar = renderizar_medindo
+
+        travamentos = []
+        ultimo_tique = [time.perf_counter()]
+
+        def tique():
+            agora = time.perf_counter()
+            intervalo = (agora - ultimo_tique[0]) * 1000
+            if intervalo > LIMIAR_TRAVAMENTO_MS:
+                travamentos.append(intervalo)
+            ultimo_tique[0] = agora
+        monitor = QTimer()
+        monitor.setInterval(5)
+        monitor.timeout.connect(tique)
+
+        geracao = Geracao()
+        aba.geracao_atual = geracao
+        aba.buffer_chat.geracao_ativa = geracao.id
+        alimentador = Thread(target=_alimentar_cenario, args=(janela, cenario, escala, geracao.id), daemon=True)
+
+        inicio = time.perf_counter()
+        monitor.start()
+        alimentador.start()
+        while alimentador.is_alive():
+            app.processEvents()
+        aba.buffer_chat.descarregar()
+        app.processEvents()
+        duracao = time.perf_counter() - inicio
+        monitor.stop()
+        aba.buffer_chat.renderizar = renderizar_original
+
+        documentos = aba.delegado_chat.documentos_em_cache()
+        resultados[cenario] = {
+            "duracao_s": duracao,
+            "descargas": len(duracoes),
+            "descarga_p50_ms": percentil(duracoes, 50),
+            "descarga_p95_ms": percentil(duracoes, 95),
+            "descarga_max_ms": max(duracoes) if duracoes else None,
+            "travamentos": len(travamentos),
+            "travamento_max_ms": max(travamentos) if travamentos else 0.0,
+            "rss_pico_mb": rss_pico_mb(),
+            "linhas_chat": aba.modelo_chat.rowCount(),
+            "documentos_em_cache": len(documentos),
+            "caracteres_em_cache": sum(doc.characterCount() for doc in documentos),
+        }
+
+    janela.close()
+    return {"escala": escala, "plataforma": QApplication.platformName(), "cenarios": resultados}
+
+
+# Compara o relatório com os limites absolutos e, se houver, com uma linha de
+# base anterior (piora acima da tolerância conta como regressão)
+def verificar_regressoes(relatorio: dict, limites: dict, linha_base: Optional[dict] = None,
+                         tolerancia: float = 0.25) -> List[str]:
+    falhas = []
+    for cenario, metricas in relatorio["cenarios"].items():
+        for campo, limite in limites.items():
+            valor = metricas.get(campo)
+            if valor is not None and valor > limite:
+                falhas.append(f"{cenario}: {campo} = {valor:.1f} acima do limite {limite:.1f}")
+        base = (linha_base or {}).get("cenarios", {}).get(cenario, {})
+        for campo in limites:
+            anterior, valor = base.get(campo), metricas.get(campo)
+            if anterior and valor is not None and valor > anterior * (1 + tolerancia):
+                falhas.append(f"{cenario}: {campo} = {valor:.1f} piorou mais de "
+                              f"{tolerancia:.0%} sobre a linha de base ({anterior:.1f})")
+    return falhas
+
+
+def main_benchmark_render(args) -> int:
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    cenarios = [c.strip() for c in args.cenarios.split(",") if c.strip()]
+    relatorio = executar_benchmark_render(cenarios, args.escala)
+
+    for cenario, m in relatorio["cenarios"].items():
+        print(f"{cenario}: {m['descargas']} descargas em {m['duracao_s']:.2f} s | "
+              f"descarga p50/p95/max {m['descarga_p50_ms'] or 0:.2f}/{m['descarga_p95_ms'] or 0:.2f}/"
+              f"{m['descarga_max_ms'] or 0:.2f} ms | travamentos {m['travamentos']} "
+              f"(max {m['travamento_max_ms']:.0f} ms) | RSS pico {m['rss_pico_mb'] or 0:.0f} MB | "
+              f"{m['linhas_chat']} linhas, {m['documentos_em_cache']} documentos, "
+              f"{m['caracteres_em_cache']} caracteres em cache")
+
+    if args.arquivo_json:
+        with open(args.arquivo_json, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+
+    linha_base = None
+    if args.linha_base:
+        with open(args.linha_base, encoding="utf-8") as arquivo:
+            linha_base = json.load(arquivo)
+    falhas = verificar_regressoes(relatorio, LIMITES_RENDERIZACAO, linha_base, args.tolerancia)
+    for falha in falhas:
+        print(f"REGRESSÃO: {falha}")
+    return 1 if falhas else 0
+
+
+def gerar_stream_chat(registros: int = 100_000) -> bytes:
+    palavras = ManipuladorOllamaSimulado.PALAVRAS
+    linhas = []
+    for i in range(registros):
+        linhas.append(json.dumps({
+            "model": "simulado:7b", "created_at": "2024-01-01T00:00:00.000000Z",
+            "message": {"role": "assistant", "content": palavras[i % len(palavras)] + " "},
+            "done": False,
+        }))
+    linhas.append(json.dumps({"model": "simulado:7b", "message": {"role": "assistant", "content": ""},
+                              "done": True, "eval_count": registros, "eval_duration": 10 ** 9}))
+    return ("\n".join(linhas) + "\n").encode("utf-8")
+
+
+# Vazão de decodificação de um stream gravado, reproduzido por um
+# http.client.HTTPResponse real com codificação chunked: leitura linha a
+# linha (como antes) contra o DecodificadorNDJSON, com e sem orjson.
+# "registros_por_trecho" = 1 imita o chat; valores altos imitam o pull.
+def benchmark_ndjson(dados: bytes, repeticoes: int = 3, registros_por_trecho: int = 1) -> dict:
+    linhas = dados.splitlines(keepends=True)
+    partes = [b"HTTP/1.1 200 OK\r\nContent-Type: application/x-ndjson\r\nTransfer-Encoding: chunked\r\n\r\n"]
+    for i in range(0, len(linhas), registros_por_trecho):
+        trecho = b"".join(linhas[i:i + registros_por_trecho])
+        partes.append(b"%x\r\n%s\r\n" % (len(trecho), trecho))
+    partes.append(b"0\r\n\r\n")
+    bruto = b"".join(partes)
+
+    class SocketGravado:
+        def makefile(self, modo):
+            return io.BufferedReader(io.BytesIO(bruto))
+
+    def resposta():
+        r = http.client.HTTPResponse(SocketGravado())
+        r.begin()
+        return r
+
+    def linha_a_linha():
+        return sum(1 for linha in resposta() if linha.strip() and json.loads(linha.decode("utf-8")) is not None)
+
+    def decodificador(usar_orjson):
+        return lambda: sum(1 for _ in DecodificadorNDJSON(resposta(), usar_orjson=usar_orjson).eventos())
+
+    metodos = [("linha_a_linha", linha_a_linha), ("decodificador", decodificador(False))]
+    if orjson is not None:
+        metodos.append(("decodificador_orjson", decodificador(True)))
+
+    registros = sum(1 for linha in linhas if linha.strip())
+    resultados = {}
+    for nome, funcao in metodos:
+        melhor = float("inf")
+        for _ in range(repeticoes):
+            inicio = time.perf_counter()
+            funcao()
+            melhor = min(melhor, time.perf_counter() - inicio)
+        resultados[nome] = {
+            "segundos": melhor,
+            "mb_s": len(dados) / melhor / 1e6,
+            "registros_s": registros / melhor,
+        }
+    return {"bytes": len(dados), "registros": registros,
+            "registros_por_trecho": registros_por_trecho, "metodos": resultados}
+
+
+def main_benchmark(args) -> int:
+    prompts = list(args.prompt)
+    if args.prompts:
+        with open(args.prompts, encoding="utf-8") as arquivo:
+            prompts += [linha.strip() for linha in arquivo if linha.strip()]
+    prompts = prompts or list(PROMPTS_BENCHMARK)
+
+    modelos = [m.strip() for m in args.modelos.split(",") if m.strip()]
+    try:
+        if not modelos:
+            with ClienteHTTP().requisitar(urllib.parse.urljoin(args.host, "/api/tags")) as resposta:
+                modelos = [modelo["name"] for modelo in json.load(resposta).get("models", [])]
+    except (urllib.error.URLError, socket.timeout) as e:
+        print(f"Falha ao conectar em {args.host}: {e}")
+        return 1
+    if not modelos:
+        print("Nenhum modelo encontrado!")
+        return 1
+
+    relatorio = executar_benchmark(args.host, modelos, prompts, max(1, args.iteracoes),
+                                   max(1, args.concorrencia), max(0, args.aquecimento))
+    print(formatar_tabela_benchmark(relatorio))
+    if args.arquivo_json == "-":
+        print(json.dumps(relatorio, indent=2, ensure_ascii=False))
+    elif args.arquivo_json:
+        with open(args.arquivo_json, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, indent=2, ensure_ascii=False)
+    return 1 if any(r["erros"] for r in relatorio["modelos"].values()) else 0
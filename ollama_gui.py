@@ -1,82 +1,3124 @@
+import time
+
+# Instante em que o módulo começou a carregar, base das medidas de --tempo-inicio
+_T_INICIO = time.perf_counter()
+
+import io
+import os
 import sys
 import json
-import time
-import pprint
+import argparse
+import itertools
+import http.client
+import random
 import platform
-import webbrowser
 import queue
 import urllib.error
 import urllib.parse
-import urllib.request
 import socket
-import traceback
 import html
-from threading import Thread
-from typing import Optional, List, Generator, Tuple, Any
+import hashlib
+import math
+import re
+import select
+import sqlite3
+import statistics
+import tempfile
+# webbrowser é importado onde é usado: serve a um recurso secundário e
+# atrasaria a abertura da janela
+from array import array
+from collections import OrderedDict, deque
+from datetime import datetime
+from threading import Thread, Lock, Event, Condition, current_thread
+from typing import Optional, List, Generator, Tuple, Any, Callable
+
+try:
+    import orjson  # Opcional: decodificação de JSON mais rápida
+except ImportError:
+    orjson = None
+
+from PySide6.QtWidgets import (
+    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
+    QTextEdit, QLineEdit, QComboBox, QPushButton, QProgressBar, QLabel,
+    QMessageBox, QListWidget, QMenu, QDialog, QListWidgetItem,
+    QFrame, QSizePolicy, QMenuBar, QScrollBar, QStyleFactory, QListView,
+    QStyledItemDelegate, QAbstractItemView, QInputDialog, QToolButton, QTableWidget,
+    QTableWidgetItem, QHeaderView, QPlainTextEdit, QSplitter, QTabWidget, QCheckBox
+)
+from PySide6.QtGui import (QTextCursor, QFont, QAction, QKeyEvent, QTextCharFormat, 
+                          QColor, QPalette, QFontMetrics, QIcon, QTextDocument,
+                          QFontDatabase, QAbstractTextDocumentLayout, QKeySequence)
+from PySide6.QtCore import (Qt, QThread, Signal, Slot, QObject, QSize, QEvent, QUrl, QTimer,
+                            QAbstractListModel, QModelIndex, QRectF)
+
+__version__ = "1.40.0"
+
+# Classe personalizada para entrada de texto
+class EntradaUsuario(QTextEdit):
+    enterPressed = Signal()
+    
+    def keyPressEvent(self, event: QKeyEvent):
+        if event.key() == Qt.Key_Return and not event.modifiers() & Qt.ShiftModifier:
+            self.enterPressed.emit()
+            event.accept()
+        elif event.key() == Qt.Key_Return and event.modifiers() & Qt.ShiftModifier:
+            self.insertPlainText("\n")
+        else:
+            super().keyPressEvent(event)
+
+# Tempos de timeout configuráveis
+TIMEOUT_CONEXAO = 15
+TIMEOUT_CONVERSA = 300
+TIMEOUT_DOWNLOAD = 0
+
+# Orçamento de tokens do histórico enviado a cada requisição e a parte dele
+# reservada para o resumo das mensagens antigas, quando ativado
+ORCAMENTO_CONTEXTO_TOKENS = 4096
+FRACAO_RESUMO_CONTEXTO = 0.25
+
+# Tempo que o Ollama mantém o modelo na memória após cada requisição
+# (duração no formato do Ollama, ex.: "5m", "1h"; -1 = sempre; 0 = descarregar)
+KEEP_ALIVE_PADRAO = "5m"
+
+# Campos de tempo do último trecho do /api/chat (durações em nanossegundos)
+CAMPOS_ESTATISTICAS = ("eval_count", "eval_duration", "prompt_eval_count",
+                       "prompt_eval_duration", "load_duration", "total_duration")
+
+# Respostas guardadas por modelo no histórico de desempenho
+HISTORICO_DESEMPENHO = 50
+
+# Intervalo mínimo entre descargas do buffer de renderização (~1 quadro a 60 Hz)
+INTERVALO_RENDERIZACAO_MS = 16
+
+# Tamanho máximo (caracteres) do bloco de texto ainda aberto de uma resposta;
+# acima disso ele é congelado numa quebra de linha ou espaço, para que cada
+# trecho recebido não reprocesse um parágrafo inteiro
+LIMITE_BLOCO_ABERTO = 2000
+
+# Blocos de código realçados mantidos em cache (pelo hash do conteúdo)
+CACHE_REALCE = 500
+
+# Mensagens mantidas na lista do chat. As mais antigas vão, em lotes, para um
+# arquivo em disco e voltam uma página por vez quando o usuário rola até o topo
+MAX_MENSAGENS_CHAT = 500
+LOTE_ARQUIVO_CHAT = 50
+
+# Intervalo mínimo entre atualizações do progresso de download (segundos) e
+# janela usada para calcular a velocidade média
+INTERVALO_PROGRESSO_DOWNLOAD = 0.25
+JANELA_VELOCIDADE_DOWNLOAD = 5.0
+
+# Downloads de modelos em paralelo, tentativas por modelo e espera antes da
+# segunda tentativa (dobra a cada nova falha)
+DOWNLOADS_SIMULTANEOS = 2
+TENTATIVAS_DOWNLOAD = 4
+ESPERA_TENTATIVA_DOWNLOAD = 2.0
+
+# Gerações de resposta simultâneas por host, somando todas as abas. O Ollama
+# atende OLLAMA_NUM_PARALLEL requisições por modelo e segura as outras sem
+# dar notícia; acima deste limite elas esperam no cliente, na ordem de
+# chegada, onde podem ser canceladas
+GERACOES_POR_HOST = 2
+
+# Com mais de um host, intervalo entre as sondagens de saúde e de modelos de
+# cada um (segundos) e tempo máximo de cada sondagem. Uma falha numa
+# requisição antecipa a sondagem seguinte
+INTERVALO_SONDAGEM_HOSTS = 15.0
+TIMEOUT_SONDAGEM = 5
+
+# Validade da lista de modelos em memória (segundos) e local do instantâneo
+# em disco usado para preencher o seletor antes da rede responder
+TTL_CATALOGO = 30.0
+DIRETORIO_DADOS = os.path.join(os.path.expanduser("~"), ".ollama-gui")
+ARQUIVO_CATALOGO = os.path.join(DIRETORIO_DADOS, "modelos.json")
+
+# Banco das conversas, intervalo em que as gravações são juntadas numa única
+# transação (segundos) e sessões carregadas por página na barra lateral
+ARQUIVO_CONVERSAS = os.path.join(DIRETORIO_DADOS, "conversas.db")
+INTERVALO_GRAVACAO = 0.5
+PAGINA_SESSOES = 50
+
+# Resultados mostrados pela busca nas conversas, ocorrências mais recentes
+# ordenadas por relevância (termos comuns não pontuam o banco inteiro) e
+# espera após a digitação antes de consultar (milissegundos)
+LIMITE_RESULTADOS_BUSCA = 50
+CANDIDATOS_BUSCA = 2000
+ATRASO_BUSCA_MS = 150
+
+# Consulta dos modelos carregados (/api/ps) no gerenciamento: volta ao
+# intervalo mínimo quando algo muda e dobra até o máximo enquanto nada muda
+# (segundos)
+INTERVALO_MINIMO_MONITOR = 1.0
+INTERVALO_MAXIMO_MONITOR = 10.0
+
+# Cache de respostas determinísticas (temperature 0 ou seed fixa): respostas
+# mantidas em memória e tamanho máximo do arquivo em disco (bytes)
+ARQUIVO_CACHE_RESPOSTAS = os.path.join(DIRETORIO_DADOS, "respostas.db")
+CACHE_RESPOSTAS_MEMORIA = 100
+CACHE_RESPOSTAS_DISCO = 50 * 1000 * 1000
+
+# Trechos das mensagens de erro do /api/pull causadas por falhas de rede
+ERROS_TRANSITORIOS_PULL = ("timeout", "connection", "max retries", "eof", "temporar")
+
+class ModeloNaoEncontradoError(Exception):
+    pass
+
+class ErroConexaoError(Exception):
+    pass
+
+class ErroServidorError(Exception):
+    pass
+
+# Falha de transporte (conexão recusada ou derrubada, tempo esgotado,
+# resposta cortada): o host pode estar fora do ar, ao contrário de erros
+# HTTP ou enviados pelo servidor no stream
+class ErroTransporteError(ErroConexaoError):
+    pass
+
+class WorkerSignals(QObject):
+    update_log = Signal(str, bool)
+    update_tab_state = Signal(int, int, str)  # (id da aba, id da geração, estado)
+    enable_button = Signal(str, bool)
+    update_model_combo = Signal(list)
+    show_error = Signal(str)
+    update_model_list = Signal(list)
+    update_status = Signal(str)
+    update_model_details = Signal(str, dict)  # (modelo, detalhes do /api/show)
+    update_hosts = Signal()  # Saúde ou modelos de algum host do pool mudaram
+    update_cache = Signal()  # Acertos/faltas do cache de respostas mudaram
+    update_search_results = Signal(int, list)  # (número da busca, resultados)
+
+# Resposta de uma requisição feita pelo ClienteHTTP. Ao ser fechada, devolve a
+# conexão ao pool se o corpo foi lido por completo e o servidor mantém keep-alive
+# Pode ser chamado de outra thread: desbloqueia a escrita ou leitura em
+# andamento (inclusive a espera pelos cabeçalhos) e faz o servidor perceber
+# a desconexão
+def abortar_conexao(conexao: http.client.HTTPConnection):
+    sock = conexao.sock
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+
+class RespostaHTTP:
+    def __init__(self, cliente, chave, conexao, resposta, tempo_conexao: float, geracao=None):
+        self.cliente = cliente
+        self.chave = chave
+        self.conexao = conexao
+        self.geracao = geracao  # Geração que pode abortar a conexão
+        self.resposta = resposta
+        self.status = resposta.status
+        self.reason = resposta.reason
+        self.headers = resposta.headers
+        self.tempo_conexao = tempo_conexao
+        self._fechada = False
+
+    def read(self, n: Optional[int] = None) -> bytes:
+        return self.resposta.read(n)
+
+    def read1(self, n: int = -1) -> bytes:
+        return self.resposta.read1(n)
+
+    def readline(self, limite: int = -1) -> bytes:
+        return self.resposta.readline(limite)
+
+    def __iter__(self):
+        return iter(self.resposta)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def abortar(self):
+        abortar_conexao(self.conexao)
+
+    def close(self):
+        if self._fechada:
+            return
+        self._fechada = True
+        # A conexão pode voltar ao pool: cancelar a geração não a derruba mais
+        if self.geracao is not None:
+            self.geracao.desvincular(self.conexao)
+        if self.resposta.isclosed() and not self.resposta.will_close:
+            self.cliente._devolver(self.chave, self.conexao)
+        else:
+            self.resposta.close()
+            self.conexao.close()
+
+
+# Cliente HTTP com conexões persistentes (keep-alive), um pool por host,
+# compartilhado entre as threads da aplicação
+class ClienteHTTP:
+    # Métodos que podem ser repetidos mesmo depois de enviados: uma repetição
+    # não tem efeito além do da primeira requisição
+    METODOS_IDEMPOTENTES = ("GET", "HEAD")
+
+    def __init__(self, max_ociosas_por_host: int = 4):
+        self.max_ociosas_por_host = max_ociosas_por_host
+        self._pools = {}
+        self._trava = Lock()
+
+    def _chave(self, url: str) -> Tuple[str, str, int]:
+        partes = urllib.parse.urlsplit(url)
+        esquema = partes.scheme or "http"
+        porta = partes.port or (443 if esquema == "https" else 80)
+        return esquema, partes.hostname or "127.0.0.1", porta
+
+    def _obter_conexao(self, chave, timeout, reutilizar: bool = True) -> Tuple[http.client.HTTPConnection, bool]:
+        if reutilizar:
+            with self._trava:
+                ociosas = self._pools.get(chave) or []
+                while ociosas:
+                    conexao = ociosas.pop()
+                    if not self._encerrada(conexao):
+                        return conexao, True
+                    conexao.close()
+
+        esquema, host, porta = chave
+        if esquema == "https":
+            return http.client.HTTPSConnection(host, porta, timeout=timeout), False
+        return http.client.HTTPConnection(host, porta, timeout=timeout), False
+
+    # Conexão ociosa que o servidor já fechou: sem resposta pendente, o socket
+    # só fica legível com o fim da conexão
+    @staticmethod
+    def _encerrada(conexao: http.client.HTTPConnection) -> bool:
+        if conexao.sock is None:
+            return True
+        try:
+            legivel, _, _ = select.select([conexao.sock], [], [], 0)
+        except (OSError, ValueError):
+            return True
+        return bool(legivel)
+
+    def _devolver(self, chave, conexao: http.client.HTTPConnection):
+        with self._trava:
+            ociosas = self._pools.setdefault(chave, [])
+            if len(ociosas) < self.max_ociosas_por_host:
+                ociosas.append(conexao)
+                return
+        conexao.close()
+
+    def fechar(self):
+        with self._trava:
+            pools, self._pools = self._pools, {}
+        for ociosas in pools.values():
+            for conexao in ociosas:
+                conexao.close()
+
+    # Erros seguem o padrão do urllib (HTTPError/URLError/socket.timeout) para
+    # que o tratamento existente continue valendo
+    # Com "geracao", a conexão fica vinculada a ela desde antes do envio:
+    # cancelar a geração derruba a conexão mesmo enquanto o servidor ainda
+    # carrega o modelo e não mandou os cabeçalhos
+    def requisitar(self, url: str, dados: Optional[bytes] = None, metodo: Optional[str] = None,
+                   headers: Optional[dict] = None, timeout: Optional[float] = TIMEOUT_CONEXAO,
+                   geracao=None) -> RespostaHTTP:
+        metodo = metodo or ("POST" if dados is not None else "GET")
+        timeout = timeout or None  # 0 significa sem limite
+        partes = urllib.parse.urlsplit(url)
+        caminho = (partes.path or "/") + (f"?{partes.query}" if partes.query else "")
+        cabecalhos = {"Connection": "keep-alive"}
+        if dados is not None:
+            cabecalhos["Content-Type"] = "application/json"
+        cabecalhos.update(headers or {})
+        chave = self._chave(url)
+
+        for tentativa in range(2):
+            conexao, reutilizada = self._obter_conexao(chave, timeout, reutilizar=tentativa == 0)
+            tempo_conexao = 0.0
+            enviada = False
+            try:
+                if conexao.sock is None:
+                    inicio = time.perf_counter()
+                    conexao.connect()
+                    tempo_conexao = time.perf_counter() - inicio
+                    conexao.sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                conexao.sock.settimeout(timeout)
+                if geracao is not None:
+                    geracao.vincular(conexao)
+                conexao.request(metodo, caminho, body=dados, headers=cabecalhos)
+                enviada = True
+                resposta = conexao.getresponse()
+                break
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                conexao.close()
+                # Conexão ociosa encerrada pelo servidor: tenta uma vez com uma nova
+                # (as outras ociosas do mesmo host provavelmente também caíram).
+                # Depois do envio o servidor pode ter recebido a requisição, então
+                # só os métodos idempotentes são repetidos
+                repetir = not enviada or metodo in self.METODOS_IDEMPOTENTES
+                if (reutilizada and tentativa == 0 and repetir
+                        and not (geracao is not None and geracao.cancelada)):
+                    continue
+                raise urllib.error.URLError(e) from e
+            except socket.timeout:
+                conexao.close()
+                raise
+            except (OSError, http.client.HTTPException) as e:
+                conexao.close()
+                raise urllib.error.URLError(e) from e
+
+        resposta_http = RespostaHTTP(self, chave, conexao, resposta, tempo_conexao, geracao)
+        if resposta.status >= 400:
+            corpo = resposta.read()
+            resposta_http.close()
+            raise urllib.error.HTTPError(url, resposta.status, resposta.reason,
+                                         resposta.headers, io.BytesIO(corpo))
+        return resposta_http
+
+
+# Eventos produzidos pelo DecodificadorNDJSON
+class EventoConteudo:
+    __slots__ = ("texto",)
+
+    def __init__(self, texto: str):
+        self.texto = texto
+
+
+class EventoConcluido:
+    __slots__ = ("estatisticas",)
+
+    def __init__(self, estatisticas: dict):
+        self.estatisticas = estatisticas
+
+
+class EventoErro:
+    __slots__ = ("mensagem",)
+
+    def __init__(self, mensagem: str):
+        self.mensagem = mensagem
+
+
+class EventoStatus:
+    __slots__ = ("status", "digest", "total", "completed")
+
+    def __init__(self, status: str, digest: Optional[str] = None, total: Optional[int] = None,
+                 completed: Optional[int] = None):
+        self.status = status
+        self.digest = digest
+        self.total = total
+        self.completed = completed
+
+
+# Lê streams NDJSON do Ollama em blocos grandes e separa os registros por
+# conta própria, inclusive quando uma linha chega dividida entre dois blocos.
+# Usa orjson quando instalado. O split copia cada linha (e a linha incompleta
+# é copiada de novo ao juntar com o bloco seguinte): passar fatias de
+# memoryview ao orjson evitaria as cópias, mas o laço de busca em Python
+# ficou mais lento que o split
+class DecodificadorNDJSON:
+    TAMANHO_LEITURA = 64 * 1024
+
+    def __init__(self, fonte, tamanho_leitura: int = TAMANHO_LEITURA, usar_orjson: bool = True):
+        self.fonte = fonte
+        self.tamanho_leitura = tamanho_leitura
+        self.usar_orjson = usar_orjson and orjson is not None
+
+    def registros(self) -> Generator[dict, None, None]:
+        # read1 devolve o que já chegou, sem esperar encher o bloco
+        ler = getattr(self.fonte, "read1", None) or self.fonte.read
+        carregar = orjson.loads if self.usar_orjson else json.loads
+
+        # Cada bloco é dividido de uma vez; a última parte (linha ainda
+        # incompleta) fica pendente até o próximo bloco
+        pendente = b""
+        while True:
+            bloco = ler(self.tamanho_leitura)
+            if not bloco:
+                break
+            if pendente:
+                bloco = pendente + bloco
+            linhas = bloco.split(b"\n")
+            pendente = linhas.pop()
+            for linha in linhas:
+                if linha.strip():
+                    yield carregar(linha)
+        if pendente.strip():
+            yield carregar(pendente)
+
+    @staticmethod
+    def classificar(dados: dict) -> Generator[Any, None, None]:
+        if "error" in dados:
+            yield EventoErro(str(dados["error"]))
+            return
+        texto = dados["message"].get("content", "") if "message" in dados else dados.get("response")
+        if texto:
+            yield EventoConteudo(texto)
+        if dados.get("done"):
+            yield EventoConcluido({campo: dados[campo] for campo in CAMPOS_ESTATISTICAS if campo in dados})
+        elif "status" in dados:
+            yield EventoStatus(dados["status"], dados.get("digest"), dados.get("total"), dados.get("completed"))
+
+    def eventos(self) -> Generator[Any, None, None]:
+        for dados in self.registros():
+            yield from self.classificar(dados)
+
+
+# Identifica uma geração de resposta e permite cancelá-la imediatamente,
+# fechando a conexão para que o servidor pare de gerar
+class Geracao:
+    _contador = itertools.count(1)
+
+    def __init__(self):
+        self.id = next(Geracao._contador)
+        self.cancelada = False
+        self.modelo = ""
+        # Estatísticas do servidor e medições do cliente (segundos)
+        self.metricas = {}
+        self._conexao = None
+        self._trava = Lock()
+
+    def vincular(self, conexao: http.client.HTTPConnection):
+        with self._trava:
+            self._conexao = conexao
+            cancelada = self.cancelada
+        if cancelada:
+            abortar_conexao(conexao)
+
+    def desvincular(self, conexao: http.client.HTTPConnection):
+        with self._trava:
+            if self._conexao is conexao:
+                self._conexao = None
+
+    def cancelar(self):
+        with self._trava:
+            if self.cancelada:
+                return
+            self.cancelada = True
+            conexao = self._conexao
+        if conexao is not None:
+            abortar_conexao(conexao)
+
+
+# Envia uma conversa ao /api/chat e produz os trechos da resposta à medida que
+# chegam. Usado pela interface e pelo benchmark; estatísticas do servidor e
+# medições do cliente ficam em geracao.metricas
+def transmitir_chat(cliente: ClienteHTTP, api_url: str, modelo: str, mensagens: List[dict],
+                    geracao: Geracao, keep_alive=KEEP_ALIVE_PADRAO,
+                    opcoes: Optional[dict] = None) -> Generator[str, None, None]:
+    url = urllib.parse.urljoin(api_url, "/api/chat")
+    corpo = {
+        "model": modelo,
+        "messages": mensagens,
+        "stream": True,
+        "keep_alive": keep_alive,
+    }
+    if opcoes:
+        corpo["options"] = opcoes
+    dados = json.dumps(corpo).encode("utf-8")
+
+    try:
+        try:
+            inicio = time.perf_counter()
+            with cliente.requisitar(url, dados, timeout=TIMEOUT_CONVERSA, geracao=geracao) as resp:
+                geracao.metricas["conexao"] = resp.tempo_conexao
+                geracao.metricas["ttfb"] = time.perf_counter() - inicio
+                if resp.status != 200:
+                    raise ErroServidorError(f"Status HTTP inesperado: {resp.status}")
+                
+                concluida = False
+                for evento in DecodificadorNDJSON(resp).eventos():
+                    if geracao.cancelada:  # Verificar se foi solicitado parar
+                        break
+                    if isinstance(evento, EventoConteudo):
+                        if "ttft" not in geracao.metricas:
+                            geracao.metricas["ttft"] = time.perf_counter() - inicio
+                        yield evento.texto
+                    elif isinstance(evento, EventoConcluido):
+                        concluida = True
+                        geracao.metricas.update(evento.estatisticas)
+                    elif isinstance(evento, EventoErro):
+                        raise ErroServidorError(evento.mensagem)
+                if not concluida and not geracao.cancelada:
+                    raise ErroTransporteError("Conexão encerrada antes do fim da resposta")
+        except urllib.error.HTTPError as e:
+            if e.code == 500:
+                raise ErroServidorError("Erro interno no servidor durante a conversa") from e
+            else:
+                raise ErroConexaoError(f"Erro HTTP {e.code}: {e.reason}") from e
+        except urllib.error.URLError as e:
+            raise ErroTransporteError(f"Erro durante a conversa: {e.reason}") from e
+        except http.client.IncompleteRead:
+            raise ErroTransporteError("Conexão encerrada antes do fim da resposta") from None
+        except socket.timeout:
+            raise ErroTransporteError("Tempo de resposta esgotado") from None
+        except json.JSONDecodeError:
+            raise ErroServidorError("Resposta inválida do servidor") from None
+        except (ErroServidorError, ErroConexaoError):
+            raise
+        except Exception as e:
+            raise ErroConexaoError(f"Erro inesperado: {str(e)}") from e
+    except (ErroServidorError, ErroConexaoError):
+        # Parar derruba a conexão a qualquer momento; o que falhar depois
+        # disso é o fim esperado da geração, não um erro
+        if geracao.cancelada:
+            return
+        raise
+
+
+# Executa um /api/pull e gera os eventos de status. Falhas de rede (que valem
+# nova tentativa) viram ErroConexaoError; erros definitivos, ErroServidorError
+def transmitir_pull(cliente: ClienteHTTP, api_url: str, nome_modelo: str, geracao: Geracao,
+                    insecure: bool = False) -> Generator[EventoStatus, None, None]:
+    url = urllib.parse.urljoin(api_url, "/api/pull")
+    dados = json.dumps({"name": nome_modelo, "insecure": insecure, "stream": True}).encode("utf-8")
+
+    try:
+        try:
+            with cliente.requisitar(url, dados, timeout=TIMEOUT_DOWNLOAD, geracao=geracao) as resp:
+                sucesso = False
+                for evento in DecodificadorNDJSON(resp).eventos():
+                    if geracao.cancelada:
+                        return
+                    if isinstance(evento, EventoErro):
+                        if any(trecho in evento.mensagem.lower() for trecho in ERROS_TRANSITORIOS_PULL):
+                            raise ErroConexaoError(evento.mensagem)
+                        raise ErroServidorError(evento.mensagem)
+                    if isinstance(evento, EventoStatus):
+                        sucesso = evento.status == "success"
+                        yield evento
+                if not sucesso and not geracao.cancelada:
+                    raise ErroConexaoError("Conexão encerrada antes do fim do download")
+        except urllib.error.HTTPError as e:
+            if e.code >= 500:
+                raise ErroConexaoError(f"Erro HTTP {e.code}: {e.reason}") from e
+            raise ErroServidorError(f"Erro HTTP {e.code}: {e.reason}") from e
+        except urllib.error.URLError as e:
+            raise ErroConexaoError(f"Erro durante o download: {e.reason}") from e
+        except http.client.IncompleteRead:
+            raise ErroConexaoError("Conexão encerrada antes do fim do download") from None
+        except socket.timeout:
+            raise ErroConexaoError("Tempo de resposta esgotado") from None
+        except json.JSONDecodeError:
+            raise ErroServidorError("Resposta inválida do servidor") from None
+        except (ErroServidorError, ErroConexaoError):
+            raise
+        except Exception as e:
+            raise ErroConexaoError(f"Erro inesperado: {str(e)}") from e
+    except (ErroServidorError, ErroConexaoError):
+        if geracao.cancelada:
+            return
+        raise
+
+
+# Acumula as atualizações do chat vindas de qualquer thread e as entrega em lote
+# no thread da interface, no máximo uma vez por intervalo
+class BufferRenderizacao(QObject):
+    agendar = Signal()
+
+    def __init__(self, renderizar, intervalo_ms: int = INTERVALO_RENDERIZACAO_MS, parent=None):
+        super().__init__(parent)
+        self.renderizar = renderizar
+        self.intervalo_ms = intervalo_ms
+        self._itens = []
+        self._trava = Lock()
+        self._agendado = False
+        self._ultima_descarga = 0.0
+        self._primeiro_pendente = 0.0
+        # Itens de gerações diferentes da ativa são descartados
+        self.geracao_ativa = None
+        # Maior espera entre a chegada de um item e sua renderização (segundos)
+        self.atraso_maximo = 0.0
+
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self.descarregar)
+        self.agendar.connect(self._iniciar_timer)
+
+    def adicionar(self, conteudo: Any, tipo: str, id_geracao: Optional[int] = None):
+        if id_geracao is not None and id_geracao != self.geracao_ativa:
+            return
+        with self._trava:
+            self._itens.append((conteudo, tipo, id_geracao))
+            if self._agendado:
+                return
+            self._agendado = True
+            self._primeiro_pendente = time.perf_counter()
+        self.agendar.emit()
+
+    @Slot()
+    def _iniciar_timer(self):
+        decorrido = (time.perf_counter() - self._ultima_descarga) * 1000
+        self._timer.start(max(0, int(self.intervalo_ms - decorrido)))
+
+    @Slot()
+    def descarregar(self):
+        with self._trava:
+            itens, self._itens = self._itens, []
+            self._agendado = False
+        if not itens:
+            return
+        self._ultima_descarga = time.perf_counter()
+        self.atraso_maximo = max(self.atraso_maximo, self._ultima_descarga - self._primeiro_pendente)
+
+        # Trechos consecutivos da resposta do modelo viram uma única inserção
+        lote = []
+        for conteudo, tipo, id_geracao in itens:
+            if id_geracao is not None and id_geracao != self.geracao_ativa:
+                continue
+            if tipo == "modelo" and lote and lote[-1][1] == "modelo":
+                lote[-1][0].append(conteudo)
+            elif tipo == "modelo":
+                lote.append(([conteudo], tipo))
+            else:
+                lote.append((conteudo, tipo))
+        if lote:
+            self.renderizar([("".join(conteudo) if tipo == "modelo" else conteudo, tipo)
+                             for conteudo, tipo in lote])
+
+# Registro compacto de uma mensagem. O id é estável e identifica a mensagem
+# tanto na lista do chat quanto no histórico enviado ao modelo, inclusive
+# depois de ela sair da lista para o arquivo e voltar
+class Mensagem:
+    __slots__ = ("id", "papel", "conteudo", "tipo", "modelo", "criada_em", "concluida_em",
+                 "tokens", "tokens_estimados", "aberta", "versao", "altura", "markdown")
+    _contador = itertools.count(1)
+
+    def __init__(self, papel: Optional[str], conteudo: str = "", tipo: str = "info", modelo: str = ""):
+        self.id = next(Mensagem._contador)
+        self.papel = papel  # "user", "assistant" ou None para avisos e erros
+        self.conteudo = conteudo
+        self.tipo = tipo
+        self.modelo = modelo
+        self.criada_em = time.time()
+        self.concluida_em = None
+        self.tokens = None  # Contagem informada pelo servidor, quando conhecida
+        self.tokens_estimados = None  # (comprimento do conteúdo, estimativa)
+        self.aberta = tipo == "modelo"  # Resposta ainda recebendo trechos
+        self.versao = 0
+        self.altura = None  # (largura, versao, altura) da última medição
+        self.markdown = None  # MarkdownIncremental, criado ao renderizar respostas
+
+    def para_api(self) -> dict:
+        return {"role": self.papel, "content": self.conteudo}
+
+    def para_registro(self) -> dict:
+        return {"id": self.id, "papel": self.papel, "conteudo": self.conteudo, "tipo": self.tipo, "modelo": self.modelo,
+                "criada_em": self.criada_em, "concluida_em": self.concluida_em, "tokens": self.tokens}
+
+    # Mensagem lida de um arquivo: mantém o id do registro (recebe um novo se
+    # ele não tiver) e já chega concluída
+    @classmethod
+    def de_registro(cls, registro: dict) -> "Mensagem":
+        mensagem = cls(registro.get("papel"), registro.get("conteudo", ""),
+                       registro.get("tipo", "info"), registro.get("modelo", ""))
+        if registro.get("id") is not None:
+            mensagem.id = registro["id"]
+        mensagem.criada_em = registro.get("criada_em", mensagem.criada_em)
+        mensagem.concluida_em = registro.get("concluida_em")
+        mensagem.tokens = registro.get("tokens")
+        mensagem.aberta = False
+        return mensagem
+
+
+# Mantém o histórico enviado dentro de um orçamento de tokens: mensagens de
+# sistema ficam fixas, as mais recentes entram numa janela deslizante e as
+# antigas podem ser condensadas num resumo gerado pelo próprio modelo
+class GerenciadorContexto:
+    SOBRECARGA_MENSAGEM = 4  # Tokens de formatação por mensagem no template
+    CARACTERES_POR_TOKEN = 4
+
+    def __init__(self, orcamento: int = ORCAMENTO_CONTEXTO_TOKENS, resumir: bool = False):
+        self.orcamento = orcamento
+        self.resumir = resumir
+        self._resumo = None  # (ids das mensagens resumidas, texto)
+        self._trava = Lock()
+
+    @classmethod
+    def estimar_tokens(cls, mensagem: Mensagem) -> int:
+        if mensagem.tokens is not None:
+            return mensagem.tokens + cls.SOBRECARGA_MENSAGEM
+
+        # Estimativa refeita só quando o conteúdo muda de tamanho
+        comprimento = len(mensagem.conteudo)
+        estimativa = mensagem.tokens_estimados
+        if estimativa is None or estimativa[0] != comprimento:
+            estimativa = (comprimento, math.ceil(comprimento / cls.CARACTERES_POR_TOKEN) + cls.SOBRECARGA_MENSAGEM)
+            mensagem.tokens_estimados = estimativa
+        return estimativa[1]
+
+    @property
+    def reserva_resumo(self) -> int:
+        return int(self.orcamento * FRACAO_RESUMO_CONTEXTO) if self.resumir else 0
+
+    # Tokens que a janela de mensagens recentes pode ocupar, sem as fixas
+    @property
+    def disponivel(self) -> int:
+        return self.orcamento - self.reserva_resumo
+
+    def limpar(self):
+        with self._trava:
+            self._resumo = None
+
+    # Retorna (mensagens para a API, tokens enviados, tokens do histórico completo,
+    # mensagens omitidas, resumo usado)
+    def preparar(self, historico: List[Mensagem], resumir_fn=None) -> Tuple[List[dict], int, int, int, Optional[str]]:
+        fixas, janela, omitidas, usados = self._janela(historico)
+        total = sum(self.estimar_tokens(m) for m in historico)
+
+        mensagens = [m.para_api() for m in fixas]
+        enviados = sum(self.estimar_tokens(m) for m in fixas) + usados
+        resumo = None
+        if omitidas and self.resumir and resumir_fn is not None:
+            resumo = self._obter_resumo(omitidas, resumir_fn)
+            if resumo:
+                mensagem_resumo = Mensagem("system", f"Resumo da conversa anterior:\n{resumo}", "info")
+                mensagens.append(mensagem_resumo.para_api())
+                enviados += self.estimar_tokens(mensagem_resumo)
+        mensagens.extend(m.para_api() for m in janela)
+        return mensagens, enviados, total, len(omitidas), resumo
+
+    # Divide o histórico em (fixas, janela enviada, omitidas, tokens da janela)
+    def _janela(self, historico: List[Mensagem]) -> Tuple[List[Mensagem], List[Mensagem], List[Mensagem], int]:
+        fixas = [m for m in historico if m.papel == "system"]
+        conversa = [m for m in historico if m.papel != "system"]
+
+        disponivel = self.disponivel - sum(self.estimar_tokens(m) for m in fixas)
+        janela = []
+        usados = 0
+        for mensagem in reversed(conversa):
+            custo = self.estimar_tokens(mensagem)
+            # A mensagem mais recente sempre vai, mesmo acima do orçamento
+            if janela and usados + custo > disponivel:
+                break
+            janela.append(mensagem)
+            usados += custo
+        janela.reverse()
+        return fixas, janela, conversa[:len(conversa) - len(janela)], usados
+
+    # Ids das mensagens antigas que já não entram no contexto (e, com o resumo
+    # ativo, já foram resumidas) e podem sair da memória
+    def descartaveis(self, historico: List[Mensagem]) -> set:
+        _, _, omitidas, _ = self._janela(historico)
+        ids = {m.id for m in omitidas}
+        if self.resumir:
+            with self._trava:
+                ids &= set(self._resumo[0]) if self._resumo is not None else set()
+        return ids
+
+    def _obter_resumo(self, omitidas: List[Mensagem], resumir_fn) -> Optional[str]:
+        ids = tuple(m.id for m in omitidas)
+        with self._trava:
+            cache = self._resumo
+        if cache is not None and cache[0] == ids:
+            return cache[1]
+
+        # Se as mensagens já resumidas continuam no início, resume só as novas.
+        # As mais antigas podem ter saído da memória (ver descartaveis), então
+        # basta que o início seja o fim da sequência resumida
+        novas, anterior = omitidas, None
+        if cache is not None:
+            resumidas = set(cache[0])
+            comum = 0
+            while comum < len(ids) and ids[comum] in resumidas:
+                comum += 1
+            if ids[:comum] == cache[0][len(cache[0]) - comum:]:
+                novas, anterior = omitidas[comum:], cache[1]
+        try:
+            texto = resumir_fn(novas, anterior, self.reserva_resumo)
+        except Exception:
+            return anterior
+        with self._trava:
+            self._resumo = (ids, texto)
+        return texto
+
+
+# Mensagens que saíram da lista do chat, em ordem, num arquivo temporário
+# somente de acréscimo (uma linha JSON por mensagem). Em memória fica apenas o
+# deslocamento de cada linha. Outro armazenamento pode substituir este desde
+# que ofereça os mesmos métodos: len(), acrescentar, ler, limpar e fechar
+class ArquivoMensagens:
+    def __init__(self):
+        self._arquivo = None  # Criado no primeiro acréscimo; o sistema apaga ao fechar
+        self._posicoes = array("q")  # Início de cada linha no arquivo
+        self._fim = 0
+        self._trava = Lock()
+
+    def __len__(self) -> int:
+        return len(self._posicoes)
+
+    def acrescentar(self, mensagens: List[Mensagem]):
+        linhas = [json.dumps(m.para_registro(), ensure_ascii=False).encode("utf-8") + b"\n" for m in mensagens]
+        with self._trava:
+            if self._arquivo is None:
+                self._arquivo = tempfile.TemporaryFile(prefix="ollama-gui-", suffix=".jsonl")
+            self._arquivo.seek(self._fim)
+            self._arquivo.write(b"".join(linhas))
+            for linha in linhas:
+                self._posicoes.append(self._fim)
+                self._fim += len(linha)
+
+    # Mensagens nas posições [inicio, fim)
+    def ler(self, inicio: int, fim: int) -> List[Mensagem]:
+        with self._trava:
+            fim = min(fim, len(self._posicoes))
+            if inicio >= fim:
+                return []
+            final = self._posicoes[fim] if fim < len(self._posicoes) else self._fim
+            self._arquivo.seek(self._posicoes[inicio])
+            dados = self._arquivo.read(final - self._posicoes[inicio])
+        return [Mensagem.de_registro(json.loads(linha)) for linha in dados.split(b"\n") if linha]
+
+    def limpar(self):
+        with self._trava:
+            if self._arquivo is not None:
+                self._arquivo.truncate(0)
+            self._posicoes = array("q")
+            self._fim = 0
+
+    def fechar(self):
+        with self._trava:
+            if self._arquivo is not None:
+                self._arquivo.close()
+                self._arquivo = None
+            self._posicoes = array("q")
+            self._fim = 0
+
+
+# Conversas gravadas em SQLite (modo WAL). As mensagens de cada sessão têm a
+# mesma posição que ocupam no chat; são gravadas num thread separado, que
+# junta numa transação tudo o que chegar dentro de INTERVALO_GRAVACAO e, das
+# várias versões de uma resposta em andamento, grava só a última.
+# O índice de busca (FTS5 sem conteúdo próprio, chave sessão << 32 | posição)
+# é atualizado na mesma transação; sessões gravadas antes dele existir são
+# indexadas pelo mesmo thread quando não há nada para gravar
+class ArmazemConversas(QObject):
+    falha = Signal(str)
+
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS sessoes (
+            id INTEGER PRIMARY KEY,
+            titulo TEXT NOT NULL DEFAULT '',
+            modelo TEXT NOT NULL DEFAULT '',
+            criada_em REAL NOT NULL,
+            atualizada_em REAL NOT NULL,
+            mensagens INTEGER NOT NULL DEFAULT 0
+        );
+        CREATE INDEX IF NOT EXISTS sessoes_atualizadas ON sessoes (atualizada_em DESC);
+        CREATE TABLE IF NOT EXISTS mensagens (
+            sessao INTEGER NOT NULL REFERENCES sessoes (id) ON DELETE CASCADE,
+            posicao INTEGER NOT NULL,
+            papel TEXT,
+            tipo TEXT NOT NULL,
+            modelo TEXT NOT NULL DEFAULT '',
+            conteudo TEXT NOT NULL,
+            criada_em REAL NOT NULL,
+            concluida_em REAL,
+            tokens INTEGER,
+            PRIMARY KEY (sessao, posicao)
+        ) WITHOUT ROWID;
+        CREATE VIRTUAL TABLE IF NOT EXISTS busca USING fts5 (
+            conteudo, content = '', tokenize = 'unicode61 remove_diacritics 2'
+        );
+        CREATE TABLE IF NOT EXISTS busca_pendente (sessao INTEGER PRIMARY KEY);
+    """
+    PAPEIS_INDEXADOS = ("user", "assistant")
+    GRAVAR_MENSAGEM = """
+        INSERT INTO mensagens (sessao, posicao, papel, tipo, modelo, conteudo, criada_em, concluida_em, tokens)
+        VALUES (:sessao, :posicao, :papel, :tipo, :modelo, :conteudo, :criada_em, :concluida_em, :tokens)
+        ON CONFLICT (sessao, posicao) DO UPDATE SET modelo = excluded.modelo, conteudo = excluded.conteudo,
+            concluida_em = excluded.concluida_em, tokens = excluded.tokens
+    """
+
+    def __init__(self, caminho: str = ARQUIVO_CONVERSAS, parent=None):
+        super().__init__(parent)
+        self.caminho = caminho
+        self._conexao = None  # Leituras e operações de sessão (thread da interface)
+        self._fila = queue.Queue()
+        self._thread = None
+        self._sem_indice = set()  # Sessões ainda não indexadas (thread de gravação)
+        # (sessão, posição) -> id da mensagem. O id não vai para o banco: só
+        # vale neste processo, para que a mensagem relida seja a mesma
+        self._ids = {}
+
+    def _conectar(self) -> sqlite3.Connection:
+        conexao = sqlite3.connect(self.caminho, timeout=5.0)
+        conexao.execute("PRAGMA journal_mode = WAL")
+        conexao.execute("PRAGMA synchronous = NORMAL")
+        conexao.execute("PRAGMA foreign_keys = ON")
+        return conexao
+
+    def abrir(self):
+        os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+        self._conexao = self._conectar()
+        indexado = self._conexao.execute("SELECT 1 FROM sqlite_master WHERE name = 'busca'").fetchone()
+        self._conexao.executescript(self.ESQUEMA)
+        if not indexado:
+            with self._conexao:
+                self._conexao.execute("INSERT OR IGNORE INTO busca_pendente SELECT id FROM sessoes")
+        self._thread = Thread(target=self._gravar, daemon=True)
+        self._thread.start()
+
+    # Grava as pendências e encerra o thread de gravação
+    def fechar(self):
+        if self._thread is not None:
+            self._fila.put(None)
+            self._thread.join(timeout=5.0)
+            self._thread = None
+        if self._conexao is not None:
+            self._conexao.close()
+            self._conexao = None
+
+    # Sessões
+
+    def criar_sessao(self, titulo: str, modelo: str = "") -> int:
+        agora = time.time()
+        with self._conexao:
+            cursor = self._conexao.execute(
+                "INSERT INTO sessoes (titulo, modelo, criada_em, atualizada_em) VALUES (?, ?, ?, ?)",
+                (titulo, modelo, agora, agora))
+        return cursor.lastrowid
+
+    def renomear_sessao(self, sessao: int, titulo: str):
+        with self._conexao:
+            self._conexao.execute("UPDATE sessoes SET titulo = ? WHERE id = ?", (titulo, sessao))
+
+    # A exclusão (e a retirada das mensagens do índice) fica com o thread de
+    # gravação, depois do que já estiver pendente para a sessão
+    def excluir_sessao(self, sessao: int):
+        self._fila.put(("excluir", sessao))
+        for chave in [chave for chave in self._ids if chave[0] == sessao]:
+            del self._ids[chave]
+
+    def titulo_sessao(self, sessao: int) -> str:
+        linha = self._conexao.execute("SELECT titulo FROM sessoes WHERE id = ?", (sessao,)).fetchone()
+        return linha[0] if linha else ""
+
+    # Página de sessões, das mais recentes para as mais antigas:
+    # [(id, título, atualizada_em, mensagens)]
+    def listar_sessoes(self, deslocamento: int = 0, limite: int = PAGINA_SESSOES) -> List[tuple]:
+        return self._conexao.execute(
+            "SELECT id, titulo, atualizada_em, mensagens FROM sessoes "
+            "ORDER BY atualizada_em DESC LIMIT ? OFFSET ?", (limite, deslocamento)).fetchall()
+
+    # Mensagens
+
+    def contar_mensagens(self, sessao: int) -> int:
+        linha = self._conexao.execute("SELECT MAX(posicao) FROM mensagens WHERE sessao = ?", (sessao,)).fetchone()
+        return 0 if linha[0] is None else linha[0] + 1
+
+    def ler_mensagens(self, sessao: int, inicio: int, fim: int) -> List[Mensagem]:
+        linhas = self._conexao.execute(
+            "SELECT posicao, papel, tipo, modelo, conteudo, criada_em, concluida_em, tokens FROM mensagens "
+            "WHERE sessao = ? AND posicao >= ? AND posicao < ? ORDER BY posicao", (sessao, inicio, fim))
+        campos = ("papel", "tipo", "modelo", "conteudo", "criada_em", "concluida_em", "tokens")
+        mensagens = []
+        for posicao, *valores in linhas:
+            registro = dict(zip(campos, valores))
+            registro["id"] = self._ids.get((sessao, posicao))
+            mensagem = Mensagem.de_registro(registro)
+            self._ids[sessao, posicao] = mensagem.id
+            mensagens.append(mensagem)
+        return mensagens
+
+    def gravar(self, sessao: int, posicao: int, mensagem: Mensagem):
+        registro = mensagem.para_registro()
+        registro["sessao"], registro["posicao"] = sessao, posicao
+        self._ids[sessao, posicao] = mensagem.id
+        self._fila.put(registro)
+
+    # Consulta FTS5 a partir do texto digitado: cada palavra entre aspas e a
+    # última como prefixo, para que os resultados acompanhem a digitação
+    @staticmethod
+    def consulta_busca(texto: str) -> Optional[str]:
+        palavras = re.findall(r"\w+", texto)
+        if not palavras:
+            return None
+        return " ".join(f'"{palavra}"' for palavra in palavras) + "*"
+
+    # Trecho da mensagem em volta da primeira ocorrência, com os termos
+    # marcados entre « »
+    @staticmethod
+    def trecho(conteudo: str, texto: str, contexto: int = 60) -> str:
+        conteudo = " ".join(conteudo.split())
+        palavras = re.findall(r"\w+", texto)
+        padrao = re.compile("|".join(rf"\b{re.escape(p)}" + (r"\w*" if i == len(palavras) - 1 else r"\b")
+                                     for i, p in enumerate(palavras)), re.I)
+        achado = padrao.search(conteudo)
+        inicio = max(0, achado.start() - contexto) if achado else 0
+        fim = min(len(conteudo), inicio + 3 * contexto)
+        trecho = padrao.sub(lambda m: f"«{m.group()}»", conteudo[inicio:fim])
+        return ("…" if inicio else "") + trecho + ("…" if fim < len(conteudo) else "")
+
+    # Mensagens mais relevantes (bm25) para o texto, entre as CANDIDATOS_BUSCA
+    # ocorrências mais recentes: [(sessão, posição, título, papel, trecho)].
+    # Usa uma conexão própria, para rodar fora da interface
+    def buscar(self, texto: str, limite: int = LIMITE_RESULTADOS_BUSCA,
+               candidatos: int = CANDIDATOS_BUSCA) -> List[tuple]:
+        consulta = self.consulta_busca(texto)
+        if consulta is None:
+            return []
+        conexao = sqlite3.connect(self.caminho, timeout=5.0)
+        try:
+            # O FTS5 percorre o índice em ordem de rowid e aplica o limite
+            # inferior durante a leitura, então só os candidatos são pontuados
+            corte = conexao.execute("SELECT rowid FROM busca WHERE busca MATCH ? ORDER BY rowid DESC "
+                                    "LIMIT 1 OFFSET ?", (consulta, candidatos - 1)).fetchone()
+            chaves = conexao.execute("SELECT rowid FROM busca WHERE busca MATCH ? AND rowid >= ? "
+                                     "ORDER BY rank LIMIT ?", (consulta, corte[0] if corte else 0, limite)).fetchall()
+            resultados = []
+            for (chave,) in chaves:
+                sessao, posicao = chave >> 32, chave & 0xFFFFFFFF
+                linha = conexao.execute(
+                    "SELECT s.titulo, m.papel, m.conteudo FROM mensagens m JOIN sessoes s ON s.id = m.sessao "
+                    "WHERE m.sessao = ? AND m.posicao = ?", (sessao, posicao)).fetchone()
+                if linha is not None:  # A sessão pode ter sido excluída
+                    resultados.append((sessao, posicao, linha[0], linha[1], self.trecho(linha[2], texto)))
+            return resultados
+        finally:
+            conexao.close()
+
+    # Espera a gravação de tudo o que já foi enviado
+    def sincronizar(self, timeout: float = 5.0):
+        if self._thread is None:
+            return
+        pronto = Event()
+        self._fila.put(pronto)
+        pronto.wait(timeout)
+
+    def _gravar(self):
+        conexao = self._conectar()
+        self._sem_indice = {sessao for (sessao,) in conexao.execute("SELECT sessao FROM busca_pendente")}
+        ativo = True
+        while ativo:
+            if self._sem_indice and self._fila.empty():
+                self._indexar_sessao(conexao, min(self._sem_indice))
+                continue
+
+            pendentes = {}  # (sessao, posicao) -> registro mais recente
+            exclusoes = []
+            avisos = []
+            item = self._fila.get()
+            prazo = time.monotonic() + INTERVALO_GRAVACAO
+            while True:
+                if item is None:
+                    ativo = False
+                    break
+                if isinstance(item, Event):
+                    avisos.append(item)
+                    break  # Quem espera não aguarda o fim do intervalo
+                if isinstance(item, tuple):
+                    exclusoes.append(item[1])
+                else:
+                    pendentes[item["sessao"], item["posicao"]] = item
+                restante = prazo - time.monotonic()
+                if restante <= 0:
+                    break
+                try:
+                    item = self._fila.get(timeout=restante)
+                except queue.Empty:
+                    break
+
+            if pendentes or exclusoes:
+                sessoes = {}
+                for sessao, posicao in pendentes:
+                    sessoes[sessao] = max(sessoes.get(sessao, 0), posicao + 1)
+                try:
+                    with conexao:
+                        for registro in pendentes.values():
+                            self._gravar_mensagem(conexao, registro)
+                        conexao.executemany(
+                            "UPDATE sessoes SET atualizada_em = ?, mensagens = MAX(mensagens, ?) WHERE id = ?",
+                            [(time.time(), total, sessao) for sessao, total in sessoes.items()])
+                        for sessao in exclusoes:
+                            self._excluir_sessao(conexao, sessao)
+                except sqlite3.Error as e:
+                    self.falha.emit(f"Erro ao gravar conversa: {e}")
+            for aviso in avisos:
+                aviso.set()
+        conexao.close()
+
+    # Grava uma mensagem trocando a versão anterior dela no índice de busca
+    def _gravar_mensagem(self, conexao: sqlite3.Connection, registro: dict):
+        indexar = registro["papel"] in self.PAPEIS_INDEXADOS and registro["sessao"] not in self._sem_indice
+        chave = registro["sessao"] << 32 | registro["posicao"]
+        anterior = None
+        if indexar:
+            anterior = conexao.execute("SELECT conteudo FROM mensagens WHERE sessao = ? AND posicao = ?",
+                                       (registro["sessao"], registro["posicao"])).fetchone()
+            if anterior is not None and anterior[0] == registro["conteudo"]:
+                indexar = False
+            elif anterior is not None:
+                conexao.execute("INSERT INTO busca (busca, rowid, conteudo) VALUES ('delete', ?, ?)",
+                                (chave, anterior[0]))
+        conexao.execute(self.GRAVAR_MENSAGEM, registro)
+        if indexar:
+            conexao.execute("INSERT INTO busca (rowid, conteudo) VALUES (?, ?)", (chave, registro["conteudo"]))
+
+    def _excluir_sessao(self, conexao: sqlite3.Connection, sessao: int):
+        if sessao in self._sem_indice:
+            self._sem_indice.discard(sessao)
+        else:
+            conexao.execute(
+                "INSERT INTO busca (busca, rowid, conteudo) SELECT 'delete', sessao << 32 | posicao, conteudo "
+                "FROM mensagens WHERE sessao = ? AND papel IN (?, ?)", (sessao, *self.PAPEIS_INDEXADOS))
+        conexao.execute("DELETE FROM busca_pendente WHERE sessao = ?", (sessao,))
+        conexao.execute("DELETE FROM sessoes WHERE id = ?", (sessao,))
+
+    def _indexar_sessao(self, conexao: sqlite3.Connection, sessao: int):
+        try:
+            with conexao:
+                conexao.execute(
+                    "INSERT INTO busca (rowid, conteudo) SELECT sessao << 32 | posicao, conteudo "
+                    "FROM mensagens WHERE sessao = ? AND papel IN (?, ?)", (sessao, *self.PAPEIS_INDEXADOS))
+                conexao.execute("DELETE FROM busca_pendente WHERE sessao = ?", (sessao,))
+        except sqlite3.Error as e:
+            self.falha.emit(f"Erro ao indexar conversa: {e}")
+        self._sem_indice.discard(sessao)
+
+
+# Arquivo de mensagens de uma sessão do banco: todas as mensagens já estão
+# gravadas, então despejar linhas da lista não escreve nada e ler busca as
+# páginas anteriores direto do SQLite
+class ArquivoSessao:
+    def __init__(self, armazem: ArmazemConversas, sessao: int, total: int = 0):
+        self.armazem = armazem
+        self.sessao = sessao
+        self.total = total  # Posições já enviadas para gravação
+
+    def __len__(self) -> int:
+        return self.total
+
+    def gravar(self, posicao: int, mensagem: Mensagem):
+        self.armazem.gravar(self.sessao, posicao, mensagem)
+        self.total = max(self.total, posicao + 1)
+
+    def acrescentar(self, mensagens: List[Mensagem]):
+        for mensagem in mensagens:
+            self.gravar(self.total, mensagem)
+
+    def ler(self, inicio: int, fim: int) -> List[Mensagem]:
+        self.armazem.sincronizar()
+        return self.armazem.ler_mensagens(self.sessao, inicio, fim)
+
+    # A sessão continua no banco; só esta visão dela é esvaziada
+    def limpar(self):
+        self.total = 0
+
+    def fechar(self):
+        pass
+
+
+# Mensagens do chat, uma por linha, com índice id -> linha. Os segmentos
+# entregues pelo buffer de renderização criam linhas novas ou estendem a
+# resposta em andamento; o conteúdo pode ser texto ou uma Mensagem pronta.
+# Só as últimas max_linhas ficam em memória; as anteriores estão no arquivo
+class ModeloChat(QAbstractListModel):
+    def __init__(self, parent=None, max_linhas: int = MAX_MENSAGENS_CHAT, arquivo=None):
+        super().__init__(parent)
+        self._linhas = []
+        self._linha_por_id = {}
+        self.max_linhas = max_linhas
+        self.arquivo = arquivo if arquivo is not None else ArquivoMensagens()
+        self.anteriores = 0  # Mensagens no arquivo antes da primeira linha
+        self.posteriores = 0  # Mensagens no arquivo depois da última (ao abrir um resultado de busca)
+        # Respostas em andamento que saíram da lista ao carregar outro trecho:
+        # id -> mensagem. Voltam no lugar da cópia lida do arquivo
+        self.abertas = {}
+
+    def rowCount(self, parent=QModelIndex()) -> int:
+        return 0 if parent.isValid() else len(self._linhas)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid():
+            return None
+        mensagem = self._linhas[index.row()]
+        if role == Qt.DisplayRole:
+            return DelegadoMensagem.texto_exibicao(mensagem)
+        if role == Qt.UserRole:
+            return mensagem
+        return None
+
+    def mensagem(self, linha: int) -> Mensagem:
+        return self._linhas[linha]
+
+    def linha_de_id(self, id_mensagem: int) -> Optional[int]:
+        return self._linha_por_id.get(id_mensagem)
+
+    def limpar(self):
+        self.beginResetModel()
+        self._linhas = []
+        self._linha_por_id = {}
+        self.anteriores = 0
+        self.posteriores = 0
+        self.abertas = {}
+        self.arquivo.limpar()
+        self.endResetModel()
+
+    # Substitui o conteúdo por um trecho de uma conversa salva; as mensagens
+    # de antes e de depois dele ficam no arquivo e voltam ao rolar. Com
+    # manter_abertas (outro trecho da mesma conversa), respostas em andamento
+    # continuam sendo os mesmos objetos quando voltam à lista
+    def restaurar(self, mensagens: List[Mensagem], anteriores: int, arquivo, posteriores: int = 0,
+                  manter_abertas: bool = False):
+        self.beginResetModel()
+        abertas = {}
+        if manter_abertas:
+            abertas = {m.id: m for m in itertools.chain(self.abertas.values(), self._linhas) if m.aberta}
+        if arquivo is not self.arquivo:
+            self.arquivo.fechar()
+        self.arquivo = arquivo
+        self.abertas = abertas
+        self._linhas = self._vivas(mensagens)
+        self.anteriores = anteriores
+        self.posteriores = posteriores
+        self._indexar()
+        self.endResetModel()
+
+    def _indexar(self):
+        self._linha_por_id = {mensagem.id: linha for linha, mensagem in enumerate(self._linhas)}
+
+    def _vivas(self, mensagens: List[Mensagem]) -> List[Mensagem]:
+        if not self.abertas:
+            return list(mensagens)
+        return [self.abertas.pop(m.id, m) for m in mensagens]
+
+    # Move as linhas mais antigas para o arquivo quando a lista passa do limite
+    # por um lote inteiro; retorna as mensagens removidas
+    def despejar(self, lote: int = LOTE_ARQUIVO_CHAT) -> List[Mensagem]:
+        if self.posteriores or len(self._linhas) < self.max_linhas + lote:
+            return []
+        quantidade = len(self._linhas) - self.max_linhas
+        while quantidade > 0 and self._linhas[quantidade - 1].aberta:
+            quantidade -= 1  # Respostas em andamento ficam na lista
+        if quantidade <= 0:
+            return []
+
+        # Linhas trazidas de volta do arquivo já estão nele
+        arquivadas = len(self.arquivo) - self.anteriores
+        removidas = self._linhas[:quantidade]
+        if quantidade > arquivadas:
+            self.arquivo.acrescentar(removidas[arquivadas:])
+
+        self.beginRemoveRows(QModelIndex(), 0, quantidade - 1)
+        del self._linhas[:quantidade]
+        self.anteriores += quantidade
+        self._indexar()
+        self.endRemoveRows()
+        return removidas
+
+    # Traz de volta do arquivo as mensagens anteriores à primeira linha;
+    # retorna quantas linhas foram inseridas no início
+    def reidratar(self, quantidade: int = LOTE_ARQUIVO_CHAT) -> int:
+        inicio = max(0, self.anteriores - quantidade)
+        mensagens = self._vivas(self.arquivo.ler(inicio, self.anteriores))
+        if not mensagens:
+            return 0
+        self.beginInsertRows(QModelIndex(), 0, len(mensagens) - 1)
+        self._linhas[:0] = mensagens
+        self.anteriores = inicio
+        self._indexar()
+        self.endInsertRows()
+        return len(mensagens)
+
+    # Traz de volta as mensagens seguintes à última linha
+    def reidratar_fim(self, quantidade: int = LOTE_ARQUIVO_CHAT) -> int:
+        inicio = self.anteriores + len(self._linhas)
+        mensagens = self._vivas(self.arquivo.ler(inicio, inicio + min(quantidade, self.posteriores)))
+        if not mensagens:
+            self.posteriores = 0
+            return 0
+        self.beginInsertRows(QModelIndex(), len(self._linhas), len(self._linhas) + len(mensagens) - 1)
+        for deslocamento, mensagem in enumerate(mensagens):
+            self._linha_por_id[mensagem.id] = len(self._linhas) + deslocamento
+        self._linhas.extend(mensagens)
+        self.posteriores -= len(mensagens)
+        self.endInsertRows()
+        return len(mensagens)
+
+    # Retorna os índices das linhas já existentes que mudaram de conteúdo
+    def aplicar_lote(self, segmentos: List[Tuple[Any, str]]) -> List[QModelIndex]:
+        existentes = len(self._linhas)
+        novas = []
+        alteradas = set()
+
+        def ultima():
+            if novas:
+                return novas[-1]
+            return self._linhas[-1] if self._linhas else None
+
+        def alterar(mensagem):
+            if not novas or mensagem is not novas[-1]:
+                linha = self._linha_por_id.get(mensagem.id)
+                if linha is not None:
+                    alteradas.add(linha)
+
+        for conteudo, tipo in segmentos:
+            atual = ultima()
+            if tipo == "modelo":
+                if atual is not None and atual.tipo == "modelo" and atual.aberta:
+                    atual.conteudo += conteudo
+                    alterar(atual)
+                else:
+                    novas.append(Mensagem("assistant", conteudo, "modelo"))
+            elif tipo == "concluida":
+                conteudo.aberta = False
+                conteudo.concluida_em = time.time()
+                alterar(conteudo)  # O último bloco passa a ser definitivo
+            elif tipo == "texto":
+                if atual is not None:
+                    atual.aberta = False
+            elif isinstance(conteudo, Mensagem):
+                novas.append(conteudo)
+            elif tipo == "nome_modelo":
+                novas.append(Mensagem("assistant", tipo="modelo", modelo=conteudo))
+            else:
+                novas.append(Mensagem(None, conteudo, tipo))
+
+        indices = []
+        for linha in sorted(alteradas):
+            self._linhas[linha].versao += 1
+            indices.append(self.index(linha))
+        for indice in indices:
+            self.dataChanged.emit(indice, indice)
+
+        if novas:
+            self.beginInsertRows(QModelIndex(), existentes, existentes + len(novas) - 1)
+            for deslocamento, mensagem in enumerate(novas):
+                self._linha_por_id[mensagem.id] = existentes + deslocamento
+            self._linhas.extend(novas)
+            self.endInsertRows()
+        return indices
+
+
+# Um bloco de uma resposta: parágrafo(s) de Markdown ou bloco de código
+class BlocoMarkdown:
+    __slots__ = ("tipo", "texto", "linguagem", "chave", "altura")
+
+    def __init__(self, tipo: str, texto: str, linguagem: str = ""):
+        self.tipo = tipo  # "texto" ou "codigo"
+        self.texto = texto
+        self.linguagem = linguagem
+        self.chave = hashlib.sha1(f"{tipo}\0{linguagem}\0{texto}".encode("utf-8")).hexdigest()
+        self.altura = None  # (largura, altura) da última medição
+
+
+# Divide uma resposta em blocos à medida que ela chega. Só as linhas novas
+# são examinadas; blocos completos ficam congelados e apenas o último, ainda
+# aberto, muda a cada trecho recebido
+class MarkdownIncremental:
+    CERCA = re.compile(r" {0,3}(`{3,}|~{3,})\s*([\w+#.-]*)")
+
+    __slots__ = ("blocos", "_posicao", "_inicio", "_cerca", "_linguagem", "_corte")
+
+    def __init__(self):
+        self.blocos = []  # Blocos congelados
+        self._posicao = 0  # Início da próxima linha a examinar
+        self._inicio = 0  # Início do bloco aberto
+        self._cerca = None  # Cerca do bloco de código aberto ("```", "~~~"...)
+        self._linguagem = ""
+        self._corte = None  # Linha em branco que pode encerrar o parágrafo
+
+    def _congelar(self, tipo: str, texto: str, linguagem: str = ""):
+        if tipo == "codigo":
+            self.blocos.append(BlocoMarkdown(tipo, texto, linguagem))
+        elif texto.strip():
+            self.blocos.append(BlocoMarkdown(tipo, texto.rstrip("\n")))
+
+    def alimentar(self, conteudo: str):
+        if len(conteudo) < self._posicao:
+            self.__init__()  # O conteúdo foi substituído
+
+        fim = conteudo.rfind("\n", self._posicao) + 1
+        while self._posicao < fim:
+            quebra = conteudo.index("\n", self._posicao)
+            inicio_linha, linha = self._posicao, conteudo[self._posicao:quebra]
+            self._posicao = quebra + 1
+
+            if self._cerca is not None:
+                marcador = linha.strip()
+                if marcador.startswith(self._cerca) and not marcador.strip(self._cerca[0]):
+                    self._congelar("codigo", conteudo[self._inicio:inicio_linha], self._linguagem)
+                    self._cerca = None
+                    self._inicio = self._posicao
+                continue
+
+            cerca = self.CERCA.match(linha)
+            if cerca:
+                self._congelar("texto", conteudo[self._inicio:inicio_linha])
+                self._cerca, self._linguagem = cerca.group(1), cerca.group(2).lower()
+                self._inicio = self._posicao
+                self._corte = None
+            elif not linha.strip():
+                if self._corte is None:
+                    self._corte = inicio_linha
+            elif self._corte is not None:
+                # Linhas recuadas após a linha em branco continuam o bloco
+                # (itens de lista com vários parágrafos)
+                if not linha[:1].isspace():
+                    self._congelar("texto", conteudo[self._inicio:self._corte])
+                    self._inicio = inicio_linha
+                self._corte = None
+
+        if self._cerca is None and self._corte is None and len(conteudo) - self._inicio > LIMITE_BLOCO_ABERTO:
+            corte = conteudo.rfind("\n", self._inicio)
+            if corte < 0:
+                corte = conteudo.rfind(" ", self._inicio)
+            if corte > self._inicio:
+                self._congelar("texto", conteudo[self._inicio:corte + 1])
+                self._inicio = corte + 1
+                self._posicao = max(self._posicao, self._inicio)
+
+    # Congela o bloco aberto quando a resposta termina
+    def finalizar(self, conteudo: str):
+        self.alimentar(conteudo)
+        if self._cerca is not None:
+            self._congelar("codigo", conteudo[self._inicio:], self._linguagem)
+            self._cerca = None
+        else:
+            self._congelar("texto", conteudo[self._inicio:])
+        self._inicio = self._posicao = len(conteudo)
+        self._corte = None
+
+    # Bloco ainda aberto: (tipo, início no conteúdo, texto, linguagem)
+    def aberto(self, conteudo: str) -> Optional[Tuple[str, int, str, str]]:
+        texto = conteudo[self._inicio:]
+        if self._cerca is not None:
+            return "codigo", self._inicio, texto, self._linguagem
+        if texto.strip():
+            return "texto", self._inicio, texto, ""
+        return None
+
+
+# Realça blocos de código num thread separado. O resultado (trechos com a
+# categoria de cada token) fica em cache pelo hash do conteúdo; usa o pygments
+# quando instalado e, sem ele, um realce simples por expressões regulares
+class RealcadorCodigo(QObject):
+    pronto = Signal(str)  # chave do bloco realçado
+
+    CORES = {
+        "palavra_chave": "#c792ea",
+        "texto": "#c3e88d",
+        "comentario": "#697098",
+        "numero": "#f78c6c",
+        "funcao": "#82aaff",
+        "embutido": "#ffcb6b",
+    }
+    PALAVRAS_CHAVE = frozenset((
+        "and as assert async await break case catch class const continue def default del do elif "
+        "else enum except export extends false final finally fn for from func function go if impl "
+        "import in interface is lambda let match mut new nil none not null or package pass private "
+        "protected pub public raise return self static struct super switch this throw trait true try "
+        "type typeof use var void while with yield"
+    ).split())
+    PADRAO = re.compile(
+        r"(?P<comentario>#[^\n]*|//[^\n]*|/\*.*?\*/)"
+        r'|(?P<texto>""".*?"""|' r"'''.*?'''"
+        r'|"(?:\\.|[^"\\\n])*"' r"|'(?:\\.|[^'\\\n])*'|`[^`\n]*`)"
+        r"|(?P<numero>\b\d+(?:\.\d+)?\b)"
+        r"|(?P<funcao>\b[A-Za-z_]\w*(?=\())"
+        r"|(?P<palavra>\b[A-Za-z_]\w*\b)",
+        re.S
+    )
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self._cache = OrderedDict()  # chave -> [(início, tamanho, categoria)]
+        self._pendentes = set()
+        self._fila = queue.Queue()
+        self._trava = Lock()
+        self._thread = None
+        self._pygments = None  # Importado no próprio thread, na primeira vez
+
+    def trechos(self, chave: str) -> Optional[list]:
+        with self._trava:
+            trechos = self._cache.get(chave)
+            if trechos is not None:
+                self._cache.move_to_end(chave)
+            return trechos
+
+    def solicitar(self, chave: str, linguagem: str, codigo: str):
+        with self._trava:
+            if chave in self._cache or chave in self._pendentes:
+                return
+            self._pendentes.add(chave)
+            if self._thread is None:
+                self._thread = Thread(target=self._trabalhar, daemon=True)
+                self._thread.start()
+        self._fila.put((chave, linguagem, codigo))
+
+    def _trabalhar(self):
+        while True:
+            chave, linguagem, codigo = self._fila.get()
+            try:
+                trechos = self.realcar(linguagem, codigo)
+            except Exception:
+                trechos = []
+            with self._trava:
+                self._pendentes.discard(chave)
+                self._cache[chave] = trechos
+                while len(self._cache) > CACHE_REALCE:
+                    self._cache.popitem(last=False)
+            self.pronto.emit(chave)
+
+    def realcar(self, linguagem: str, codigo: str) -> list:
+        if self._pygments is None:
+            try:
+                from pygments import lexers, token, util
+                self._pygments = (lexers, token, util)
+            except ImportError:
+                self._pygments = False
+        if self._pygments:
+            trechos = self._realcar_pygments(linguagem, codigo)
+            if trechos is not None:
+                return trechos
+        return self._realcar_regex(codigo)
+
+    def _realcar_pygments(self, linguagem: str, codigo: str) -> Optional[list]:
+        lexers, token, util = self._pygments
+        try:
+            lexer = lexers.get_lexer_by_name(linguagem, stripnl=False, ensurenl=False)
+        except util.ClassNotFound:
+            return None
+        categorias = (
+            (token.Comment, "comentario"), (token.String, "texto"), (token.Number, "numero"),
+            (token.Keyword, "palavra_chave"), (token.Name.Function, "funcao"),
+            (token.Name.Class, "funcao"), (token.Name.Builtin, "embutido"),
+        )
+        trechos = []
+        for inicio, tipo, valor in lexer.get_tokens_unprocessed(codigo):
+            for pai, categoria in categorias:
+                if tipo in pai:
+                    trechos.append((inicio, len(valor), categoria))
+                    break
+        return trechos
+
+    def _realcar_regex(self, codigo: str) -> list:
+        trechos = []
+        for achado in self.PADRAO.finditer(codigo):
+            categoria = achado.lastgroup
+            if categoria == "palavra":
+                if achado.group() not in self.PALAVRAS_CHAVE:
+                    continue
+                categoria = "palavra_chave"
+            trechos.append((achado.start(), achado.end() - achado.start(), categoria))
+        return trechos
+
+
+# Posições do QTextCursor contam unidades UTF-16, e as do Python, caracteres:
+# fora do BMP (emoji, por exemplo) um caractere ocupa duas unidades. Devolve a
+# posição UTF-16 de cada índice do texto, ou None se as duas coincidem
+def posicoes_utf16(texto: str) -> Optional[List[int]]:
+    if len(texto.encode("utf-16-le")) // 2 == len(texto):
+        return None
+    return list(itertools.accumulate((2 if ord(c) > 0xFFFF else 1 for c in texto), initial=0))
+
+
+# Desenha cada mensagem com um QTextDocument próprio. Só as linhas visíveis são
+# desenhadas; documentos ficam num cache LRU e as alturas medidas ficam na linha.
+# Respostas do modelo são desenhadas bloco a bloco (MarkdownIncremental): blocos
+# congelados têm documento e altura em cache e só o bloco aberto é refeito
+class DelegadoMensagem(QStyledItemDelegate):
+    CORES = {
+        "usuario": "#add8e6",  # Cor azul claro para usuário
+        "usuario_editado": "#90caf9",  # Cor azul mais forte para edição
+        "modelo": "#e0e0e0",
+        "erro": "#ff6666",
+        "info": "#a5d6a7",  # Cor verde para informações
+    }
+    PREFIXOS = {"usuario": "Você: ", "usuario_editado": "Você (Editado): "}
+    COR_NOME_MODELO = "#ffcc80"
+    COR_FUNDO_CODIGO = "#262626"
+    COR_DESTAQUE = "#3d3a1f"  # Mensagem aberta a partir da busca
+    MARGEM = 6
+    MARGEM_CODIGO = 6
+    ESPACO_BLOCOS = 4
+
+    def __init__(self, view: QListView, max_documentos: int = 200, max_blocos: int = 2000):
+        super().__init__(view)
+        self.view = view
+        self.max_documentos = max_documentos
+        self.max_blocos = max_blocos
+        self._documentos = OrderedDict()  # id da mensagem -> (versao, largura, doc)
+        self._blocos = OrderedDict()  # (chave do bloco, largura) -> doc
+        self._abertos = {}  # id da mensagem -> (tipo, início, tamanho, largura, doc)
+        self.realcador = RealcadorCodigo(self)
+        self.realcador.pronto.connect(self._ao_realcar)
+        self.destacada = None  # id da mensagem destacada
+
+    @staticmethod
+    def texto_exibicao(mensagem: Mensagem) -> str:
+        if mensagem.tipo == "modelo":
+            return f"Modelo: {mensagem.modelo}\n{mensagem.conteudo}" if mensagem.modelo else mensagem.conteudo
+        return DelegadoMensagem.PREFIXOS.get(mensagem.tipo, "") + mensagem.conteudo
+
+    def limpar_cache(self):
+        self._documentos.clear()
+        self._blocos.clear()
+        self._abertos.clear()
+
+    def documentos_em_cache(self) -> List[QTextDocument]:
+        return ([entrada[2] for entrada in self._documentos.values()] + list(self._blocos.values())
+                + [entrada[4] for entrada in self._abertos.values()])
+
+    def _largura(self) -> int:
+        return max(50, self.view.viewport().width())
+
+    def _guardar(self, cache: OrderedDict, chave, valor, limite: int):
+        cache[chave] = valor
+        cache.move_to_end(chave)
+        while len(cache) > limite:
+            cache.popitem(last=False)
+
+    def _criar_documento(self, mensagem: Mensagem, largura: int) -> QTextDocument:
+        doc = QTextDocument()
+        doc.setDefaultFont(self.view.font())
+        doc.setDocumentMargin(self.MARGEM)
+        cursor = QTextCursor(doc)
+
+        if mensagem.tipo == "modelo":
+            # Só o nome do modelo; o conteúdo é desenhado em blocos
+            formato = QTextCharFormat()
+            formato.setForeground(QColor(self.COR_NOME_MODELO))
+            cursor.insertText("Modelo: " + mensagem.modelo, formato)
+            doc.setTextWidth(largura)
+            return doc
+
+        formato = QTextCharFormat()
+        formato.setForeground(QColor(self.CORES.get(mensagem.tipo, "#e0e0e0")))
+        cursor.insertText(self.PREFIXOS.get(mensagem.tipo, "") + mensagem.conteudo, formato)
+        doc.setTextWidth(largura)
+        return doc
+
+    def _documento(self, mensagem: Mensagem, largura: int) -> QTextDocument:
+        # Respostas só mudam de cabeçalho se o modelo mudar; o resto muda a cada trecho
+        versao = mensagem.modelo if mensagem.tipo == "modelo" else mensagem.versao
+        entrada = self._documentos.get(mensagem.id)
+        if entrada is not None and entrada[0] == versao and entrada[1] == largura:
+            self._documentos.move_to_end(mensagem.id)
+            return entrada[2]
+
+        doc = self._criar_documento(mensagem, largura)
+        self._guardar(self._documentos, mensagem.id, (versao, largura, doc), self.max_documentos)
+        return doc
+
+    # Documentos dos blocos de uma resposta
+
+    def _documento_texto(self, texto: str, largura: int) -> QTextDocument:
+        doc = QTextDocument()
+        doc.setDefaultFont(self.view.font())
+        doc.setDocumentMargin(0)
+        doc.setMarkdown(texto)
+        doc.setTextWidth(largura - 2 * self.MARGEM)
+        return doc
+
+    def _documento_codigo(self, codigo: str, largura: int) -> QTextDocument:
+        doc = QTextDocument()
+        doc.setDefaultFont(QFontDatabase.systemFont(QFontDatabase.FixedFont))
+        doc.setDocumentMargin(self.MARGEM_CODIGO)
+        doc.setPlainText(codigo)
+        doc.setTextWidth(largura - 2 * self.MARGEM)
+        return doc
+
+    def _aplicar_realce(self, doc: QTextDocument, trechos: list):
+        formatos = {}
+        for categoria, cor in RealcadorCodigo.CORES.items():
+            formatos[categoria] = QTextCharFormat()
+            formatos[categoria].setForeground(QColor(cor))
+        cursor = QTextCursor(doc)
+        texto = doc.toPlainText()
+        limite = len(texto)
+        posicoes = posicoes_utf16(texto)  # Os trechos vêm em caracteres
+        # Um único bloco de edição: o layout é refeito uma vez, não a cada trecho
+        cursor.beginEditBlock()
+        for inicio, tamanho, categoria in trechos:
+            fim = inicio + tamanho
+            if fim > limite:
+                break
+            if posicoes is not None:
+                inicio, fim = posicoes[inicio], posicoes[fim]
+            cursor.setPosition(inicio)
+            cursor.setPosition(fim, QTextCursor.KeepAnchor)
+            cursor.mergeCharFormat(formatos[categoria])
+        cursor.endEditBlock()
+
+    def _documento_bloco(self, bloco: BlocoMarkdown, largura: int) -> QTextDocument:
+        chave = (bloco.chave, largura)
+        doc = self._blocos.get(chave)
+        if doc is not None:
+            self._blocos.move_to_end(chave)
+            return doc
+        if bloco.tipo == "codigo":
+            codigo = bloco.texto.rstrip("\n")
+            doc = self._documento_codigo(codigo, largura)
+            trechos = self.realcador.trechos(bloco.chave)
+            if trechos is None:
+                self.realcador.solicitar(bloco.chave, bloco.linguagem, codigo)
+            else:
+                self._aplicar_realce(doc, trechos)
+        else:
+            doc = self._documento_texto(bloco.texto, largura)
+        self._guardar(self._blocos, chave, doc, self.max_blocos)
+        return doc
+
+    # Bloco aberto: código recebe só o texto novo no fim do documento (o Qt
+    # refaz o layout apenas das linhas alteradas); texto é reprocessado, mas
+    # tem no máximo LIMITE_BLOCO_ABERTO caracteres
+    def _documento_aberto(self, mensagem: Mensagem, aberto: tuple, largura: int) -> QTextDocument:
+        tipo, inicio, texto, _ = aberto
+        entrada = self._abertos.get(mensagem.id)
+        if tipo == "codigo":
+            if entrada is not None and entrada[:2] == (tipo, inicio) and entrada[3] == largura \
+                    and len(texto) >= entrada[2]:
+                doc = entrada[4]
+                if len(texto) > entrada[2]:
+                    cursor = QTextCursor(doc)
+                    cursor.movePosition(QTextCursor.End)
+                    cursor.insertText(texto[entrada[2]:])
+            else:
+                doc = self._documento_codigo(texto, largura)
+        else:
+            if entrada is not None and entrada[:3] == (tipo, inicio, len(texto)) and entrada[3] == largura:
+                return entrada[4]
+            doc = self._documento_texto(texto, largura)
+        self._abertos[mensagem.id] = (tipo, inicio, len(texto), largura, doc)
+        return doc
+
+    # Quando o bloco de código aberto é congelado, o documento que já vinha
+    # recebendo o texto é aproveitado em vez de refeito do zero
+    def _promover_aberto(self, mensagem: Mensagem, bloco: BlocoMarkdown, largura: int):
+        entrada = self._abertos.get(mensagem.id)
+        if entrada is None or entrada[0] != "codigo" or entrada[3] != largura or bloco.tipo != "codigo":
+            return
+        codigo = bloco.texto.rstrip("\n")
+        doc = entrada[4]
+        if not doc.toPlainText().startswith(codigo):
+            return
+        del self._abertos[mensagem.id]
+        cursor = QTextCursor(doc)
+        cursor.setPosition(len(codigo.encode("utf-16-le")) // 2)
+        cursor.movePosition(QTextCursor.End, QTextCursor.KeepAnchor)
+        cursor.removeSelectedText()
+        self._guardar(self._blocos, (bloco.chave, largura), doc, self.max_blocos)
+        self.realcador.solicitar(bloco.chave, bloco.linguagem, codigo)
+
+    def _markdown(self, mensagem: Mensagem) -> MarkdownIncremental:
+        if mensagem.markdown is None:
+            mensagem.markdown = MarkdownIncremental()
+        markdown = mensagem.markdown
+        if mensagem.aberta:
+            markdown.alimentar(mensagem.conteudo)
+        else:
+            markdown.finalizar(mensagem.conteudo)
+        return markdown
+
+    # Blocos da resposta com suas alturas: [(bloco ou None se aberto, altura)]
+    def _layout_resposta(self, mensagem: Mensagem, largura: int) -> Tuple[list, Optional[tuple]]:
+        markdown = self._markdown(mensagem)
+        itens = []
+        for bloco in markdown.blocos:
+            if bloco.altura is None or bloco.altura[0] != largura:
+                self._promover_aberto(mensagem, bloco, largura)
+                altura = math.ceil(self._documento_bloco(bloco, largura).size().height())
+                bloco.altura = (largura, altura)
+            itens.append((bloco, bloco.altura[1]))
+        aberto = markdown.aberto(mensagem.conteudo) if mensagem.aberta else None
+        if aberto is None:
+            self._abertos.pop(mensagem.id, None)
+        else:
+            altura = math.ceil(self._documento_aberto(mensagem, aberto, largura).size().height())
+            itens.append((None, altura))
+        return itens, aberto
+
+    def sizeHint(self, option, index) -> QSize:
+        mensagem = index.data(Qt.UserRole)
+        largura = self._largura()
+        if mensagem.altura is not None and mensagem.altura[:2] == (largura, mensagem.versao):
+            return QSize(largura, mensagem.altura[2])
+
+        altura = math.ceil(self._documento(mensagem, largura).size().height())
+        if mensagem.tipo == "modelo":
+            if not mensagem.modelo:
+                altura = self.MARGEM
+            itens, _ = self._layout_resposta(mensagem, largura)
+            altura += sum(h + self.ESPACO_BLOCOS for _, h in itens) + self.MARGEM
+        mensagem.altura = (largura, mensagem.versao, altura)
+        return QSize(largura, altura)
+
+    def _desenhar(self, painter, doc: QTextDocument, cor: str, recorte: QRectF):
+        contexto = QAbstractTextDocumentLayout.PaintContext()
+        contexto.palette.setColor(QPalette.Text, QColor(cor))
+        contexto.clip = recorte  # Linhas fora da área visível não são desenhadas
+        doc.documentLayout().draw(painter, contexto)
+
+    def paint(self, painter, option, index):
+        mensagem = index.data(Qt.UserRole)
+        largura = self._largura()
+        painter.save()
+        painter.translate(option.rect.topLeft())
+        if mensagem.id == self.destacada:
+            painter.fillRect(QRectF(0, 0, largura, option.rect.height()), QColor(self.COR_DESTAQUE))
+        if mensagem.tipo != "modelo":
+            self._documento(mensagem, largura).drawContents(painter)
+            painter.restore()
+            return
+
+        y = self.MARGEM
+        if mensagem.modelo:
+            cabecalho = self._documento(mensagem, largura)
+            cabecalho.drawContents(painter)
+            y = math.ceil(cabecalho.size().height())
+
+        # Só os blocos visíveis são desenhados
+        visivel = self.view.viewport().rect().translated(-option.rect.topLeft())
+        itens, aberto = self._layout_resposta(mensagem, largura)
+        cor = self.CORES["modelo"]
+        for bloco, altura in itens:
+            if y + altura >= visivel.top() and y <= visivel.bottom():
+                if bloco is None:
+                    tipo = aberto[0]
+                    doc = self._documento_aberto(mensagem, aberto, largura)
+                else:
+                    tipo = bloco.tipo
+                    doc = self._documento_bloco(bloco, largura)
+                painter.save()
+                painter.translate(self.MARGEM, y)
+                if tipo == "codigo":
+                    painter.fillRect(QRectF(0, 0, largura - 2 * self.MARGEM, altura), QColor(self.COR_FUNDO_CODIGO))
+                self._desenhar(painter, doc, cor, QRectF(visivel).translated(-self.MARGEM, -y))
+                painter.restore()
+            y += altura + self.ESPACO_BLOCOS
+        painter.restore()
+
+    # Aplica o realce que terminou aos documentos em cache e redesenha
+    @Slot(str)
+    def _ao_realcar(self, chave: str):
+        trechos = self.realcador.trechos(chave)
+        if not trechos:
+            return
+        for (chave_bloco, _), doc in self._blocos.items():
+            if chave_bloco == chave:
+                self._aplicar_realce(doc, trechos)
+        self.view.viewport().update()
+
+
+# Histórico recente de métricas por modelo, para comparar cada resposta com a
+# mediana das anteriores
+class MetricasDesempenho:
+    def __init__(self, tamanho: int = HISTORICO_DESEMPENHO):
+        self.tamanho = tamanho
+        self._por_modelo = {}
+        self._trava = Lock()
+
+    @staticmethod
+    def derivar(metricas: dict) -> dict:
+        derivadas = dict(metricas)
+        if metricas.get("eval_duration"):
+            derivadas["tokens_s"] = metricas.get("eval_count", 0) / metricas["eval_duration"] * 1e9
+        if metricas.get("prompt_eval_duration"):
+            derivadas["prompt_tokens_s"] = (metricas.get("prompt_eval_count", 0)
+                                            / metricas["prompt_eval_duration"] * 1e9)
+        return derivadas
+
+    def registrar(self, modelo: str, metricas: dict) -> dict:
+        derivadas = self.derivar(metricas)
+        with self._trava:
+            self._por_modelo.setdefault(modelo, deque(maxlen=self.tamanho)).append(derivadas)
+        return derivadas
+
+    def modelos(self) -> List[str]:
+        with self._trava:
+            return list(self._por_modelo)
+
+    # Mediana de um campo nas respostas anteriores à última
+    def mediana(self, modelo: str, campo: str, excluir_ultima: bool = True) -> Optional[float]:
+        with self._trava:
+            historico = list(self._por_modelo.get(modelo, ()))
+        if excluir_ultima:
+            historico = historico[:-1]
+        valores = [m[campo] for m in historico if m.get(campo) is not None]
+        return statistics.median(valores) if valores else None
+
+    def ultima(self, modelo: str) -> Optional[dict]:
+        with self._trava:
+            historico = self._por_modelo.get(modelo)
+            return historico[-1] if historico else None
+
+    def quantidade(self, modelo: str) -> int:
+        with self._trava:
+            return len(self._por_modelo.get(modelo, ()))
+
+
+# Progresso agregado de um download: soma completed/total de cada camada
+# (digest), calcula velocidade e tempo restante e limita a frequência de
+# atualização da interface
+class ProgressoDownload:
+    def __init__(self, intervalo: float = INTERVALO_PROGRESSO_DOWNLOAD,
+                 janela: float = JANELA_VELOCIDADE_DOWNLOAD):
+        self.intervalo = intervalo
+        self.janela = janela
+        self.camadas = {}  # digest -> (completed, total)
+        self.concluido = 0
+        self.total = 0
+        self.status = ""
+        self._vistos = set()
+        self._amostras = deque()  # (instante, bytes concluídos)
+        self._ultima_atualizacao = None
+
+    # Registra um evento de status; devolve True se for uma mudança de estado
+    # (status ainda não visto), que vale uma linha no log
+    def registrar(self, evento: EventoStatus, agora: Optional[float] = None) -> bool:
+        agora = time.monotonic() if agora is None else agora
+        if evento.digest and evento.total:
+            anterior_concluido, anterior_total = self.camadas.get(evento.digest, (0, 0))
+            concluido = evento.completed or 0
+            self.camadas[evento.digest] = (concluido, evento.total)
+            self.concluido += concluido - anterior_concluido
+            self.total += evento.total - anterior_total
+            self._amostras.append((agora, self.concluido))
+            while len(self._amostras) > 2 and agora - self._amostras[0][0] > self.janela:
+                self._amostras.popleft()
+        self.status = evento.status
+        if evento.status in self._vistos:
+            return False
+        self._vistos.add(evento.status)
+        return True
+
+    # True no máximo uma vez por intervalo (e sempre na primeira chamada)
+    def deve_atualizar(self, agora: Optional[float] = None) -> bool:
+        agora = time.monotonic() if agora is None else agora
+        if self._ultima_atualizacao is not None and agora - self._ultima_atualizacao < self.intervalo:
+            return False
+        self._ultima_atualizacao = agora
+        return True
+
+    def fracao(self) -> Optional[float]:
+        return min(1.0, self.concluido / self.total) if self.total else None
+
+    # Bytes por segundo na janela recente
+    def velocidade(self) -> Optional[float]:
+        if len(self._amostras) < 2:
+            return None
+        (t0, b0), (t1, b1) = self._amostras[0], self._amostras[-1]
+        return (b1 - b0) / (t1 - t0) if t1 > t0 else None
+
+    def restante(self) -> Optional[float]:
+        velocidade = self.velocidade()
+        if not velocidade or velocidade <= 0 or not self.total:
+            return None
+        return max(0, self.total - self.concluido) / velocidade
+
+    @staticmethod
+    def formatar_bytes(valor: float) -> str:
+        for unidade in ("B", "KB", "MB", "GB"):
+            if abs(valor) < 1000:
+                return f"{valor:.0f} {unidade}" if unidade == "B" else f"{valor:.1f} {unidade}"
+            valor /= 1000
+        return f"{valor:.1f} TB"
+
+    @staticmethod
+    def formatar_duracao(segundos: float) -> str:
+        segundos = int(round(segundos))
+        horas, segundos = divmod(segundos, 3600)
+        minutos, segundos = divmod(segundos, 60)
+        if horas:
+            return f"{horas}h{minutos:02d}m"
+        return f"{minutos}m{segundos:02d}s" if minutos else f"{segundos}s"
+
+    def resumo(self) -> str:
+        if not self.total:
+            return self.status
+        partes = [f"{self.formatar_bytes(self.concluido)} / {self.formatar_bytes(self.total)}"]
+        velocidade = self.velocidade()
+        if velocidade:
+            partes.append(f"{self.formatar_bytes(velocidade)}/s")
+        restante = self.restante()
+        if restante is not None and self.concluido < self.total:
+            partes.append(f"restante {self.formatar_duracao(restante)}")
+        return " — ".join(partes)
+
+
+# Catálogo de modelos por host: lista do /api/tags com validade, detalhes do
+# /api/show buscados sob demanda e um instantâneo em disco. Buscas
+# simultâneas da mesma informação compartilham uma única requisição
+class CatalogoModelos:
+    def __init__(self, caminho: Optional[str] = ARQUIVO_CATALOGO, ttl: float = TTL_CATALOGO):
+        self.caminho = caminho
+        self.ttl = ttl
+        self._listas = {}  # host -> (instante, [registros do /api/tags])
+        self._detalhes = {}  # digest (ou nome) -> detalhes resumidos
+        self._instantaneo = {}  # host -> [{"name", "digest"}] da última lista conhecida
+        self._em_andamento = {}  # chave -> [Event, resultado, erro]
+        self._trava = Lock()
+        self.carregar()
+
+    def carregar(self):
+        if not self.caminho:
+            return
+        try:
+            with open(self.caminho, encoding="utf-8") as arquivo:
+                dados = json.load(arquivo)
+        except (OSError, ValueError):
+            return
+        with self._trava:
+            self._instantaneo = {host: list(registros) for host, registros in dados.get("hosts", {}).items()}
+            self._detalhes.update(dados.get("detalhes", {}))
+
+    def salvar(self):
+        if not self.caminho:
+            return
+        with self._trava:
+            # Só os detalhes de modelos que ainda existem em algum host
+            digests = {m.get("digest") or m["name"] for registros in self._instantaneo.values() for m in registros}
+            dados = {"hosts": dict(self._instantaneo),
+                     "detalhes": {chave: d for chave, d in self._detalhes.items() if chave in digests}}
+        try:
+            os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+            temporario = self.caminho + ".tmp"
+            with open(temporario, "w", encoding="utf-8") as arquivo:
+                json.dump(dados, arquivo, ensure_ascii=False)
+            os.replace(temporario, self.caminho)
+        except OSError:
+            pass  # O instantâneo é só uma otimização
+
+    # Executa "buscar" uma vez por chave; quem pedir a mesma chave enquanto a
+    # busca está em andamento espera e recebe o mesmo resultado (ou erro)
+    def _unica(self, chave, buscar):
+        with self._trava:
+            voo = self._em_andamento.get(chave)
+            lider = voo is None
+            if lider:
+                voo = self._em_andamento[chave] = [Event(), None, None]
+        if not lider:
+            voo[0].wait()
+            if voo[2] is not None:
+                raise voo[2]
+            return voo[1]
+        try:
+            voo[1] = buscar()
+            return voo[1]
+        except Exception as e:
+            voo[2] = e
+            raise
+        finally:
+            with self._trava:
+                del self._em_andamento[chave]
+            voo[0].set()
+
+    # Nomes dos modelos do host; usa a lista em memória enquanto for válida
+    def listar(self, host: str, buscar, forcar: bool = False) -> List[str]:
+        with self._trava:
+            entrada = self._listas.get(host)
+        if entrada and not forcar and time.monotonic() - entrada[0] < self.ttl:
+            return [m["name"] for m in entrada[1]]
+
+        def buscar_e_guardar():
+            registros = buscar()
+            instantaneo = [{"name": m["name"], "digest": m.get("digest")} for m in registros]
+            with self._trava:
+                self._listas[host] = (time.monotonic(), registros)
+                mudou = self._instantaneo.get(host) != instantaneo
+                self._instantaneo[host] = instantaneo
+            if mudou:  # As sondagens do pool repetem a lista a cada poucos segundos
+                self.salvar()
+            return registros
+
+        return [m["name"] for m in self._unica(("lista", host), buscar_e_guardar)]
+
+    def instantaneo(self, host: str) -> Optional[List[str]]:
+        with self._trava:
+            registros = self._instantaneo.get(host)
+            return [m["name"] for m in registros] if registros is not None else None
+
+    def digest(self, host: str, modelo: str) -> Optional[str]:
+        with self._trava:
+            registros = self._instantaneo.get(host, ())
+        for registro in registros:
+            if registro["name"] == modelo and registro.get("digest"):
+                return registro["digest"]
+        return None
+
+    def _chave_detalhes(self, host: str, modelo: str) -> str:
+        # O digest muda quando o modelo é baixado de novo
+        return self.digest(host, modelo) or modelo
+
+    def detalhes(self, host: str, modelo: str) -> Optional[dict]:
+        chave = self._chave_detalhes(host, modelo)
+        with self._trava:
+            return self._detalhes.get(chave)
+
+    # Detalhes do /api/show, buscados só na primeira vez
+    def obter_detalhes(self, host: str, modelo: str, buscar) -> dict:
+        chave = self._chave_detalhes(host, modelo)
+        with self._trava:
+            if chave in self._detalhes:
+                return self._detalhes[chave]
+
+        def buscar_e_guardar():
+            detalhes = self.resumir_show(buscar(modelo))
+            with self._trava:
+                self._detalhes[chave] = detalhes
+            self.salvar()
+            return detalhes
+
+        return self._unica(("detalhes", chave), buscar_e_guardar)
+
+    @staticmethod
+    def resumir_show(dados: dict) -> dict:
+        info = dados.get("details") or {}
+        detalhes = {
+            "familia": info.get("family"),
+            "parametros": info.get("parameter_size"),
+            "quantizacao": info.get("quantization_level"),
+            "contexto": None,
+        }
+        for chave, valor in (dados.get("model_info") or {}).items():
+            if chave.endswith(".context_length"):
+                detalhes["contexto"] = valor
+                break
+        return detalhes
+
+    @staticmethod
+    def descrever(detalhes: Optional[dict]) -> str:
+        if not detalhes:
+            return ""
+        partes = [detalhes.get("familia"), detalhes.get("parametros"), detalhes.get("quantizacao")]
+        if detalhes.get("contexto"):
+            contexto = detalhes["contexto"]
+            partes.append(f"ctx {contexto // 1024}k" if contexto >= 1024 else f"ctx {contexto}")
+        return " · ".join(str(parte) for parte in partes if parte)
+
+
+# Respostas de gerações determinísticas, pela chave do digest do modelo,
+# mensagens e opções. As usadas mais recentemente ficam num LRU em memória;
+# todas vão para um SQLite em disco que, passando do tamanho máximo, perde
+# as usadas há mais tempo. Conta acertos, faltas e o tempo de geração poupado
+class CacheRespostas:
+    ESQUEMA = """
+        CREATE TABLE IF NOT EXISTS respostas (
+            chave TEXT PRIMARY KEY,
+            conteudo TEXT NOT NULL,
+            metricas TEXT NOT NULL,
+            tamanho INTEGER NOT NULL,
+            usada_em REAL NOT NULL
+        ) WITHOUT ROWID;
+        CREATE INDEX IF NOT EXISTS respostas_usadas ON respostas (usada_em);
+    """
+
+    def __init__(self, caminho: Optional[str] = ARQUIVO_CACHE_RESPOSTAS,
+                 max_memoria: int = CACHE_RESPOSTAS_MEMORIA, max_bytes: int = CACHE_RESPOSTAS_DISCO):
+        self.caminho = caminho  # None: só em memória
+        self.max_memoria = max_memoria
+        self.max_bytes = max_bytes
+        self.acertos = 0
+        self.faltas = 0
+        self.segundos_poupados = 0.0
+        self._memoria = OrderedDict()  # chave -> (conteúdo, métricas)
+        self._conexao = None  # Aberta no primeiro uso
+        self._bytes_disco = 0
+        self._trava = Lock()
+
+    # Só vale guardar o que o servidor gera igual de novo
+    @staticmethod
+    def deterministica(opcoes: Optional[dict]) -> bool:
+        return bool(opcoes) and ("seed" in opcoes or opcoes.get("temperature") == 0)
+
+    @staticmethod
+    def chave(digest: str, mensagens: List[dict], opcoes: Optional[dict]) -> str:
+        dados = json.dumps({"modelo": digest, "mensagens": mensagens, "opcoes": opcoes or {}},
+                           sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(dados.encode("utf-8")).hexdigest()
+
+    def _disco(self) -> Optional[sqlite3.Connection]:
+        if self._conexao is None and self.caminho:
+            try:
+                os.makedirs(os.path.dirname(self.caminho), exist_ok=True)
+                conexao = sqlite3.connect(self.caminho, check_same_thread=False, isolation_level=None)
+                conexao.executescript(self.ESQUEMA)
+                self._bytes_disco = conexao.execute("SELECT COALESCE(SUM(tamanho), 0) FROM respostas").fetchone()[0]
+            except (sqlite3.Error, OSError):
+                self.caminho = None  # Segue só com a memória
+                return None
+            self._conexao = conexao
+        return self._conexao
+
+    def _guardar_memoria(self, chave: str, entrada: Tuple[str, dict]):
+        self._memoria[chave] = entrada
+        self._memoria.move_to_end(chave)
+        while len(self._memoria) > self.max_memoria:
+            self._memoria.popitem(last=False)
+
+    def obter(self, chave: str) -> Optional[Tuple[str, dict]]:
+        with self._trava:
+            entrada = self._memoria.get(chave)
+            if entrada is not None:
+                self._memoria.move_to_end(chave)
+            else:
+                conexao = self._disco()
+                try:
+                    linha = conexao.execute("SELECT conteudo, metricas FROM respostas WHERE chave = ?",
+                                            (chave,)).fetchone() if conexao is not None else None
+                    if linha is not None:
+                        conexao.execute("UPDATE respostas SET usada_em = ? WHERE chave = ?", (time.time(), chave))
+                        entrada = (linha[0], json.loads(linha[1]))
+                        self._guardar_memoria(chave, entrada)
+                except (sqlite3.Error, ValueError):
+                    entrada = None
+            if entrada is None:
+                self.faltas += 1
+                return None
+            self.acertos += 1
+            self.segundos_poupados += entrada[1].get("total_duration", 0) / 1e9
+            return entrada
+
+    def guardar(self, chave: str, conteudo: str, metricas: dict):
+        metricas = {campo: metricas[campo] for campo in CAMPOS_ESTATISTICAS if campo in metricas}
+        with self._trava:
+            self._guardar_memoria(chave, (conteudo, metricas))
+            conexao = self._disco()
+            if conexao is None:
+                return
+            tamanho = len(conteudo.encode("utf-8"))
+            try:
+                anterior = conexao.execute("SELECT tamanho FROM respostas WHERE chave = ?", (chave,)).fetchone()
+                conexao.execute("INSERT OR REPLACE INTO respostas VALUES (?, ?, ?, ?, ?)",
+                                (chave, conteudo, json.dumps(metricas), tamanho, time.time()))
+                self._bytes_disco += tamanho - (anterior[0] if anterior else 0)
+                self._despejar(conexao)
+            except sqlite3.Error:
+                pass  # O cache é só uma otimização
 
-from PySide6.QtWidgets import (
-    QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout, QGridLayout,
-    QTextEdit, QLineEdit, QComboBox, QPushButton, QProgressBar, QLabel,
-    QMessageBox, QListWidget, QScrollArea, QMenu, QDialog, QListWidgetItem,
-    QFrame, QSizePolicy, QMenuBar, QScrollBar, QStyleFactory
-)
-from PySide6.QtGui import (QTextCursor, QFont, QAction, QKeyEvent, QTextCharFormat, 
-                          QColor, QPalette, QFontMetrics, QIcon, QTextDocument)
-from PySide6.QtCore import Qt, QThread, Signal, Slot, QObject, QSize, QEvent, QUrl
+    # Remove as respostas usadas há mais tempo até caber no limite
+    def _despejar(self, conexao: sqlite3.Connection):
+        excesso = self._bytes_disco - self.max_bytes
+        if excesso <= 0:
+            return
+        removidas = []
+        for chave, tamanho in conexao.execute("SELECT chave, tamanho FROM respostas ORDER BY usada_em"):
+            removidas.append((chave,))
+            excesso -= tamanho
+            self._bytes_disco -= tamanho
+            if excesso <= 0:
+                break
+        conexao.executemany("DELETE FROM respostas WHERE chave = ?", removidas)
 
-__version__ = "1.40.0"
+    def limpar(self):
+        with self._trava:
+            self._memoria.clear()
+            conexao = self._disco()
+            if conexao is not None:
+                try:
+                    conexao.execute("DELETE FROM respostas")
+                    conexao.execute("VACUUM")
+                except sqlite3.Error:
+                    pass
+            self._bytes_disco = 0
+            self.acertos = self.faltas = 0
+            self.segundos_poupados = 0.0
 
-# Classe personalizada para entrada de texto
-class EntradaUsuario(QTextEdit):
-    enterPressed = Signal()
-    
-    def keyPressEvent(self, event: QKeyEvent):
-        if event.key() == Qt.Key_Return and not event.modifiers() & Qt.ShiftModifier:
-            self.enterPressed.emit()
-            event.accept()
-        elif event.key() == Qt.Key_Return and event.modifiers() & Qt.ShiftModifier:
-            self.insertPlainText("\n")
-        else:
-            super().keyPressEvent(event)
+    def resumo(self) -> str:
+        consultas = self.acertos + self.faltas
+        taxa = f" ({self.acertos / consultas:.0%})" if consultas else ""
+        return (f"Cache: {self.acertos} acertos, {self.faltas} faltas{taxa} · "
+                f"{self.segundos_poupados:.1f} s poupados")
 
-# Tempos de timeout configuráveis
-TIMEOUT_CONEXAO = 15
-TIMEOUT_CONVERSA = 300
-TIMEOUT_DOWNLOAD = 0
 
-class ModeloNaoEncontradoError(Exception):
-    pass
+# Um modelo na fila de downloads
+class ItemDownload:
+    __slots__ = ("id", "nome", "estado", "tentativas", "erro", "progresso", "geracao", "_espera")
 
-class ErroConexaoError(Exception):
-    pass
+    _contador = itertools.count(1)
 
-class ErroServidorError(Exception):
-    pass
+    NA_FILA = "Na fila"
+    BAIXANDO = "Baixando"
+    AGUARDANDO = "Nova tentativa"
+    CONCLUIDO = "Concluído"
+    FALHOU = "Falhou"
+    CANCELADO = "Cancelado"
+    FINAIS = (CONCLUIDO, FALHOU, CANCELADO)
+
+    def __init__(self, nome: str):
+        self.id = next(ItemDownload._contador)
+        self.nome = nome
+        self.estado = self.NA_FILA
+        self.tentativas = 0
+        self.erro = ""
+        self.progresso = ProgressoDownload()
+        self.geracao = Geracao()
+        self._espera = Event()
+
+    @property
+    def finalizado(self) -> bool:
+        return self.estado in self.FINAIS
+
+    def cancelar(self):
+        self.geracao.cancelar()
+        self._espera.set()
+
+    # Espera antes de uma nova tentativa; devolve False se cancelado
+    def aguardar(self, segundos: float) -> bool:
+        return not self._espera.wait(segundos) and not self.geracao.cancelada
+
+
+# Fila de downloads de modelos com paralelismo limitado, cancelamento por
+# item e novas tentativas com espera exponencial em falhas de rede
+class FilaDownloads(QObject):
+    item_atualizado = Signal(object)  # ItemDownload
+    log = Signal(str)
+    modelo_baixado = Signal(str)
+
+    def __init__(self, interface, simultaneos: int = DOWNLOADS_SIMULTANEOS,
+                 tentativas: int = TENTATIVAS_DOWNLOAD, espera: float = ESPERA_TENTATIVA_DOWNLOAD,
+                 parent=None):
+        super().__init__(parent)
+        self.interface = interface
+        self.simultaneos = max(1, simultaneos)
+        self.tentativas = max(1, tentativas)
+        self.espera = espera
+        self.itens = []
+        self._pendentes = queue.Queue()
+        self._trabalhadores = []
+        self._trava = Lock()
+
+    # Aceita nomes separados por linha, vírgula ou espaço; ignora repetidos e
+    # os que já estão na fila
+    @staticmethod
+    def separar_nomes(texto: str) -> List[str]:
+        nomes = []
+        for nome in re.split(r"[\s,;]+", texto):
+            # Ignora o "ollama run"/"ollama pull" copiado da biblioteca
+            if nome and nome not in ("ollama", "run", "pull") and nome not in nomes:
+                nomes.append(nome)
+        return nomes
+
+    def adicionar(self, nomes: List[str]) -> List[ItemDownload]:
+        novos = []
+        with self._trava:
+            ativos = {item.nome for item in self.itens if not item.finalizado}
+            for nome in nomes:
+                if nome in ativos:
+                    continue
+                item = ItemDownload(nome)
+                self.itens.append(item)
+                novos.append(item)
+                self._pendentes.put(item)
+            # Um trabalhador por download simultâneo, criados sob demanda
+            alvo = min(self.simultaneos, len(self._trabalhadores) + len(novos))
+            while len(self._trabalhadores) < alvo:
+                trabalhador = Thread(target=self._trabalhar, daemon=True)
+                self._trabalhadores.append(trabalhador)
+                trabalhador.start()
+        for item in novos:
+            self.item_atualizado.emit(item)
+        return novos
+
+    def cancelar(self, item: ItemDownload):
+        if item.finalizado:
+            return
+        item.cancelar()
+        if item.estado in (ItemDownload.NA_FILA, ItemDownload.AGUARDANDO):
+            self._definir_estado(item, ItemDownload.CANCELADO)
+
+    def cancelar_todos(self):
+        for item in list(self.itens):
+            self.cancelar(item)
+
+    def remover_finalizados(self):
+        with self._trava:
+            self.itens = [item for item in self.itens if not item.finalizado]
+
+    def ativos(self) -> bool:
+        return any(not item.finalizado for item in self.itens)
+
+    # Soma dos bytes dos itens da fila que não falharam nem foram cancelados,
+    # para o progresso agregado
+    def agregado(self) -> Tuple[int, int, float]:
+        concluido = total = velocidade = 0
+        for item in list(self.itens):
+            if item.estado in (ItemDownload.FALHOU, ItemDownload.CANCELADO):
+                continue
+            concluido += item.progresso.concluido
+            total += item.progresso.total
+            if item.estado == ItemDownload.BAIXANDO:
+                velocidade += item.progresso.velocidade() or 0
+        return concluido, total, velocidade
+
+    def _definir_estado(self, item: ItemDownload, estado: str, erro: str = ""):
+        item.estado = estado
+        item.erro = erro
+        self.item_atualizado.emit(item)
+
+    def _trabalhar(self):
+        while True:
+            try:
+                item = self._pendentes.get(timeout=1.0)
+            except queue.Empty:
+                # Encerra só se nada foi enfileirado enquanto esperava
+                with self._trava:
+                    if self._pendentes.empty():
+                        self._trabalhadores.remove(current_thread())
+                        return
+                continue
+            if not item.geracao.cancelada:
+                self._baixar(item)
+
+    def _baixar(self, item: ItemDownload):
+        interface = self.interface
+        while True:
+            item.tentativas += 1
+            self._definir_estado(item, ItemDownload.BAIXANDO)
+            try:
+                for evento in transmitir_pull(interface.cliente_http, interface.api_url,
+                                              item.nome, item.geracao):
+                    # Só mudanças de estado vão para o log; o progresso é
+                    # enviado no máximo algumas vezes por segundo
+                    if item.progresso.registrar(evento):
+                        self.log.emit(f"{item.nome}: {evento.status}")
+                    if item.progresso.deve_atualizar():
+                        self.item_atualizado.emit(item)
+            except (ErroConexaoError, ErroServidorError) as e:
+                if item.geracao.cancelada:
+                    break
+                if isinstance(e, ErroServidorError) or item.tentativas >= self.tentativas:
+                    self.log.emit(f"{item.nome}: falha no download: {str(e)}")
+                    self._definir_estado(item, ItemDownload.FALHOU, str(e))
+                    return
+                espera = self.espera * 2 ** (item.tentativas - 1) * random.uniform(0.8, 1.2)
+                self.log.emit(f"{item.nome}: {str(e)}; nova tentativa em {espera:.1f} s")
+                self._definir_estado(item, ItemDownload.AGUARDANDO, str(e))
+                if item.aguardar(espera):
+                    continue
+                break
+            else:
+                if item.geracao.cancelada:
+                    break
+                self._definir_estado(item, ItemDownload.CONCLUIDO)
+                self.modelo_baixado.emit(item.nome)
+                return
+        self.log.emit(f"{item.nome}: download cancelado")
+        self._definir_estado(item, ItemDownload.CANCELADO)
+
+
+# Limita as gerações em andamento por host, compartilhado por todas as abas.
+# Quem passa do limite espera a vez (na ordem de chegada) no próprio thread
+# da geração, sem ocupar a interface
+class AgendadorGeracoes:
+    def __init__(self, limite: int = GERACOES_POR_HOST):
+        self.limite = max(1, limite)
+        self._condicao = Condition()
+        self._ativas = {}  # host -> gerações em andamento
+        self._espera = {}  # host -> gerações aguardando vaga, em ordem
+
+    @staticmethod
+    def host(api_url: str) -> str:
+        return urllib.parse.urlsplit(api_url).netloc.lower()
+
+    def definir_limite(self, limite: int):
+        with self._condicao:
+            self.limite = max(1, limite)
+            self._condicao.notify_all()
+
+    def _livre(self, host: str, geracao: Geracao) -> bool:
+        return self._espera[host][0] is geracao and self._ativas.get(host, 0) < self.limite
+
+    # Bloqueia até haver vaga no host; devolve False se a geração for
+    # cancelada antes. ao_esperar(à frente) é chamado se for preciso esperar
+    def adquirir(self, api_url: str, geracao: Geracao, ao_esperar=None) -> bool:
+        host = self.host(api_url)
+        with self._condicao:
+            fila = self._espera.setdefault(host, deque())
+            fila.append(geracao)
+            try:
+                if not self._livre(host, geracao) and ao_esperar is not None:
+                    ao_esperar(len(fila) - 1)
+                while not geracao.cancelada and not self._livre(host, geracao):
+                    self._condicao.wait(0.5)
+            finally:
+                fila.remove(geracao)
+                self._condicao.notify_all()
+            if geracao.cancelada:
+                return False
+            self._ativas[host] = self._ativas.get(host, 0) + 1
+            return True
+
+    def liberar(self, api_url: str):
+        host = self.host(api_url)
+        with self._condicao:
+            self._ativas[host] -= 1
+            self._condicao.notify_all()
+
+    # Cancela a geração e, se ela estiver esperando, a tira da fila na hora
+    def cancelar(self, geracao: Geracao):
+        geracao.cancelar()
+        with self._condicao:
+            self._condicao.notify_all()
+
+    # (em andamento, aguardando) no host
+    def ocupacao(self, api_url: str) -> Tuple[int, int]:
+        host = self.host(api_url)
+        with self._condicao:
+            return self._ativas.get(host, 0), len(self._espera.get(host, ()))
+
+
+# O que se sabe de um host do pool desde a última sondagem
+class EstadoHost:
+    __slots__ = ("url", "saudavel", "erro", "modelos", "carregados", "latencia")
+
+    def __init__(self, url: str):
+        self.url = url
+        self.saudavel = None  # None: ainda não sondado
+        self.erro = ""
+        self.modelos = None  # Nomes dos modelos instalados (None: desconhecidos)
+        self.carregados = set()  # Modelos na memória do servidor
+        self.latencia = None  # Duração da última sondagem (segundos)
+
+    def descrever(self) -> str:
+        if self.saudavel is None:
+            return f"? {self.url}: aguardando sondagem"
+        if not self.saudavel:
+            return f"✗ {self.url}: {self.erro}"
+        texto = f"✓ {self.url}: {len(self.modelos or ())} modelos, {len(self.carregados)} carregados"
+        return texto + (f", {self.latencia * 1000:.0f} ms" if self.latencia is not None else "")
+
+
+# Vários servidores Ollama tratados como um só. Com mais de um host, um
+# thread sonda cada um (sondar(url) -> (modelos, carregados)) e as gerações
+# vão para o host saudável que tem o modelo: primeiro os com vaga no
+# agendador, depois os que já têm o modelo carregado e então os com menos
+# gerações em andamento ou na fila
+class PoolHosts:
+    def __init__(self, agendador: AgendadorGeracoes, sondar, intervalo: float = INTERVALO_SONDAGEM_HOSTS):
+        self.agendador = agendador
+        self.sondar_host = sondar
+        self.intervalo = intervalo
+        self.ao_mudar = None  # Chamado (no thread da sondagem) após cada rodada
+        self._hosts = []  # [EstadoHost] na ordem configurada
+        self._trava = Lock()
+        self._acordar = Event()
+        self._thread = None
+
+    # Hosts digitados separados por vírgula, ponto e vírgula ou espaço
+    @staticmethod
+    def separar(texto: str) -> List[str]:
+        urls = []
+        for url in re.split(r"[,;\s]+", texto.strip()):
+            if not url:
+                continue
+            if not url.startswith(("http://", "https://")):
+                url = "http://" + url
+            if url not in urls:
+                urls.append(url)
+        return urls
+
+    def definir(self, urls: List[str]):
+        with self._trava:
+            anteriores = {estado.url: estado for estado in self._hosts}
+            self._hosts = [anteriores.get(url) or EstadoHost(url) for url in urls]
+            if len(urls) > 1 and self._thread is None:
+                self._thread = Thread(target=self._sondar_sempre, daemon=True)
+                self._thread.start()
+        self._acordar.set()
+
+    def urls(self) -> List[str]:
+        with self._trava:
+            return [estado.url for estado in self._hosts]
+
+    def estados(self) -> List[EstadoHost]:
+        with self._trava:
+            return list(self._hosts)
+
+    def _estado(self, api_url: str) -> Optional[EstadoHost]:
+        return next((estado for estado in self._hosts if estado.url == api_url), None)
+
+    def _sondar_sempre(self):
+        while True:
+            self._acordar.wait(self.intervalo)
+            self._acordar.clear()
+            estados = self.estados()
+            if len(estados) < 2:
+                continue
+            for estado in estados:
+                self.sondar(estado)
+            if self.ao_mudar is not None:
+                self.ao_mudar()
+
+    def sondar(self, estado: EstadoHost):
+        inicio = time.perf_counter()
+        try:
+            modelos, carregados = self.sondar_host(estado.url)
+        except Exception as e:
+            with self._trava:
+                estado.saudavel, estado.erro = False, str(e)
+            return
+        with self._trava:
+            estado.saudavel, estado.erro = True, ""
+            estado.modelos, estado.carregados = set(modelos), set(carregados)
+            estado.latencia = time.perf_counter() - inicio
+
+    # Host para uma geração com o modelo, fora os já tentados; None se não
+    # sobrou nenhum. Se nenhum estiver saudável, tenta assim mesmo
+    def escolher(self, modelo: str, excluir=()) -> Optional[str]:
+        with self._trava:
+            estados = [estado for estado in self._hosts if estado.url not in excluir]
+            candidatos = [estado for estado in estados if estado.saudavel is not False] or estados
+            candidatos = [estado for estado in candidatos
+                          if estado.modelos is None or modelo in estado.modelos] or candidatos
+            carregados = {estado.url: modelo in estado.carregados for estado in candidatos}
+        if len(candidatos) < 2:
+            return candidatos[0].url if candidatos else None
+
+        def prioridade(item):
+            indice, estado = item
+            ativas, esperando = self.agendador.ocupacao(estado.url)
+            return ativas >= self.agendador.limite, not carregados[estado.url], ativas + esperando, indice
+
+        return min(enumerate(candidatos), key=prioridade)[1].url
+
+    # A geração começou no host: o modelo passa a estar carregado nele
+    def registrar_uso(self, api_url: str, modelo: str):
+        with self._trava:
+            estado = self._estado(api_url)
+            if estado is not None:
+                estado.carregados.add(modelo)
+
+    # Uma requisição ao host falhou: fica fora da escolha até a próxima
+    # sondagem, que acontece em seguida
+    def registrar_falha(self, api_url: str, erro: str):
+        with self._trava:
+            estado = self._estado(api_url)
+            if estado is None:
+                return
+            estado.saudavel, estado.erro = False, erro
+        self._acordar.set()
+
+    # A lista de modelos do host foi atualizada fora da sondagem
+    def registrar_modelos(self, api_url: str, modelos: List[str]):
+        with self._trava:
+            estado = self._estado(api_url)
+            if estado is not None:
+                estado.saudavel, estado.erro, estado.modelos = True, "", set(modelos)
+
+
+# Painel recolhível com os tempos da última resposta e o histórico por modelo
+class PainelDesempenho(QWidget):
+    CAMPOS = (
+        ("tokens_s", "Geração", "tok/s"),
+        ("prompt_tokens_s", "Prompt", "tok/s"),
+        ("ttft", "1º token", "s"),
+        ("ttfb", "1º byte", "s"),
+        ("conexao", "Conexão", "s"),
+        ("load_duration", "Carga", "s"),
+        ("total_duration", "Total", "s"),
+        ("atraso_render", "Atraso render", "s"),
+    )
+    # Queda em relação à mediana considerada regressão
+    LIMITE_REGRESSAO = 0.8
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+
+        self.botao_alternar = QToolButton()
+        self.botao_alternar.setText("Desempenho")
+        self.botao_alternar.setCheckable(True)
+        self.botao_alternar.setToolButtonStyle(Qt.ToolButtonTextBesideIcon)
+        self.botao_alternar.setArrowType(Qt.RightArrow)
+        self.botao_alternar.setAutoRaise(True)
+        self.botao_alternar.toggled.connect(self.alternar)
+        layout.addWidget(self.botao_alternar)
+
+        self.conteudo = QFrame()
+        self.conteudo.setVisible(False)
+        layout_conteudo = QVBoxLayout(self.conteudo)
+        layout_conteudo.setContentsMargins(0, 0, 0, 0)
+
+        grade = QGridLayout()
+        self.rotulos = {}
+        for i, (campo, nome, _) in enumerate(self.CAMPOS):
+            grade.addWidget(QLabel(nome + ":"), i // 4, (i % 4) * 2)
+            self.rotulos[campo] = QLabel("-")
+            grade.addWidget(self.rotulos[campo], i // 4, (i % 4) * 2 + 1)
+        layout_conteudo.addLayout(grade)
+
+        self.tabela = QTableWidget(0, 5)
+        self.tabela.setHorizontalHeaderLabels(
+            ["Modelo", "Respostas", "Mediana tok/s", "Última tok/s", "Mediana 1º token"])
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.tabela.verticalHeader().setVisible(False)
+        self.tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabela.setMaximumHeight(120)
+        layout_conteudo.addWidget(self.tabela)
+        layout.addWidget(self.conteudo)
+
+    def alternar(self, aberto: bool):
+        self.botao_alternar.setArrowType(Qt.DownArrow if aberto else Qt.RightArrow)
+        self.conteudo.setVisible(aberto)
+
+    @staticmethod
+    def formatar(valor, unidade: str) -> str:
+        if valor is None:
+            return "-"
+        return f"{valor:.1f} {unidade}" if unidade == "tok/s" else f"{valor:.3f} {unidade}"
+
+    def atualizar(self, modelo: str, metricas: dict, historico: MetricasDesempenho):
+        for campo, _, unidade in self.CAMPOS:
+            valor = metricas.get(campo)
+            if campo.endswith("_duration") and valor is not None:
+                valor /= 1e9
+            self.rotulos[campo].setText(self.formatar(valor, unidade))
+
+        tokens_s = metricas.get("tokens_s")
+        mediana = historico.mediana(modelo, "tokens_s")
+        resumo = f"Desempenho — {modelo}: {self.formatar(tokens_s, 'tok/s')}"
+        if tokens_s is not None and mediana:
+            variacao = (tokens_s / mediana - 1) * 100
+            resumo += f" ({variacao:+.0f}% vs. mediana)"
+        self.botao_alternar.setText(resumo)
+
+        modelos = historico.modelos()
+        self.tabela.setRowCount(len(modelos))
+        for linha, nome in enumerate(modelos):
+            ultima = historico.ultima(nome) or {}
+            mediana_modelo = historico.mediana(nome, "tokens_s", excluir_ultima=False)
+            valores = [
+                nome,
+                str(historico.quantidade(nome)),
+                self.formatar(mediana_modelo, "tok/s"),
+                self.formatar(ultima.get("tokens_s"), "tok/s"),
+                self.formatar(historico.mediana(nome, "ttft", excluir_ultima=False), "s"),
+            ]
+            for coluna, valor in enumerate(valores):
+                item = QTableWidgetItem(valor)
+                anterior = historico.mediana(nome, "tokens_s")
+                if (coluna == 3 and anterior and ultima.get("tokens_s") is not None
+                        and ultima["tokens_s"] < anterior * self.LIMITE_REGRESSAO):
+                    item.setForeground(QColor("#ff6666"))
+                self.tabela.setItem(linha, coluna, item)
+
+
+# Lista virtualizada de mensagens, usada pelas abas do chat e pelas colunas
+# da comparação de modelos
+def criar_caixa_chat(modelo_chat: ModeloChat, fonte: str) -> Tuple[QListView, DelegadoMensagem]:
+    caixa = QListView()
+    caixa.setModel(modelo_chat)
+    caixa.setFont(QFont(fonte, 12))
+    caixa.setFrameShape(QFrame.NoFrame)
+    caixa.setSelectionMode(QAbstractItemView.NoSelection)
+    caixa.setEditTriggers(QAbstractItemView.NoEditTriggers)
+    caixa.setVerticalScrollMode(QAbstractItemView.ScrollPerPixel)
+    caixa.setHorizontalScrollBarPolicy(Qt.ScrollBarAlwaysOff)
+    caixa.setResizeMode(QListView.Adjust)
+    caixa.setLayoutMode(QListView.Batched)
+    caixa.setBatchSize(200)
+    delegado = DelegadoMensagem(caixa)
+    caixa.setItemDelegate(delegado)
+    return caixa, delegado
+
+
+# Uma conversa aberta numa aba: a lista do chat, o histórico enviado ao modelo
+# e a geração em andamento. Cada aba tem seu próprio buffer de renderização,
+# então várias podem receber respostas ao mesmo tempo
+class AbaChat(QWidget):
+    _contador = itertools.count(1)
+
+    OCIOSA = "ociosa"
+    NA_FILA = "na_fila"  # Esperando vaga no AgendadorGeracoes
+    GERANDO = "gerando"
+
+    def __init__(self, interface, modelo: str = "", parent=None):
+        super().__init__(parent)
+        self.id = next(AbaChat._contador)
+        self.interface = interface
+        self.modelo = modelo  # Vazio: segue o seletor até a primeira resposta
+        self.titulo = ""
+        self.estado = self.OCIOSA
+        self.historico_chat = []
+        self.posicao_historico = {}  # id da mensagem -> posição em historico_chat
+        self.contexto = GerenciadorContexto(interface.orcamento_contexto, interface.resumir_contexto)
+        self.thread_geracao = None
+        self.geracao_atual = None
+        self.editando = False
+        self.id_edicao = None
+        self.sessao_atual = None
+        # Lotes que chegaram com um trecho do meio da conversa na tela; entram
+        # quando o fim dela voltar a ser carregado
+        self.pendentes_fim = []
+
+        self.modelo_chat = ModeloChat(self, interface.limite_chat)
+        self.caixa_chat, self.delegado_chat = criar_caixa_chat(self.modelo_chat, interface.fonte_padrao)
+        self.caixa_chat.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.caixa_chat.customContextMenuRequested.connect(interface.mostrar_menu_contexto)
+        self.buffer_chat = BufferRenderizacao(self.renderizar_lote_chat, parent=self)
+
+        # Acompanhar o fim do chat enquanto o usuário não rolar para cima
+        self.seguir_fim_chat = True
+        barra = self.caixa_chat.verticalScrollBar()
+        barra.valueChanged.connect(self.ao_rolar_chat)
+        barra.rangeChanged.connect(
+            lambda minimo, maximo: barra.setValue(maximo) if self.seguir_fim_chat else None
+        )
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.addWidget(self.caixa_chat)
+
+    def renderizar_lote_chat(self, segmentos: List[Tuple[Any, str]]):
+        try:
+            # Mensagens novas só entram no fim da conversa, que não está na
+            # lista enquanto o usuário vê um resultado de busca
+            if self.modelo_chat.posteriores:
+                self.pendentes_fim.extend(segmentos)
+                return
+            fim = self.modelo_chat.rowCount()
+            alteradas = self.modelo_chat.aplicar_lote(segmentos)
+            for indice in alteradas:
+                self.delegado_chat.sizeHintChanged.emit(indice)
+            # Respostas entram no histórico só depois de exibidas por completo
+            for conteudo, tipo in segmentos:
+                if tipo == "concluida":
+                    self.adicionar_ao_historico(conteudo)
+                    self.interface.registrar_desempenho(self, conteudo)
+            self.interface.gravar_linhas_chat(self, [indice.row() for indice in alteradas] +
+                                              list(range(fim, self.modelo_chat.rowCount())))
+            # Enquanto o usuário lê mensagens antigas a lista não é reduzida
+            if self.seguir_fim_chat:
+                self.despejar_chat()
+        except Exception as e:
+            self.interface.adicionar_log(f"Erro ao adicionar texto: {str(e)}")
+
+    def despejar_chat(self):
+        if not self.modelo_chat.despejar():
+            return
+        # Sai da memória o que não está na lista nem entra mais no contexto
+        descartaveis = self.contexto.descartaveis(self.historico_chat)
+        manter = [m for m in self.historico_chat
+                  if m.id not in descartaveis or self.modelo_chat.linha_de_id(m.id) is not None]
+        if len(manter) < len(self.historico_chat):
+            self.historico_chat = manter
+            self.posicao_historico = {m.id: posicao for posicao, m in enumerate(manter)}
+
+    def adicionar_ao_historico(self, mensagem: Mensagem):
+        self.posicao_historico[mensagem.id] = len(self.historico_chat)
+        self.historico_chat.append(mensagem)
+
+    def truncar_historico(self, posicao: int):
+        for mensagem in self.historico_chat[posicao:]:
+            self.posicao_historico.pop(mensagem.id, None)
+        del self.historico_chat[posicao:]
+
+    # Geração
+
+    def iniciar_geracao(self):
+        # Cancelar a geração em andamento nesta aba; as outras abas seguem
+        if self.geracao_atual is not None:
+            self.interface.agendador.cancelar(self.geracao_atual)
+        if not self.modelo:
+            self.modelo = self.interface.modelo_selecionado()
+
+        # Nova geração: trechos de gerações anteriores passam a ser descartados
+        self.geracao_atual = Geracao()
+        self.geracao_atual.modelo = self.modelo
+        self.buffer_chat.geracao_ativa = self.geracao_atual.id
+        self.buffer_chat.atraso_maximo = 0.0
+        self.interface.definir_estado_aba(self, self.NA_FILA)
+
+        self.thread_geracao = Thread(target=self.interface.gerar_resposta_ia,
+                                     args=(self, self.geracao_atual), daemon=True)
+        self.thread_geracao.start()
+
+    def parar_geracao(self):
+        if self.geracao_atual is not None:
+            self.interface.agendador.cancelar(self.geracao_atual)
+            self.interface.definir_estado_aba(self, self.OCIOSA)
+
+    # Sessão exibida
+
+    # Mostra as mensagens [inicio, fim) de uma sessão; o resto dela fica no
+    # banco e volta ao rolar. A resposta em andamento continua chegando. Quem
+    # chama descarrega o buffer antes de calcular o trecho, para que as
+    # mensagens ainda não exibidas já contem no total
+    def carregar_trecho_sessao(self, sessao: int, inicio: int, fim: int, total: int) -> List[Mensagem]:
+        armazem = self.interface.armazem
+        armazem.sincronizar()
+
+        mensagens = armazem.ler_mensagens(sessao, inicio, fim)
+        self.delegado_chat.limpar_cache()
+        self.modelo_chat.restaurar(mensagens, inicio, ArquivoSessao(armazem, sessao, total), total - fim,
+                                   manter_abertas=sessao == self.sessao_atual)
+        self.sessao_atual = sessao
+        return mensagens
+
+    # Interrompe a resposta em andamento antes de trocar a conversa da aba. O
+    # que já chegou é exibido e gravado na conversa atual
+    def encerrar_geracao(self):
+        if self.geracao_atual is not None:
+            self.parar_geracao()
+        self.buffer_chat.descarregar()
+        if self.pendentes_fim:
+            self.ir_para_fim_chat()
+        self.pendentes_fim = []
+        self.buffer_chat.geracao_ativa = None
+
+    # Abre uma conversa salva lendo só a última página de mensagens
+    def abrir_sessao(self, sessao: int, titulo: str = ""):
+        armazem = self.interface.armazem
+        self.encerrar_geracao()
+        armazem.sincronizar()
+        total = armazem.contar_mensagens(sessao)
+        mensagens = self.carregar_trecho_sessao(sessao, max(0, total - LOTE_ARQUIVO_CHAT), total, total)
+        self.titulo = titulo
+        self.seguir_fim_chat = True
+        self.caixa_chat.scrollToBottom()
+
+        self.historico_chat = self.ler_historico(sessao, total - len(mensagens), mensagens)
+        self.posicao_historico = {m.id: posicao for posicao, m in enumerate(self.historico_chat)}
+        self.contexto.limpar()
+        self.editando = False
+        self.id_edicao = None
+
+    # O contexto enviado ao modelo não depende das linhas exibidas: parte das
+    # já carregadas (a partir da posição inicio) e segue lendo páginas
+    # anteriores do banco até encher o orçamento da janela de contexto
+    def ler_historico(self, sessao: int, inicio: int, carregadas: List[Mensagem]) -> List[Mensagem]:
+        def conversa(mensagens):
+            return [m for m in mensagens if m.papel in ("user", "assistant")]
+
+        historico = conversa(carregadas)
+        usados = sum(self.contexto.estimar_tokens(m) for m in historico)
+        while inicio > 0 and usados < self.contexto.disponivel:
+            anteriores = conversa(self.interface.armazem.ler_mensagens(
+                sessao, max(0, inicio - LOTE_ARQUIVO_CHAT), inicio))
+            inicio -= LOTE_ARQUIVO_CHAT
+            usados += sum(self.contexto.estimar_tokens(m) for m in anteriores)
+            historico[:0] = anteriores
+        return historico
+
+    # Começa uma conversa nova na aba; a anterior continua no banco
+    def limpar(self):
+        self.encerrar_geracao()
+        self.sessao_atual = None
+        self.titulo = ""
+        self.modelo_chat.restaurar([], 0, ArquivoMensagens())
+        self.delegado_chat.limpar_cache()
+        self.seguir_fim_chat = True
+        self.historico_chat = []
+        self.posicao_historico = {}
+        self.contexto.limpar()
+        self.editando = False
+        self.id_edicao = None
+
+    # Encerra a aba: a geração é cancelada e o que já chegou é gravado
+    def fechar(self):
+        self.encerrar_geracao()
+        self.modelo_chat.arquivo.fechar()
+
+    # A conversa inteira como texto, incluindo as mensagens que já saíram da tela
+    def transcricao(self) -> str:
+        modelo = self.modelo_chat
+        mensagens = modelo.arquivo.ler(0, modelo.anteriores)
+        mensagens.extend(modelo.mensagem(linha) for linha in range(modelo.rowCount()))
+        return "\n\n".join(DelegadoMensagem.texto_exibicao(m) for m in mensagens)
+
+    # Rolagem
+
+    # Volta para a última página da conversa depois de abrir um resultado de
+    # busca no meio dela
+    def ir_para_fim_chat(self):
+        modelo = self.modelo_chat
+        self.buffer_chat.descarregar()
+        if not modelo.posteriores or self.sessao_atual is None:
+            return
+        total = len(modelo.arquivo)
+        self.carregar_trecho_sessao(self.sessao_atual, max(0, total - LOTE_ARQUIVO_CHAT), total, total)
+        self.seguir_fim_chat = True
+        self.entregar_pendentes_fim()
+        self.caixa_chat.scrollToBottom()
+
+    def entregar_pendentes_fim(self):
+        if self.pendentes_fim and not self.modelo_chat.posteriores:
+            pendentes, self.pendentes_fim = self.pendentes_fim, []
+            self.renderizar_lote_chat(pendentes)
+
+    # Centraliza e destaca uma mensagem da sessão aberta. Fora das linhas
+    # carregadas, carrega uma página em volta dela
+    def ir_para_mensagem(self, posicao: int):
+        modelo = self.modelo_chat
+        self.buffer_chat.descarregar()
+        linha = posicao - modelo.anteriores
+        if not 0 <= linha < modelo.rowCount():
+            total = len(modelo.arquivo)
+            inicio = max(0, posicao - LOTE_ARQUIVO_CHAT // 2)
+            self.carregar_trecho_sessao(self.sessao_atual, inicio, min(total, inicio + LOTE_ARQUIVO_CHAT), total)
+            linha = posicao - inicio
+        if not 0 <= linha < modelo.rowCount():
+            return
+        self.seguir_fim_chat = False
+        self.delegado_chat.destacada = modelo.mensagem(linha).id
+        self.caixa_chat.scrollTo(modelo.index(linha), QAbstractItemView.PositionAtCenter)
+        self.caixa_chat.viewport().update()
+
+    def ao_rolar_chat(self, valor: int):
+        barra = self.caixa_chat.verticalScrollBar()
+        self.seguir_fim_chat = valor >= barra.maximum() and not self.modelo_chat.posteriores
+        # Fora do sinal de rolagem, para não alterar a lista durante ele
+        if valor <= barra.minimum() and self.modelo_chat.anteriores:
+            QTimer.singleShot(0, self.reidratar_chat)
+        elif valor >= barra.maximum() and self.modelo_chat.posteriores:
+            QTimer.singleShot(0, self.reidratar_fim_chat)
+
+    # Traz uma página de mensagens antigas do arquivo mantendo à vista a
+    # mensagem que estava no topo
+    def reidratar_chat(self):
+        barra = self.caixa_chat.verticalScrollBar()
+        if barra.value() > barra.minimum():
+            return
+        inseridas = self.modelo_chat.reidratar()
+        if inseridas:
+            self.caixa_chat.scrollTo(self.modelo_chat.index(inseridas), QAbstractItemView.PositionAtTop)
+
+    def reidratar_fim_chat(self):
+        barra = self.caixa_chat.verticalScrollBar()
+        if barra.value() >= barra.maximum():
+            self.modelo_chat.reidratar_fim()
+            self.entregar_pendentes_fim()
 
-class WorkerSignals(QObject):
-    update_chat = Signal(str, str)  # (texto, tipo)
-    update_log = Signal(str, bool)
-    show_progress = Signal()
-    hide_progress = Signal()
-    enable_button = Signal(str, bool)
-    update_model_combo = Signal(list)
-    show_error = Signal(str)
-    update_model_list = Signal(list)
 
 class InterfaceOllama(QMainWindow):
-    def __init__(self):
+    def __init__(self, caminho_conversas: Optional[str] = ARQUIVO_CONVERSAS):
         super().__init__()
         self.api_url = "http://127.0.0.1:11434"
-        self.historico_chat = []
+        self.cliente_http = ClienteHTTP()
+        self.agendador = AgendadorGeracoes()
         self.fonte_padrao = QFont().family()
         self.fila_atualizacoes = queue.Queue()
         self.signals = WorkerSignals()
+        self.pool = PoolHosts(self.agendador, self.sondar_host)
+        self.pool.ao_mudar = self.signals.update_hosts.emit
         self.caixa_log = None
         self.lista_modelos = None
-        self.thread_geracao = None
-        self.editando = False
-        self.indice_edicao = None
-        self.parar_geracao_atual = False
+        self.prompt_sistema = None
+        # Configurações aplicadas a todas as abas
+        self.orcamento_contexto = ORCAMENTO_CONTEXTO_TOKENS
+        self.resumir_contexto = False
+        self.limite_chat = MAX_MENSAGENS_CHAT
+        self.envio_habilitado = False  # Há modelos para responder
+        self.metricas = MetricasDesempenho()
+        self.preaquecer_modelos = True
+        self.keep_alive_modelos = {}  # modelo -> keep_alive
+        self.opcoes_geracao = {}  # "options" do /api/chat (temperature, seed...)
+        self.cache_respostas = None  # CacheRespostas quando ativado
+        self.cache_no_ritmo = False  # Reproduzir acertos na velocidade original
+        self.modelos_preaquecendo = set()
+        self.modelos_disponiveis = []
+        self.fila_downloads = FilaDownloads(self, parent=self)
+        self.catalogo = CatalogoModelos()
+        self.painel_desempenho = None
+        self.janela_gerenciamento = None
+        self.tempos_inicio = {}  # etapa -> segundos desde _T_INICIO
+        self.relatar_tempo_inicio = False
+        self.modelos_restaurados = 0
+        self.caminho_conversas = caminho_conversas  # None: conversas não são salvas
+        self.armazem = None
+        self.itens_sessoes = {}  # id da sessão -> item da barra lateral
+        self.sessoes_carregadas = 0
+        self.fim_sessoes = False
+        self.numero_busca = 0  # Resultados de buscas anteriores são ignorados
         
         self.setWindowTitle("Ollama GUI")
         self.resize(760, 600)
@@ -89,11 +3131,36 @@ class InterfaceOllama(QMainWindow):
         
         self.iniciar_layout()
         self.conectar_sinais()
+        self.restaurar_instantaneo_modelos()
+        
+        # O restante (rede, avisos e widgets secundários) fica para depois
+        # que a janela for exibida
+        QTimer.singleShot(0, self.concluir_inicializacao)
+
+    def concluir_inicializacao(self):
+        self.marcar_tempo_inicio("janela")
+        
+        # Painel de desempenho (recolhido por padrão), logo abaixo do chat
+        self.painel_desempenho = PainelDesempenho()
+        self.layout_principal.insertWidget(self.layout_principal.indexOf(self.divisor_chat) + 1,
+                                           self.painel_desempenho)
+        
+        self.abrir_armazem()
         
         # Verificar sistema
         self.verificar_sistema()
         self.atualizar_modelos()
 
+    def marcar_tempo_inicio(self, etapa: str):
+        if etapa in self.tempos_inicio:
+            return
+        self.tempos_inicio[etapa] = time.perf_counter() - _T_INICIO
+        if etapa == "interativa" and self.relatar_tempo_inicio:
+            for nome, segundos in self.tempos_inicio.items():
+                print(f"{nome:<12} {segundos * 1000:8.1f} ms")
+            print(f"modelos restaurados do disco: {self.modelos_restaurados}")
+            QApplication.quit()
+
     def iniciar_layout(self):
         # Frame cabeçalho
         frame_cabecalho = QWidget()
@@ -102,6 +3169,7 @@ class InterfaceOllama(QMainWindow):
         
         self.seletor_modelo = QComboBox()
         self.seletor_modelo.setMinimumWidth(200)
+        self.seletor_modelo.activated.connect(lambda _: self.ao_escolher_modelo(self.modelo_selecionado()))
         layout_cabecalho.addWidget(self.seletor_modelo)
         
         self.botao_config = QPushButton("⚙️")
@@ -117,8 +3185,21 @@ class InterfaceOllama(QMainWindow):
         
         self.entrada_host = QLineEdit(self.api_url)
         self.entrada_host.setMinimumWidth(150)
+        self.entrada_host.setToolTip("Um ou mais hosts separados por vírgula; o primeiro também é usado "
+                                     "para baixar, excluir e descarregar modelos")
+        self.entrada_host.editingFinished.connect(self.atualizar_host)
         layout_cabecalho.addWidget(self.entrada_host)
         
+        # Acertos do cache de respostas, no canto da barra de status
+        self.rotulo_cache = QLabel()
+        self.rotulo_cache.setVisible(False)
+        self.statusBar().addPermanentWidget(self.rotulo_cache)
+        
+        # Saúde dos hosts quando há mais de um
+        self.rotulo_hosts = QLabel()
+        self.rotulo_hosts.setVisible(False)
+        layout_cabecalho.addWidget(self.rotulo_hosts)
+        
         self.botao_testar = QPushButton("Testar Conexão")
         layout_cabecalho.addWidget(self.botao_testar)
         self.botao_testar.clicked.connect(self.testar_conexao)
@@ -130,18 +3211,63 @@ class InterfaceOllama(QMainWindow):
         layout_cabecalho.addStretch(1)
         self.layout_principal.addWidget(frame_cabecalho)
         
-        # Área de chat (80% da altura)
-        scroll_area = QScrollArea()
-        scroll_area.setWidgetResizable(True)
-        scroll_area.setFrameShape(QFrame.NoFrame)
-        
-        self.caixa_chat = QTextEdit()
-        self.caixa_chat.setReadOnly(True)
-        self.caixa_chat.setFont(QFont(self.fonte_padrao, 12))
-        self.caixa_chat.setContextMenuPolicy(Qt.CustomContextMenu)
-        self.caixa_chat.customContextMenuRequested.connect(self.mostrar_menu_contexto)
-        scroll_area.setWidget(self.caixa_chat)
-        self.layout_principal.addWidget(scroll_area, 8)  # 80% do espaço
+        # Barra lateral com as conversas salvas
+        painel_sessoes = QWidget()
+        layout_sessoes = QVBoxLayout(painel_sessoes)
+        layout_sessoes.setContentsMargins(0, 0, 0, 0)
+        self.botao_nova_conversa = QPushButton("Nova Conversa")
+        self.botao_nova_conversa.clicked.connect(lambda: self.nova_aba())
+        layout_sessoes.addWidget(self.botao_nova_conversa)
+        self.campo_busca = QLineEdit()
+        self.campo_busca.setPlaceholderText("Buscar nas conversas...")
+        self.campo_busca.setClearButtonEnabled(True)
+        # A consulta espera uma pausa na digitação e roda fora da interface
+        self.temporizador_busca = QTimer(self)
+        self.temporizador_busca.setSingleShot(True)
+        self.temporizador_busca.setInterval(ATRASO_BUSCA_MS)
+        self.temporizador_busca.timeout.connect(self.buscar_conversas)
+        self.campo_busca.textChanged.connect(
+            lambda texto: self.temporizador_busca.start() if texto.strip() else self.buscar_conversas()
+        )
+        layout_sessoes.addWidget(self.campo_busca)
+        self.lista_resultados = QListWidget()
+        self.lista_resultados.setWordWrap(True)
+        self.lista_resultados.itemClicked.connect(
+            lambda item: self.ir_para_mensagem(*item.data(Qt.UserRole)) if item.data(Qt.UserRole) else None
+        )
+        self.lista_resultados.hide()
+        layout_sessoes.addWidget(self.lista_resultados)
+        self.lista_sessoes = QListWidget()
+        self.lista_sessoes.itemClicked.connect(lambda item: self.abrir_sessao(item.data(Qt.UserRole)))
+        self.lista_sessoes.setContextMenuPolicy(Qt.CustomContextMenu)
+        self.lista_sessoes.customContextMenuRequested.connect(self.mostrar_menu_sessao)
+        # Próxima página de sessões ao chegar ao fim da lista
+        self.lista_sessoes.verticalScrollBar().valueChanged.connect(
+            lambda valor: self.carregar_sessoes()
+            if valor >= self.lista_sessoes.verticalScrollBar().maximum() else None
+        )
+        layout_sessoes.addWidget(self.lista_sessoes)
+
+        # Área de chat (80% da altura), uma aba por conversa aberta
+        self.abas = QTabWidget()
+        self.abas.setTabsClosable(True)
+        self.abas.setMovable(True)
+        self.abas.setDocumentMode(True)
+        self.abas.tabCloseRequested.connect(lambda indice: self.fechar_aba(self.abas.widget(indice)))
+        botao_nova_aba = QToolButton()
+        botao_nova_aba.setText("+")
+        botao_nova_aba.setToolTip("Nova aba (Ctrl+T)")
+        botao_nova_aba.clicked.connect(lambda: self.nova_aba())
+        self.abas.setCornerWidget(botao_nova_aba, Qt.TopRightCorner)
+        self.nova_aba()
+        self.abas.currentChanged.connect(lambda _: self.ao_trocar_aba())
+
+        self.divisor_chat = QSplitter(Qt.Horizontal)
+        self.divisor_chat.addWidget(painel_sessoes)
+        self.divisor_chat.addWidget(self.abas)
+        self.divisor_chat.setStretchFactor(1, 1)
+        self.divisor_chat.setSizes([180, 540])
+        self.layout_principal.addWidget(self.divisor_chat, 8)  # 80% do espaço
         
         # Barra de progresso
         frame_progresso = QWidget()
@@ -156,7 +3282,7 @@ class InterfaceOllama(QMainWindow):
         self.botao_parar = QPushButton("Parar")
         self.botao_parar.setVisible(False)
         layout_progresso.addWidget(self.botao_parar)
-        self.botao_parar.clicked.connect(self.parar_geracao)
+        self.botao_parar.clicked.connect(lambda: self.aba.parar_geracao())
         
         self.layout_principal.addWidget(frame_progresso)
         
@@ -191,9 +3317,24 @@ class InterfaceOllama(QMainWindow):
         
         # Menu Arquivo
         menu_arquivo = menu_bar.addMenu("Arquivo")
+        acao_nova_aba = QAction("Nova Aba", self)
+        acao_nova_aba.setShortcut(QKeySequence("Ctrl+T"))
+        acao_nova_aba.triggered.connect(lambda: self.nova_aba())
+        menu_arquivo.addAction(acao_nova_aba)
+
+        acao_fechar_aba = QAction("Fechar Aba", self)
+        acao_fechar_aba.setShortcut(QKeySequence("Ctrl+W"))
+        acao_fechar_aba.triggered.connect(lambda: self.fechar_aba(self.aba))
+        menu_arquivo.addAction(acao_fechar_aba)
+        menu_arquivo.addSeparator()
+
         acao_gerenciar = QAction("Gerenciar Modelos", self)
         acao_gerenciar.triggered.connect(self.mostrar_janela_gerenciamento)
         menu_arquivo.addAction(acao_gerenciar)
+
+        acao_comparar = QAction("Comparar Modelos...", self)
+        acao_comparar.triggered.connect(self.mostrar_janela_comparacao)
+        menu_arquivo.addAction(acao_comparar)
         
         acao_sair = QAction("Sair", self)
         acao_sair.triggered.connect(self.close)
@@ -209,6 +3350,60 @@ class InterfaceOllama(QMainWindow):
         acao_limpar_chat.triggered.connect(self.limpar_chat)
         menu_editar.addAction(acao_limpar_chat)
         
+        # Menu Opções
+        menu_opcoes = menu_bar.addMenu("Opções")
+        acao_prompt_sistema = QAction("Prompt de Sistema...", self)
+        acao_prompt_sistema.triggered.connect(self.definir_prompt_sistema)
+        menu_opcoes.addAction(acao_prompt_sistema)
+
+        acao_orcamento = QAction("Orçamento de Contexto...", self)
+        acao_orcamento.triggered.connect(self.definir_orcamento_contexto)
+        menu_opcoes.addAction(acao_orcamento)
+
+        acao_limite_chat = QAction("Mensagens no Chat...", self)
+        acao_limite_chat.triggered.connect(self.definir_limite_chat)
+        menu_opcoes.addAction(acao_limite_chat)
+
+        acao_geracoes = QAction("Gerações Simultâneas por Host...", self)
+        acao_geracoes.triggered.connect(self.definir_geracoes_por_host)
+        menu_opcoes.addAction(acao_geracoes)
+
+        acao_resumir = QAction("Resumir Mensagens Antigas", self)
+        acao_resumir.setCheckable(True)
+        acao_resumir.setChecked(self.resumir_contexto)
+        acao_resumir.toggled.connect(self.alternar_resumo_contexto)
+        menu_opcoes.addAction(acao_resumir)
+        menu_opcoes.addSeparator()
+
+        acao_preaquecer = QAction("Pré-carregar Modelo ao Selecionar", self)
+        acao_preaquecer.setCheckable(True)
+        acao_preaquecer.setChecked(self.preaquecer_modelos)
+        acao_preaquecer.toggled.connect(lambda ativo: setattr(self, "preaquecer_modelos", ativo))
+        menu_opcoes.addAction(acao_preaquecer)
+
+        acao_keep_alive = QAction("Keep-alive do Modelo...", self)
+        acao_keep_alive.triggered.connect(self.definir_keep_alive)
+        menu_opcoes.addAction(acao_keep_alive)
+
+        acao_opcoes_geracao = QAction("Opções de Geração...", self)
+        acao_opcoes_geracao.triggered.connect(self.definir_opcoes_geracao)
+        menu_opcoes.addAction(acao_opcoes_geracao)
+        menu_opcoes.addSeparator()
+
+        acao_cache = QAction("Cache de Respostas Determinísticas", self)
+        acao_cache.setCheckable(True)
+        acao_cache.toggled.connect(self.alternar_cache_respostas)
+        menu_opcoes.addAction(acao_cache)
+
+        acao_cache_ritmo = QAction("Reproduzir Cache na Velocidade Original", self)
+        acao_cache_ritmo.setCheckable(True)
+        acao_cache_ritmo.toggled.connect(lambda ativo: setattr(self, "cache_no_ritmo", ativo))
+        menu_opcoes.addAction(acao_cache_ritmo)
+
+        acao_limpar_cache = QAction("Limpar Cache de Respostas", self)
+        acao_limpar_cache.triggered.connect(self.limpar_cache_respostas)
+        menu_opcoes.addAction(acao_limpar_cache)
+        
         # Menu Ajuda
         menu_ajuda = menu_bar.addMenu("Ajuda")
         acao_codigo = QAction("Código Fonte", self)
@@ -224,58 +3419,271 @@ class InterfaceOllama(QMainWindow):
         menu_ajuda.addAction(acao_solucionar)
 
     def conectar_sinais(self):
-        self.signals.update_chat.connect(self.adicionar_texto_chat)
         self.signals.update_log.connect(self.adicionar_log)
-        self.signals.show_progress.connect(self.mostrar_barra_progresso)
-        self.signals.hide_progress.connect(self.ocultar_barra_progresso)
+        self.signals.update_tab_state.connect(self.atualizar_estado_aba)
         self.signals.enable_button.connect(self.habilitar_botao)
         self.signals.update_model_combo.connect(self.atualizar_seletor_modelos_ui)
+        self.signals.update_model_details.connect(self.atualizar_detalhes_modelo_ui)
+        self.signals.update_search_results.connect(self.mostrar_resultados_busca)
         self.signals.show_error.connect(self.mostrar_erro)
         self.signals.update_model_list.connect(self.atualizar_lista_modelos_ui)
+        self.signals.update_status.connect(self.statusBar().showMessage)
+        self.signals.update_hosts.connect(self.atualizar_rotulo_hosts)
+        self.signals.update_cache.connect(self.atualizar_rotulo_cache)
+        self.fila_downloads.modelo_baixado.connect(self.ao_baixar_modelo)
+
+    # Abas
 
-    # Métodos principais (comunicação entre threads via signals)
-    @Slot(str, str)
-    def adicionar_texto_chat(self, texto: str, tipo: str):
+    # Aba exibida; os comandos do chat (enviar, parar, editar...) agem nela
+    @property
+    def aba(self) -> AbaChat:
+        return self.abas.currentWidget()
+
+    def nova_aba(self, modelo: str = "") -> AbaChat:
+        aba = AbaChat(self, modelo)
+        self.abas.addTab(aba, "")
+        self.atualizar_titulo_aba(aba)
+        self.abas.setCurrentWidget(aba)
+        aba.caixa_chat.setFocus()
+        return aba
+
+    def fechar_aba(self, aba: AbaChat):
+        aba.fechar()
+        self.abas.removeTab(self.abas.indexOf(aba))
+        aba.deleteLater()
+        if self.abas.count() == 0:
+            self.nova_aba()
+
+    def abas_abertas(self) -> List[AbaChat]:
+        return [self.abas.widget(indice) for indice in range(self.abas.count())]
+
+    def aba_da_sessao(self, sessao: int) -> Optional[AbaChat]:
+        return next((aba for aba in self.abas_abertas() if aba.sessao_atual == sessao), None)
+
+    def atualizar_titulo_aba(self, aba: AbaChat):
+        titulo = aba.titulo or "Nova conversa"
+        prefixo = {AbaChat.NA_FILA: "⏳ ", AbaChat.GERANDO: "● "}.get(aba.estado, "")
+        indice = self.abas.indexOf(aba)
+        self.abas.setTabText(indice, prefixo + (titulo if len(titulo) <= 24 else titulo[:23] + "…"))
+        self.abas.setTabToolTip(indice, titulo)
+
+    # Botões e progresso refletem a aba exibida
+    def atualizar_controles(self):
+        ocupada = self.aba.estado != AbaChat.OCIOSA
+        self.progresso.setVisible(ocupada)
+        self.botao_parar.setVisible(ocupada)
+        self.botao_parar.setEnabled(ocupada)
+        self.botao_enviar.setEnabled(self.envio_habilitado and not ocupada)
+
+    def ao_trocar_aba(self):
+        aba = self.aba
+        if aba is None:
+            return
+        if aba.modelo:
+            indice = self.seletor_modelo.findData(aba.modelo)
+            if indice >= 0:
+                self.seletor_modelo.setCurrentIndex(indice)
+        item = self.itens_sessoes.get(aba.sessao_atual)
+        if item is not None:
+            self.lista_sessoes.setCurrentItem(item)
+        else:
+            self.lista_sessoes.clearSelection()
+        self.atualizar_controles()
+
+    def definir_estado_aba(self, aba: AbaChat, estado: str):
+        aba.estado = estado
+        self.atualizar_titulo_aba(aba)
+        if aba is self.aba:
+            self.atualizar_controles()
+
+    # Estado enviado pelo thread da geração; gerações substituídas ou
+    # canceladas não mexem mais na aba
+    @Slot(int, int, str)
+    def atualizar_estado_aba(self, id_aba: int, id_geracao: int, estado: str):
+        aba = next((aba for aba in self.abas_abertas() if aba.id == id_aba), None)
+        if aba is None or aba.geracao_atual is None or aba.geracao_atual.id != id_geracao:
+            return
+        if aba.geracao_atual.cancelada and estado != AbaChat.OCIOSA:
+            return
+        self.definir_estado_aba(aba, estado)
+
+    # Conversas salvas
+
+    def abrir_armazem(self):
+        if self.caminho_conversas is None:
+            return
+        armazem = ArmazemConversas(self.caminho_conversas, parent=self)
         try:
-            self.caixa_chat.setReadOnly(False)
-            cursor = self.caixa_chat.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            
-            # Formatação baseada no tipo
-            if tipo == "usuario":
-                # Adicionar linha em branco acima e cor diferente para "Você"
-                if self.caixa_chat.toPlainText():
-                    self.caixa_chat.insertPlainText("\n")
-                self.caixa_chat.setTextColor(QColor("#add8e6"))  # Cor azul claro para usuário
-                self.caixa_chat.insertPlainText("Você: " + texto + "\n\n")
-            elif tipo == "usuario_editado":
-                if self.caixa_chat.toPlainText():
-                    self.caixa_chat.insertPlainText("\n")
-                self.caixa_chat.setTextColor(QColor("#90caf9"))  # Cor azul mais forte para edição
-                self.caixa_chat.insertPlainText("Você (Editado): " + texto + "\n\n")
-            elif tipo == "modelo":
-                self.caixa_chat.setTextColor(QColor("#e0e0e0"))
-                self.caixa_chat.insertPlainText(texto)
-            elif tipo == "nome_modelo":
-                self.caixa_chat.setTextColor(QColor("#ffcc80"))
-                self.caixa_chat.insertPlainText("Modelo: " + texto + "\n")
-            elif tipo == "erro":
-                self.caixa_chat.setTextColor(QColor("#ff6666"))
-                self.caixa_chat.insertPlainText(texto + "\n\n")
-            elif tipo == "texto":
-                self.caixa_chat.insertPlainText("\n")
-            elif tipo == "info":
-                self.caixa_chat.setTextColor(QColor("#a5d6a7"))  # Cor verde para informações
-                self.caixa_chat.insertPlainText(texto + "\n")
-            
-            # Garantir que o texto seja visível
-            cursor.movePosition(QTextCursor.End)
-            self.caixa_chat.setTextCursor(cursor)
-            self.caixa_chat.ensureCursorVisible()
-        except Exception as e:
-            self.adicionar_log(f"Erro ao adicionar texto: {str(e)}")
-        finally:
-            self.caixa_chat.setReadOnly(True)
+            armazem.abrir()
+        except (sqlite3.Error, OSError) as e:
+            self.adicionar_log(f"Conversas não serão salvas: {str(e)}")
+            return
+        armazem.falha.connect(self.adicionar_log)
+        self.armazem = armazem
+        self.carregar_sessoes()
+
+    def texto_sessao(self, titulo: str, atualizada_em: float) -> str:
+        return f"{titulo or 'Sem título'}\n{time.strftime('%d/%m/%Y %H:%M', time.localtime(atualizada_em))}"
+
+    def adicionar_item_sessao(self, sessao: int, titulo: str, atualizada_em: float, linha: Optional[int] = None):
+        item = QListWidgetItem(self.texto_sessao(titulo, atualizada_em))
+        item.setData(Qt.UserRole, sessao)
+        item.setData(Qt.UserRole + 1, atualizada_em)
+        item.setToolTip(titulo)
+        if linha is None:
+            self.lista_sessoes.addItem(item)
+        else:
+            self.lista_sessoes.insertItem(linha, item)
+        self.itens_sessoes[sessao] = item
+        return item
+
+    # Carrega a próxima página de sessões (só títulos; as mensagens são lidas
+    # ao abrir a conversa)
+    def carregar_sessoes(self):
+        if self.armazem is None or self.fim_sessoes:
+            return
+        pagina = self.armazem.listar_sessoes(self.sessoes_carregadas)
+        self.sessoes_carregadas += len(pagina)
+        self.fim_sessoes = len(pagina) < PAGINA_SESSOES
+        for sessao, titulo, atualizada_em, _ in pagina:
+            if sessao not in self.itens_sessoes:
+                self.adicionar_item_sessao(sessao, titulo, atualizada_em)
+
+    # Envia para o banco as linhas novas ou alteradas do chat de uma aba. A
+    # sessão só é criada na primeira mensagem do usuário; o que veio antes vai junto
+    def gravar_linhas_chat(self, aba: AbaChat, linhas: List[int]):
+        if self.armazem is None or not linhas:
+            return
+        modelo = aba.modelo_chat
+        if aba.sessao_atual is None:
+            primeira = next((modelo.mensagem(linha) for linha in range(modelo.rowCount())
+                             if modelo.mensagem(linha).papel == "user"), None)
+            if primeira is None:
+                return
+            titulo = " ".join(primeira.conteudo.split())[:80]
+            aba.sessao_atual = self.armazem.criar_sessao(titulo, aba.modelo or self.modelo_selecionado() or "")
+            aba.titulo = titulo
+            self.atualizar_titulo_aba(aba)
+            arquivo = ArquivoSessao(self.armazem, aba.sessao_atual)
+            arquivo.acrescentar(modelo.arquivo.ler(0, modelo.anteriores))
+            modelo.arquivo.fechar()
+            modelo.arquivo = arquivo
+            linhas = range(modelo.rowCount())
+            item = self.adicionar_item_sessao(aba.sessao_atual, titulo, time.time(), 0)
+            if aba is self.aba:
+                self.lista_sessoes.setCurrentItem(item)
+
+        for linha in sorted(set(linhas)):
+            modelo.arquivo.gravar(modelo.anteriores + linha, modelo.mensagem(linha))
+
+    # Mostra uma conversa salva. Se já estiver numa aba, vai para ela; senão
+    # abre na aba atual, ou numa nova se a atual estiver gerando
+    def abrir_sessao(self, sessao: int) -> Optional[AbaChat]:
+        if self.armazem is None:
+            return None
+        aba = self.aba_da_sessao(sessao)
+        if aba is None:
+            aba = self.aba if self.aba.estado == AbaChat.OCIOSA else self.nova_aba()
+            item = self.itens_sessoes.get(sessao)
+            aba.abrir_sessao(sessao, item.toolTip() if item is not None else self.armazem.titulo_sessao(sessao))
+            self.atualizar_titulo_aba(aba)
+        self.abas.setCurrentWidget(aba)
+        self.ao_trocar_aba()
+        return aba
+
+    # Abre a sessão do resultado (se preciso) e centraliza a mensagem
+    def ir_para_mensagem(self, sessao: int, posicao: int):
+        aba = self.abrir_sessao(sessao)
+        if aba is not None:
+            aba.ir_para_mensagem(posicao)
+
+    def buscar_conversas(self):
+        texto = self.campo_busca.text().strip()
+        self.numero_busca += 1
+        if not texto or self.armazem is None:
+            self.lista_resultados.hide()
+            self.lista_sessoes.show()
+            return
+
+        numero, armazem = self.numero_busca, self.armazem
+
+        def buscar():
+            try:
+                resultados = armazem.buscar(texto)
+            except sqlite3.Error as e:
+                self.signals.update_log.emit(f"Erro na busca: {str(e)}", False)
+                resultados = []
+            self.signals.update_search_results.emit(numero, resultados)
+
+        Thread(target=buscar, daemon=True).start()
+
+    @Slot(int, list)
+    def mostrar_resultados_busca(self, numero: int, resultados: list):
+        if numero != self.numero_busca:
+            return
+        self.lista_resultados.clear()
+        for sessao, posicao, titulo, papel, trecho in resultados:
+            autor = "Você" if papel == "user" else "Modelo"
+            item = QListWidgetItem(f"{titulo or 'Sem título'}\n{autor}: {trecho}")
+            item.setData(Qt.UserRole, (sessao, posicao))
+            self.lista_resultados.addItem(item)
+        if not resultados:
+            item = QListWidgetItem("Nenhum resultado")
+            item.setFlags(Qt.NoItemFlags)
+            self.lista_resultados.addItem(item)
+        self.lista_sessoes.hide()
+        self.lista_resultados.show()
+
+    def mostrar_menu_sessao(self, pos):
+        item = self.lista_sessoes.itemAt(pos)
+        if item is None or self.armazem is None:
+            return
+        sessao = item.data(Qt.UserRole)
+        menu = QMenu()
+        renomear_action = menu.addAction("Renomear")
+        excluir_action = menu.addAction("Excluir")
+        action = menu.exec(self.lista_sessoes.mapToGlobal(pos))
+        if action == renomear_action:
+            titulo, ok = QInputDialog.getText(self, "Renomear Conversa", "Título:", text=item.toolTip())
+            if ok:
+                self.armazem.renomear_sessao(sessao, titulo.strip())
+                item.setText(self.texto_sessao(titulo.strip(), item.data(Qt.UserRole + 1)))
+                item.setToolTip(titulo.strip())
+                aba = self.aba_da_sessao(sessao)
+                if aba is not None:
+                    aba.titulo = titulo.strip()
+                    self.atualizar_titulo_aba(aba)
+        elif action == excluir_action:
+            aba = self.aba_da_sessao(sessao)
+            if aba is not None:
+                aba.limpar()
+                self.atualizar_titulo_aba(aba)
+            self.armazem.excluir_sessao(sessao)
+            self.lista_sessoes.takeItem(self.lista_sessoes.row(item))
+            del self.itens_sessoes[sessao]
+            self.sessoes_carregadas = max(0, self.sessoes_carregadas - 1)
+
+    def closeEvent(self, event):
+        for aba in self.abas_abertas():
+            aba.fechar()
+        if self.armazem is not None:
+            self.armazem.fechar()
+            self.armazem = None
+        super().closeEvent(event)
+
+    def registrar_desempenho(self, aba: AbaChat, resposta: Mensagem):
+        geracao = aba.geracao_atual
+        if geracao is None:
+            return
+        metricas = dict(geracao.metricas)
+        metricas["atraso_render"] = aba.buffer_chat.atraso_maximo
+        if metricas.get("eval_count") is not None:
+            resposta.tokens = metricas["eval_count"]
+        if metricas.get("cache"):
+            return  # Resposta reproduzida do cache: não mede o modelo
+        derivadas = self.metricas.registrar(geracao.modelo, metricas)
+        if self.painel_desempenho is not None:
+            self.painel_desempenho.atualizar(geracao.modelo, derivadas, self.metricas)
 
     @Slot(str, bool)
     def adicionar_log(self, mensagem: Optional[str] = None, limpar: bool = False):
@@ -290,49 +3698,78 @@ class InterfaceOllama(QMainWindow):
                 self.caixa_log.append(mensagem)
             
             cursor = self.caixa_log.textCursor()
-            cursor.movePosition(QTextCursor.End)
-            self.caixa_log.setTextCursor(cursor)
-        except Exception as e:
-            print(f"Erro fatal no log: {str(e)}")
-        finally:
-            self.caixa_log.setReadOnly(True)
-
-    @Slot()
-    def mostrar_barra_progresso(self):
-        self.progresso.setVisible(True)
-        self.botao_parar.setVisible(True)
-        self.botao_parar.setEnabled(True)
-
-    @Slot()
-    def ocultar_barra_progresso(self):
-        self.progresso.setVisible(False)
-        self.botao_parar.setVisible(False)
+            cursor.movePosition(QTextCursor.End)
+            self.caixa_log.setTextCursor(cursor)
+        except Exception as e:
+            print(f"Erro fatal no log: {str(e)}")
+        finally:
+            self.caixa_log.setReadOnly(True)
 
     @Slot(str, bool)
     def habilitar_botao(self, nome: str, estado: bool):
         if nome == "enviar":
-            self.botao_enviar.setEnabled(estado)
+            self.envio_habilitado = estado
+            self.atualizar_controles()
         elif nome == "atualizar":
             self.botao_atualizar.setEnabled(estado)
         elif nome == "parar":
             self.botao_parar.setEnabled(estado)
 
+    # O texto de cada item traz os detalhes do modelo; o nome fica nos dados
+    def modelo_selecionado(self) -> str:
+        return self.seletor_modelo.currentData() or ""
+
+    def texto_modelo(self, modelo: str) -> str:
+        descricao = CatalogoModelos.descrever(self.catalogo.detalhes(self.api_url, modelo))
+        return f"{modelo}  —  {descricao}" if descricao else modelo
+
+    def preencher_seletor(self, modelos: List[str]):
+        anterior = self.modelo_selecionado()
+        self.seletor_modelo.setStyleSheet("")
+        self.seletor_modelo.clear()
+        for modelo in modelos:
+            self.seletor_modelo.addItem(self.texto_modelo(modelo), modelo)
+        indice = self.seletor_modelo.findData(anterior)
+        self.seletor_modelo.setCurrentIndex(max(0, indice))
+
+    # Preenche o seletor com a última lista salva, antes da rede responder
+    def restaurar_instantaneo_modelos(self):
+        self.atualizar_host()
+        modelos = self.catalogo.instantaneo(self.api_url)
+        if modelos:
+            self.preencher_seletor(modelos)
+            self.modelos_restaurados = len(modelos)
+
     @Slot(list)
     def atualizar_seletor_modelos_ui(self, modelos):
-        self.seletor_modelo.clear()
-        self.seletor_modelo.addItems(modelos)
+        anterior = self.modelo_selecionado()
+        disponiveis_antes = self.modelos_disponiveis
+        self.modelos_disponiveis = list(modelos)
         if modelos:
-            self.seletor_modelo.setCurrentIndex(0)
+            self.preencher_seletor(modelos)
             self.signals.enable_button.emit("enviar", True)
+            # Pré-carregar só quando a seleção mudou de fato
+            atual = self.modelo_selecionado()
+            if atual != anterior or anterior not in disponiveis_antes:
+                self.ao_selecionar_modelo(atual)
         else:
             self.mostrar_erro("Baixe um modelo primeiro!")
+        self.marcar_tempo_inicio("interativa")
+
+    @Slot(str, dict)
+    def atualizar_detalhes_modelo_ui(self, modelo: str, detalhes: dict):
+        indice = self.seletor_modelo.findData(modelo)
+        if indice >= 0:
+            self.seletor_modelo.setItemText(indice, self.texto_modelo(modelo))
 
     @Slot(str)
     def mostrar_erro(self, texto):
+        self.modelos_disponiveis = []
         self.seletor_modelo.clear()
         self.seletor_modelo.addItem(texto)
         self.seletor_modelo.setStyleSheet("color: #ff6666;")
         self.signals.enable_button.emit("enviar", False)
+        self.marcar_tempo_inicio("interativa")
 
     @Slot(list)
     def atualizar_lista_modelos_ui(self, modelos):
@@ -353,16 +3790,30 @@ class InterfaceOllama(QMainWindow):
         self.signals.enable_button.emit("atualizar", False)
         Thread(target=self.atualizar_seletor_modelos, daemon=True).start()
 
+    # O primeiro host é o principal (catálogo, downloads, exclusão); as
+    # gerações são distribuídas entre todos
     def atualizar_host(self):
-        url = self.entrada_host.text().strip()
-        if not url.startswith(('http://', 'https://')):
-            url = 'http://' + url
-        self.api_url = url
+        urls = PoolHosts.separar(self.entrada_host.text()) or [self.api_url]
+        self.api_url = urls[0]
+        self.pool.definir(urls)
+        self.atualizar_rotulo_hosts()
+
+    @Slot()
+    def atualizar_rotulo_hosts(self):
+        estados = self.pool.estados()
+        self.rotulo_hosts.setVisible(len(estados) > 1)
+        if len(estados) < 2:
+            return
+        saudaveis = sum(1 for estado in estados if estado.saudavel)
+        self.rotulo_hosts.setText(f"{saudaveis}/{len(estados)} hosts")
+        self.rotulo_hosts.setStyleSheet("" if saudaveis == len(estados) else "color: #ffcc80;")
+        self.rotulo_hosts.setToolTip("\n".join(estado.descrever() for estado in estados))
 
     def atualizar_seletor_modelos(self):
         try:
-            modelos = self.buscar_modelos()
+            modelos = self.buscar_modelos_pool(forcar=True)
             self.signals.update_model_combo.emit(modelos)
+            self.carregar_detalhes_modelos(modelos)
         except ModeloNaoEncontradoError:
             self.signals.show_error.emit("Nenhum modelo encontrado!")
         except ErroConexaoError as e:
@@ -379,80 +3830,145 @@ class InterfaceOllama(QMainWindow):
             mensagem = self.entrada_usuario.toPlainText().strip()
             if not mensagem:
                 return
-                
-            # Parar qualquer geração em andamento
-            self.parar_geracao_atual = True
-            time.sleep(0.1)  # Dar tempo para a thread parar
+            aba = self.aba
+
+            # Entregar o que já chegou e voltar ao fim da conversa (se um
+            # resultado de busca estiver aberto) antes de mexer no histórico
+            aba.buffer_chat.descarregar()
+            aba.ir_para_fim_chat()
             
-            if self.editando:
-                # Adicionar mensagem editada
-                self.signals.update_chat.emit(mensagem, "usuario_editado")
-                self.historico_chat[self.indice_edicao] = {"role": "user", "content": mensagem}
-                
-                # Remover respostas após a mensagem editada
-                if len(self.historico_chat) > self.indice_edicao + 1:
-                    self.historico_chat = self.historico_chat[:self.indice_edicao + 1]
+            posicao = aba.posicao_historico.get(aba.id_edicao) if aba.editando else None
+            if posicao is not None:
+                # Substituir a mensagem editada e remover as respostas seguintes
+                aba.truncar_historico(posicao)
+                nova = Mensagem("user", mensagem, "usuario_editado")
+                aba.adicionar_ao_historico(nova)
+                aba.buffer_chat.adicionar(nova, "usuario_editado")
                 
                 # Adicionar mensagem informativa sobre a edição
-                self.signals.update_chat.emit("(Mensagem editada, aguardando nova resposta)", "info")
-                
-                self.editando = False
-                self.indice_edicao = None
+                aba.buffer_chat.adicionar("(Mensagem editada, aguardando nova resposta)", "info")
             else:
                 # Nova mensagem normal
-                self.signals.update_chat.emit(mensagem, "usuario")
-                self.historico_chat.append({"role": "user", "content": mensagem})
+                nova = Mensagem("user", mensagem, "usuario")
+                aba.adicionar_ao_historico(nova)
+                aba.buffer_chat.adicionar(nova, "usuario")
 
+            aba.editando = False
+            aba.id_edicao = None
             self.entrada_usuario.clear()
-
-            # Resetar a flag de parada
-            self.parar_geracao_atual = False
-            
-            # Iniciar nova thread para gerar resposta
-            self.thread_geracao = Thread(target=self.gerar_resposta_ia, daemon=True)
-            self.thread_geracao.start()
+            aba.iniciar_geracao()
             
         except Exception as e:
             self.adicionar_log(f"Erro ao enviar: {str(e)}")
 
-    def parar_geracao(self):
-        self.parar_geracao_atual = True
-        self.botao_parar.setEnabled(False)
+    # Roda no thread da geração de uma aba. Com o cache ativo e opções
+    # determinísticas, uma resposta já guardada é reproduzida na hora.
+    # Senão escolhe o host no pool, espera vaga nele (o pedido de parar
+    # também vale durante a espera) e transmite a resposta para o buffer da
+    # aba. Se a conexão com o host falhar antes do primeiro token, a
+    # requisição é repetida em outro
+    def gerar_resposta_ia(self, aba: AbaChat, geracao: Geracao):
+        def emitir(conteudo: Any, tipo: str):
+            aba.buffer_chat.adicionar(conteudo, tipo, geracao.id)
 
-    def gerar_resposta_ia(self):
-        self.signals.show_progress.emit()
-        self.signals.enable_button.emit("enviar", False)
-        self.signals.enable_button.emit("atualizar", False)
-        self.signals.enable_button.emit("parar", True)
+        modelo = geracao.modelo
+        opcoes = dict(self.opcoes_geracao)
+        api_url = self.pool.escolher(modelo)
+        vaga = None  # Host cuja vaga está ocupada por esta geração
+
+        def ao_esperar(a_frente: int):
+            self.signals.update_status.emit(
+                f"Aguardando vaga em {AgendadorGeracoes.host(api_url)} "
+                f"({self.agendador.limite} gerações simultâneas, {a_frente} na frente)"
+            )
+
+        # Ocupa a vaga no host escolhido, se ainda não ocupou. O resumo do
+        # contexto longo também a usa, antes mesmo de consultar o cache
+        def ocupar_vaga() -> Optional[str]:
+            nonlocal vaga
+            if vaga is None:
+                if not self.agendador.adquirir(api_url, geracao, ao_esperar):
+                    return None
+                vaga = api_url
+                self.pool.registrar_uso(api_url, modelo)
+            return vaga
+
+        cache, mensagens, chave = self.cache_respostas, None, None
+        if cache is not None and CacheRespostas.deterministica(opcoes):
+            try:
+                mensagens = self.preparar_contexto(aba, geracao, ocupar_vaga)
+            except Exception:
+                mensagens = None  # O erro volta a acontecer, e é mostrado, na geração
+            else:
+                chave = cache.chave(self.digest_modelo(modelo), mensagens, opcoes)
+                guardada = cache.obter(chave)
+                self.signals.update_cache.emit()
+                if guardada is not None:
+                    if vaga is not None:
+                        self.agendador.liberar(vaga)
+                    self.reproduzir_do_cache(aba, geracao, *guardada)
+                    return
+
+        if ocupar_vaga() is None:
+            self.signals.update_tab_state.emit(aba.id, geracao.id, AbaChat.OCIOSA)
+            return
+        self.signals.update_tab_state.emit(aba.id, geracao.id, AbaChat.GERANDO)
 
         try:
-            modelo = self.seletor_modelo.currentText()
-            self.signals.update_chat.emit(modelo, "nome_modelo")
+            resposta = Mensagem("assistant", tipo="modelo", modelo=modelo)
+            emitir(resposta, "nome_modelo")
             
-            mensagem_ia = ""
-            for parte in self.buscar_resposta_chat_stream():
-                if self.parar_geracao_atual:
+            recebeu = False
+            partes = []  # Texto da resposta, para o cache
+            tentados = []
+            while True:
+                try:
+                    for parte in self.buscar_resposta_chat_stream(aba, geracao, api_url, mensagens, opcoes):
+                        if geracao.cancelada:
+                            break
+                            
+                        emitir(parte, "modelo")
+                        recebeu = recebeu or bool(parte)
+                        if chave is not None:
+                            partes.append(parte)
                     break
-                    
-                self.signals.update_chat.emit(parte, "modelo")
-                mensagem_ia += parte
+                except ErroTransporteError as e:
+                    # Só falhas de transporte indicam host fora do ar; erros
+                    # HTTP e do servidor (modelo inexistente, prompt
+                    # inválido...) chegam ao usuário sem trocar de host
+                    if geracao.cancelada or recebeu:
+                        raise
+                    self.pool.registrar_falha(api_url, str(e))
+                    tentados.append(api_url)
+                    proximo = self.pool.escolher(modelo, tentados)
+                    if proximo is None:
+                        raise
+                    self.signals.update_status.emit(
+                        f"{AgendadorGeracoes.host(api_url)} falhou ({str(e)}); "
+                        f"repetindo em {AgendadorGeracoes.host(proximo)}")
+                    self.agendador.liberar(vaga)
+                    vaga, api_url = None, proximo
+                    if ocupar_vaga() is None:
+                        return
+                    geracao.metricas.clear()
                 
-            if not self.parar_geracao_atual and mensagem_ia:
-                self.historico_chat.append({"role": "assistant", "content": mensagem_ia})
-                self.signals.update_chat.emit("\n", "texto")
+            if not geracao.cancelada and recebeu:
+                emitir(resposta, "concluida")
+                if chave is not None:
+                    cache.guardar(chave, "".join(partes), geracao.metricas)
             
         except socket.timeout:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = "Tempo esgotado: A resposta demorou muito"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except urllib.error.URLError as e:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = f"Erro de conexão: {e.reason}"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except urllib.error.HTTPError as e:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 if e.code == 500:
                     erro = "Erro interno no servidor Ollama (500)\n"
                     erro += "Possíveis causas:\n"
@@ -465,43 +3981,73 @@ class InterfaceOllama(QMainWindow):
                     erro += "3. Verifique os logs do servidor"
                 else:
                     erro = f"Erro HTTP {e.code}: {e.reason}"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except json.JSONDecodeError:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = "Resposta inválida do servidor"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except ModeloNaoEncontradoError:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = "Modelo não encontrado"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except ErroConexaoError as e:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = f"Falha na conexão: {str(e)}"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except ErroServidorError as e:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = f"Erro no servidor: {str(e)}"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         except Exception as e:
-            if not self.parar_geracao_atual:
+            if not geracao.cancelada:
                 erro = f"Erro inesperado: {type(e).__name__}"
-                self.signals.update_chat.emit(erro, "erro")
-                self.signals.update_chat.emit("\n", "texto")
+                emitir(erro, "erro")
+                emitir("\n", "texto")
         finally:
-            self.signals.hide_progress.emit()
-            self.signals.enable_button.emit("enviar", True)
-            self.signals.enable_button.emit("atualizar", True)
-            self.signals.enable_button.emit("parar", True)
+            if vaga is not None:
+                self.agendador.liberar(vaga)
+            self.signals.update_tab_state.emit(aba.id, geracao.id, AbaChat.OCIOSA)
+
+    def buscar_modelos(self, forcar: bool = False) -> List[str]:
+        return self.catalogo.listar(self.api_url, self.buscar_tags, forcar)
 
-    def buscar_modelos(self) -> List[str]:
-        url = urllib.parse.urljoin(self.api_url, "/api/tags")
+    # Modelos de todos os hosts do pool, sem repetição, na ordem dos hosts.
+    # Hosts fora do ar são ignorados enquanto algum responder
+    def buscar_modelos_pool(self, forcar: bool = False) -> List[str]:
+        urls = self.pool.urls()
+        if len(urls) < 2:
+            return self.buscar_modelos(forcar)
+        modelos, erro = {}, None
+        for api_url in urls:
+            try:
+                nomes = self.catalogo.listar(api_url, lambda api_url=api_url: self.buscar_tags(api_url), forcar)
+            except (ModeloNaoEncontradoError, ErroConexaoError, ErroServidorError) as e:
+                self.pool.registrar_falha(api_url, str(e))
+                erro = erro or e
+                continue
+            self.pool.registrar_modelos(api_url, nomes)
+            modelos.update(dict.fromkeys(nomes))
+        self.signals.update_hosts.emit()
+        if not modelos and erro is not None:
+            raise erro
+        return list(modelos)
+
+    # Sondagem de um host do pool: modelos instalados e carregados
+    def sondar_host(self, api_url: str) -> Tuple[List[str], List[str]]:
+        modelos = self.catalogo.listar(
+            api_url, lambda: self.buscar_tags(api_url, timeout=TIMEOUT_SONDAGEM), forcar=True)
+        carregados = self.buscar_carregados(api_url, timeout=TIMEOUT_SONDAGEM)
+        return modelos, [modelo.get("name", "") for modelo in carregados]
+
+    def buscar_tags(self, api_url: Optional[str] = None, timeout: float = TIMEOUT_CONEXAO) -> List[dict]:
+        url = urllib.parse.urljoin(api_url or self.api_url, "/api/tags")
         try:
-            with urllib.request.urlopen(url, timeout=TIMEOUT_CONEXAO) as resposta:
+            with self.cliente_http.requisitar(url, timeout=timeout) as resposta:
                 if resposta.status != 200:
                     raise ErroServidorError(f"Status HTTP inesperado: {resposta.status}")
                 
@@ -509,8 +4055,9 @@ class InterfaceOllama(QMainWindow):
                 if "models" not in dados:
                     raise ModeloNaoEncontradoError("Nenhum modelo disponível")
                     
-                modelos = [modelo["name"] for modelo in dados["models"]]
-                return modelos
+                return dados["models"]
+        except (ModeloNaoEncontradoError, ErroServidorError):
+            raise
         except urllib.error.HTTPError as e:
             if e.code == 500:
                 raise ErroServidorError("Erro interno no servidor Ollama (500)") from e
@@ -525,53 +4072,318 @@ class InterfaceOllama(QMainWindow):
         except Exception as e:
             raise ErroConexaoError(f"Erro inesperado: {str(e)}") from e
 
-    def buscar_resposta_chat_stream(self) -> Generator:
-        url = urllib.parse.urljoin(self.api_url, "/api/chat")
-        dados = json.dumps(
-            {
-                "model": self.seletor_modelo.currentText(),
-                "messages": self.historico_chat,
-                "stream": True,
-            }
-        ).encode("utf-8")
-        headers = {"Content-Type": "application/json"}
+    def buscar_show(self, modelo: str) -> dict:
+        url = urllib.parse.urljoin(self.api_url, "/api/show")
+        dados = json.dumps({"model": modelo}).encode("utf-8")
+        with self.cliente_http.requisitar(url, dados, timeout=TIMEOUT_CONEXAO) as resposta:
+            return json.load(resposta)
 
-        req = urllib.request.Request(url, data=dados, headers=headers, method="POST")
+    # Modelos carregados na memória do servidor agora
+    def buscar_carregados(self, api_url: Optional[str] = None, timeout: float = TIMEOUT_CONEXAO) -> List[dict]:
+        url = urllib.parse.urljoin(api_url or self.api_url, "/api/ps")
         try:
-            with urllib.request.urlopen(req, timeout=TIMEOUT_CONVERSA) as resp:
-                if resp.status != 200:
-                    raise ErroServidorError(f"Status HTTP inesperado: {resp.status}")
-                
-                for linha in resp:
-                    if self.parar_geracao_atual:  # Verificar se foi solicitado parar
-                        break
-                    dados = json.loads(linha.decode("utf-8"))
-                    if "message" in dados:
-                        time.sleep(0.01)
-                        yield dados["message"]["content"]
+            with self.cliente_http.requisitar(url, timeout=timeout) as resposta:
+                return json.load(resposta).get("models") or []
         except urllib.error.HTTPError as e:
-            if e.code == 500:
-                raise ErroServidorError("Erro interno no servidor durante a conversa") from e
-            else:
-                raise ErroConexaoError(f"Erro HTTP {e.code}: {e.reason}") from e
+            raise ErroServidorError(f"Erro HTTP {e.code}: {e.reason}") from e
         except urllib.error.URLError as e:
-            raise ErroConexaoError(f"Erro durante a conversa: {e.reason}") from e
+            raise ErroConexaoError(f"Falha ao conectar com o servidor: {e.reason}") from e
         except socket.timeout:
-            raise ErroConexaoError("Tempo de resposta esgotado") from None
+            raise ErroConexaoError("Tempo de conexão esgotado") from None
         except json.JSONDecodeError:
             raise ErroServidorError("Resposta inválida do servidor") from None
+
+    # keep_alive 0 sem prompt faz o Ollama tirar o modelo da memória na hora
+    def descarregar_modelo(self, modelo: str):
+        try:
+            url = urllib.parse.urljoin(self.api_url, "/api/generate")
+            dados = json.dumps({"model": modelo, "keep_alive": 0}).encode("utf-8")
+            with self.cliente_http.requisitar(url, dados, timeout=TIMEOUT_CONVERSA) as resposta:
+                resposta.read()
+            self.signals.update_log.emit(f"{modelo} descarregado da memória.", False)
         except Exception as e:
-            raise ErroConexaoError(f"Erro inesperado: {str(e)}") from e
+            self.signals.update_log.emit(f"Falha ao descarregar {modelo}: {str(e)}", False)
+
+    # Busca (uma vez por modelo) os detalhes que ainda não estão no catálogo
+    def carregar_detalhes_modelos(self, modelos: List[str]):
+        for modelo in modelos:
+            if self.catalogo.detalhes(self.api_url, modelo) is not None:
+                continue
+            try:
+                detalhes = self.catalogo.obter_detalhes(self.api_url, modelo, self.buscar_show)
+            except Exception:
+                continue  # Os detalhes são opcionais
+            self.signals.update_model_details.emit(modelo, detalhes)
+
+    def buscar_resposta_chat_stream(self, aba: AbaChat, geracao: Geracao, api_url: str,
+                                    mensagens: Optional[List[dict]] = None,
+                                    opcoes: Optional[dict] = None) -> Generator:
+        modelo = geracao.modelo
+        if mensagens is None:
+            mensagens = self.preparar_contexto(aba, geracao, lambda: api_url)
+        yield from transmitir_chat(self.cliente_http, api_url, modelo, mensagens,
+                                   geracao, keep_alive=self.keep_alive(modelo), opcoes=opcoes)
+
+    # Entrega uma resposta do cache sem ocupar vaga em host nenhum: de uma
+    # vez ou, se pedido, espalhada pelo tempo que levou para ser gerada
+    def reproduzir_do_cache(self, aba: AbaChat, geracao: Geracao, conteudo: str, metricas: dict):
+        def emitir(conteudo: Any, tipo: str):
+            aba.buffer_chat.adicionar(conteudo, tipo, geracao.id)
+
+        self.signals.update_tab_state.emit(aba.id, geracao.id, AbaChat.GERANDO)
+        try:
+            resposta = Mensagem("assistant", tipo="modelo", modelo=geracao.modelo)
+            emitir(resposta, "nome_modelo")
+            geracao.metricas = {"cache": True, "eval_count": metricas.get("eval_count")}
+            duracao = metricas.get("eval_duration", 0) / 1e9
+            if self.cache_no_ritmo and duracao > 0:
+                inicio, enviado = time.perf_counter(), 0
+                while enviado < len(conteudo) and not geracao.cancelada:
+                    time.sleep(INTERVALO_RENDERIZACAO_MS / 1000)
+                    fracao = min(1.0, (time.perf_counter() - inicio) / duracao)
+                    fim = len(conteudo) if fracao >= 1.0 else int(len(conteudo) * fracao)
+                    if fim > enviado:
+                        emitir(conteudo[enviado:fim], "modelo")
+                        enviado = fim
+            else:
+                emitir(conteudo, "modelo")
+            if not geracao.cancelada:
+                emitir(resposta, "concluida")
+                self.signals.update_status.emit(
+                    f"Resposta do cache ({metricas.get('total_duration', 0) / 1e9:.1f} s de geração poupados)")
+        finally:
+            self.signals.update_tab_state.emit(aba.id, geracao.id, AbaChat.OCIOSA)
+
+    # Digest do modelo no primeiro host do pool que o tem; sem ele, o nome
+    def digest_modelo(self, modelo: str) -> str:
+        for api_url in self.pool.urls():
+            digest = self.catalogo.digest(api_url, modelo)
+            if digest:
+                return digest
+        return modelo
+
+    # O resumo, quando o contexto passa do limite, é gerado no host da
+    # geração e dentro da vaga dela: ocupar_vaga devolve esse host (ou None se
+    # a geração foi cancelada enquanto esperava)
+    def preparar_contexto(self, aba: AbaChat, geracao: Geracao,
+                          ocupar_vaga: Callable[[], Optional[str]]) -> List[dict]:
+        historico = list(aba.historico_chat)
+        if self.prompt_sistema is not None:
+            historico.insert(0, self.prompt_sistema)
+
+        def resumir(mensagens, anterior, limite):
+            api_url = ocupar_vaga()
+            if api_url is None:
+                raise ErroConexaoError("Geração cancelada antes do resumo")
+            return self.resumir_mensagens(api_url, geracao, mensagens, anterior, limite)
+
+        mensagens, enviados, total, omitidas, resumo = aba.contexto.preparar(historico, resumir)
+        status = f"Contexto: ~{enviados} de ~{total} tokens enviados"
+        if omitidas:
+            status += f" ({omitidas} mensagens antigas {'resumidas' if resumo else 'omitidas'})"
+        self.signals.update_status.emit(status)
+        return mensagens
+
+    def resumir_mensagens(self, api_url: str, geracao: Geracao, mensagens: List[Mensagem],
+                          anterior: Optional[str], limite: int) -> str:
+        modelo = geracao.modelo
+        conversa = "\n".join(f"{m.papel}: {m.conteudo}" for m in mensagens)
+        prompt = ("Resuma de forma concisa a conversa abaixo, preservando fatos, decisões "
+                  "e pedidos do usuário. Responda apenas com o resumo.\n\n")
+        if anterior:
+            prompt += f"Resumo anterior:\n{anterior}\n\n"
+        prompt += f"Conversa:\n{conversa}"
+
+        url = urllib.parse.urljoin(api_url, "/api/chat")
+        dados = json.dumps({
+            "model": modelo,
+            "messages": [{"role": "user", "content": prompt}],
+            "stream": False,
+            "options": {"num_predict": limite},
+            "keep_alive": self.keep_alive(modelo),
+        }).encode("utf-8")
+        with self.cliente_http.requisitar(url, dados, timeout=TIMEOUT_CONVERSA, geracao=geracao) as resposta:
+            return json.load(resposta)["message"]["content"].strip()
+
+    def keep_alive(self, modelo: str):
+        return self.keep_alive_modelos.get(modelo, KEEP_ALIVE_PADRAO)
+
+    @staticmethod
+    def normalizar_keep_alive(texto: str):
+        texto = texto.strip()
+        if re.fullmatch(r"-?\d+", texto):
+            return int(texto)
+        if re.fullmatch(r"-?(\d+(\.\d+)?(ns|us|µs|ms|s|m|h))+", texto):
+            return texto
+        return None
+
+    def definir_keep_alive(self):
+        modelo = self.modelo_selecionado()
+        if modelo not in self.modelos_disponiveis:
+            return
+        texto, ok = QInputDialog.getText(
+            self, "Keep-alive do Modelo",
+            f"Tempo que {modelo} fica carregado após cada uso\n"
+            "(ex.: 5m, 1h, -1 = sempre, 0 = descarregar logo):",
+            text=str(self.keep_alive(modelo))
+        )
+        if not ok:
+            return
+        valor = self.normalizar_keep_alive(texto)
+        if valor is None:
+            QMessageBox.warning(self, "Keep-alive", f"Duração inválida: {texto}")
+            return
+        self.keep_alive_modelos[modelo] = valor
+        self.ao_selecionar_modelo(modelo)
+
+    # Escolha feita no seletor: vale para as próximas respostas da aba atual
+    def ao_escolher_modelo(self, modelo: str):
+        self.aba.modelo = modelo
+        self.ao_selecionar_modelo(modelo)
+
+    @Slot(str)
+    def ao_selecionar_modelo(self, modelo: str):
+        if (not self.preaquecer_modelos or modelo not in self.modelos_disponiveis
+                or modelo in self.modelos_preaquecendo):
+            return
+        self.modelos_preaquecendo.add(modelo)
+        Thread(target=self.preaquecer_modelo, args=(modelo, self.keep_alive(modelo)), daemon=True).start()
+
+    # Uma requisição sem prompt faz o Ollama carregar o modelo e aplicar o keep_alive
+    def preaquecer_modelo(self, modelo: str, keep_alive):
+        self.signals.update_status.emit(f"Carregando {modelo}...")
+        try:
+            # No host que receberia a próxima geração, que depois o prefere
+            api_url = self.pool.escolher(modelo)
+            url = urllib.parse.urljoin(api_url, "/api/generate")
+            dados = json.dumps({"model": modelo, "keep_alive": keep_alive}).encode("utf-8")
+            inicio = time.perf_counter()
+            with self.cliente_http.requisitar(url, dados, timeout=TIMEOUT_CONVERSA) as resposta:
+                resultado = json.load(resposta)
+            decorrido = time.perf_counter() - inicio
+            self.pool.registrar_uso(api_url, modelo)
+            carga = resultado.get("load_duration", 0) / 1e9
+            if carga >= 0.1:
+                self.signals.update_status.emit(
+                    f"{modelo} pré-carregado: load_duration {carga:.2f} s poupados da primeira resposta")
+            else:
+                self.signals.update_status.emit(
+                    f"{modelo} já estava carregado ({decorrido:.2f} s, keep_alive {keep_alive})")
+        except Exception as e:
+            self.signals.update_status.emit(f"Falha ao pré-carregar {modelo}: {str(e)}")
+        finally:
+            self.modelos_preaquecendo.discard(modelo)
+
+    def definir_prompt_sistema(self):
+        atual = self.prompt_sistema.conteudo if self.prompt_sistema is not None else ""
+        texto, ok = QInputDialog.getMultiLineText(self, "Prompt de Sistema",
+                                                  "Instruções fixas enviadas em toda requisição:", atual)
+        if ok:
+            texto = texto.strip()
+            self.prompt_sistema = Mensagem("system", texto, "info") if texto else None
+
+    def definir_orcamento_contexto(self):
+        valor, ok = QInputDialog.getInt(self, "Orçamento de Contexto",
+                                        "Máximo de tokens do histórico por requisição:",
+                                        self.orcamento_contexto, 256, 1048576, 256)
+        if ok:
+            self.orcamento_contexto = valor
+            for aba in self.abas_abertas():
+                aba.contexto.orcamento = valor
+                aba.contexto.limpar()
+
+    def definir_limite_chat(self):
+        valor, ok = QInputDialog.getInt(self, "Mensagens no Chat",
+                                        "Mensagens mantidas na tela (as anteriores ficam em disco):",
+                                        self.limite_chat, 50, 100000, 50)
+        if ok:
+            self.limite_chat = valor
+            for aba in self.abas_abertas():
+                aba.modelo_chat.max_linhas = valor
+                aba.despejar_chat()
+
+    def definir_geracoes_por_host(self):
+        valor, ok = QInputDialog.getInt(self, "Gerações Simultâneas",
+                                        "Respostas geradas ao mesmo tempo em cada host\n"
+                                        "(as demais abas esperam a vez; use o OLLAMA_NUM_PARALLEL do servidor):",
+                                        self.agendador.limite, 1, 64, 1)
+        if ok:
+            self.agendador.definir_limite(valor)
+
+    def alternar_resumo_contexto(self, ativo: bool):
+        self.resumir_contexto = ativo
+        for aba in self.abas_abertas():
+            aba.contexto.resumir = ativo
+            aba.contexto.limpar()
+
+    # Opções enviadas em toda geração, como "temperature=0 seed=42"
+    @staticmethod
+    def interpretar_opcoes(texto: str) -> Optional[dict]:
+        opcoes = {}
+        for par in re.split(r"[,;\s]+", texto.strip()):
+            if not par:
+                continue
+            nome, igual, valor = par.partition("=")
+            if not igual or not re.fullmatch(r"[a-z_]+", nome):
+                return None
+            try:
+                opcoes[nome] = json.loads(valor)
+            except ValueError:
+                opcoes[nome] = valor
+        return opcoes
+
+    def definir_opcoes_geracao(self):
+        atual = " ".join(f"{nome}={json.dumps(valor)}" for nome, valor in self.opcoes_geracao.items())
+        texto, ok = QInputDialog.getText(
+            self, "Opções de Geração",
+            "Opções do modelo enviadas em toda resposta, separadas por espaço\n"
+            "(ex.: temperature=0 seed=42 num_ctx=8192; vazio = padrão do modelo).\n"
+            "Com temperature=0 ou seed, as respostas podem ir para o cache:",
+            text=atual
+        )
+        if not ok:
+            return
+        opcoes = self.interpretar_opcoes(texto)
+        if opcoes is None:
+            QMessageBox.warning(self, "Opções de Geração", f"Opções inválidas: {texto}")
+            return
+        self.opcoes_geracao = opcoes
+
+    def alternar_cache_respostas(self, ativo: bool):
+        if ativo and self.cache_respostas is None:
+            self.cache_respostas = CacheRespostas()
+        elif not ativo:
+            self.cache_respostas = None
+        self.atualizar_rotulo_cache()
+
+    def limpar_cache_respostas(self):
+        Thread(target=self._limpar_cache_respostas, args=(self.cache_respostas or CacheRespostas(),),
+               daemon=True).start()
+
+    def _limpar_cache_respostas(self, cache: CacheRespostas):
+        cache.limpar()
+        self.signals.update_cache.emit()
+
+    @Slot()
+    def atualizar_rotulo_cache(self):
+        if self.cache_respostas is None:
+            self.rotulo_cache.setVisible(False)
+            return
+        self.rotulo_cache.setText(self.cache_respostas.resumo())
+        self.rotulo_cache.setVisible(True)
 
     # Outros métodos
     def copiar_texto(self, texto: str):
         clipboard = QApplication.clipboard()
         clipboard.setText(texto)
 
+    # Copia a conversa da aba inteira como texto, incluindo as mensagens que
+    # já saíram da tela
     def copiar_tudo(self):
-        self.copiar_texto(pprint.pformat(self.historico_chat))
+        self.copiar_texto(self.aba.transcricao())
 
     def abrir_pagina_inicial(self):
+        import webbrowser
         webbrowser.open("https://github.com/wendellmoura/ollama-gui")
 
     def mostrar_ajuda(self):
@@ -599,17 +4411,30 @@ class InterfaceOllama(QMainWindow):
                     "janela e retorne se os elementos travarem."
                 )
 
+    # A conversa salva continua no banco; a próxima começa outra sessão na
+    # mesma aba
     def limpar_chat(self):
         try:
-            self.caixa_chat.clear()
-            self.historico_chat.clear()
-            self.editando = False
-            self.indice_edicao = None
+            self.aba.limpar()
+            self.lista_sessoes.clearSelection()
+            self.atualizar_titulo_aba(self.aba)
         except Exception as e:
             self.adicionar_log(f"Erro ao limpar chat: {str(e)}")
 
     def testar_conexao(self):
         self.atualizar_host()
+        urls = self.pool.urls()
+        if len(urls) > 1:
+            resultados = [(url, self.verificar_conexao(url)) for url in urls]
+            texto = "\n".join(f"{'✓' if ok else '✗'} {url}" for url, ok in resultados)
+            if all(ok for _, ok in resultados):
+                QMessageBox.information(self, "Conexão", f"Todos os hosts responderam:\n{texto}")
+            else:
+                QMessageBox.warning(self, "Conexão", f"Alguns hosts não responderam:\n{texto}")
+            for url, ok in resultados:
+                if not ok:
+                    self.pool.registrar_falha(url, "sem resposta no teste de conexão")
+            return
         if self.verificar_conexao():
             QMessageBox.information(
                 self,
@@ -628,12 +4453,13 @@ class InterfaceOllama(QMainWindow):
                 "3. Sua conexão de rede"
             )
 
-    def verificar_conexao(self) -> bool:
+    def verificar_conexao(self, api_url: Optional[str] = None) -> bool:
         try:
-            with urllib.request.urlopen(
-                urllib.parse.urljoin(self.api_url, "/api/tags"), 
+            with self.cliente_http.requisitar(
+                urllib.parse.urljoin(api_url or self.api_url, "/api/tags"), 
                 timeout=5
             ) as resposta:
+                resposta.read()
                 return resposta.status == 200
         except:
             return False
@@ -652,45 +4478,44 @@ class InterfaceOllama(QMainWindow):
             "   • Padrão: http://127.0.0.1:11434\n\n"
             "3. Teste a conexão usando o botão 'Testar Conexão'\n\n"
             "4. Se estiver usando Docker, verifique as portas expostas\n\n"
-            "5. Reinicie o servidor Ollama e a aplicação"
+            "5. Reinicie o servidor Ollama e a aplicação\n\n"
+            "6. Com vários servidores, separe os hosts por vírgula; passe o mouse\n"
+            "   sobre o contador de hosts para ver quais estão respondendo"
         )
         QMessageBox.information(self, "Ajuda de Conexão", ajuda)
 
+    # A janela é criada uma vez e só escondida ao fechar: ela se conecta aos
+    # sinais da interface e da fila, e recriá-la deixaria as antigas vivas
     def mostrar_janela_gerenciamento(self):
-        if hasattr(self, 'janela_gerenciamento') and self.janela_gerenciamento.isVisible():
-            self.janela_gerenciamento.activateWindow()
+        if self.janela_gerenciamento is None:
+            self.janela_gerenciamento = JanelaGerenciamento(self)
+        self.janela_gerenciamento.show()
+        self.janela_gerenciamento.raise_()
+        self.janela_gerenciamento.activateWindow()
+
+    def mostrar_janela_comparacao(self):
+        if hasattr(self, 'janela_comparacao') and self.janela_comparacao.isVisible():
+            self.janela_comparacao.activateWindow()
             return
 
-        self.janela_gerenciamento = JanelaGerenciamento(self)
-        self.janela_gerenciamento.show()
+        self.janela_comparacao = JanelaComparacao(self)
+        self.janela_comparacao.show()
 
     # Métodos para gerenciamento de modelos
-    def baixar_modelo(self, nome_modelo: str, insecure: bool = False):
-        self.signals.update_log.emit("", True)  # Limpar log
-        if not nome_modelo:
-            return
+    # Atualiza as listas de modelos quando um download da fila termina
+    @Slot(str)
+    def ao_baixar_modelo(self, nome_modelo: str):
+        Thread(target=self.atualizar_listas_modelos, daemon=True).start()
 
+    def atualizar_listas_modelos(self):
         try:
-            url = urllib.parse.urljoin(self.api_url, "/api/pull")
-            dados = json.dumps({"name": nome_modelo, "insecure": insecure, "stream": True}).encode("utf-8")
-            req = urllib.request.Request(url, data=dados, method="POST")
-            
-            with urllib.request.urlopen(req, timeout=TIMEOUT_DOWNLOAD) as resposta:
-                for linha in resposta:
-                    dados = json.loads(linha.decode("utf-8"))
-                    log = dados.get("error") or dados.get("status") or "Sem resposta"
-                    if "status" in dados:
-                        total = dados.get("total")
-                        completado = dados.get("completed", 0)
-                        if total:
-                            log += f" [{completado}/{total}]"
-                    self.signals.update_log.emit(log, False)
+            modelos = self.buscar_modelos(forcar=True)
         except Exception as e:
-            self.signals.update_log.emit(f"Falha no download: {str(e)}", False)
-        finally:
-            self.signals.update_model_list.emit(self.buscar_modelos())
-            self.signals.update_model_combo.emit(self.buscar_modelos())
-            self.signals.enable_button.emit("baixar", True)
+            self.signals.update_log.emit(f"Erro ao carregar modelos: {str(e)}", False)
+            return
+        self.signals.update_model_list.emit(modelos)
+        self.signals.update_model_combo.emit(modelos)
+        self.carregar_detalhes_modelos(modelos)
 
     def excluir_modelo(self, nome_modelo: str):
         self.signals.update_log.emit("", True)  # Limpar log
@@ -700,9 +4525,9 @@ class InterfaceOllama(QMainWindow):
         try:
             url = urllib.parse.urljoin(self.api_url, "/api/delete")
             dados = json.dumps({"name": nome_modelo}).encode("utf-8")
-            req = urllib.request.Request(url, data=dados, method="DELETE")
             
-            with urllib.request.urlopen(req, timeout=TIMEOUT_CONEXAO) as resposta:
+            with self.cliente_http.requisitar(url, dados, metodo="DELETE", timeout=TIMEOUT_CONEXAO) as resposta:
+                resposta.read()
                 if resposta.status == 200:
                     self.signals.update_log.emit("Modelo excluído com sucesso.", False)
                 elif resposta.status == 404:
@@ -712,98 +4537,304 @@ class InterfaceOllama(QMainWindow):
         except Exception as e:
             self.signals.update_log.emit(f"Falha ao excluir modelo: {str(e)}", False)
         finally:
-            self.signals.update_model_list.emit(self.buscar_modelos())
-            self.signals.update_model_combo.emit(self.buscar_modelos())
+            self.atualizar_listas_modelos()
 
-    # Método corrigido para mostrar menu de contexto no chat
+    # Menu de contexto de uma mensagem do chat
     def mostrar_menu_contexto(self, pos):
-        menu = QMenu()
-        
-        # Obter a posição do cursor no texto
-        cursor = self.caixa_chat.cursorForPosition(pos)
-        cursor.select(QTextCursor.LineUnderCursor)
-        linha = cursor.selectedText()
-        
-        # Verificar se a linha começa com "Você: " ou "Você (Editado): "
-        if linha.startswith("Você:") or linha.startswith("Você (Editado):"):
-            # Extrair o índice da mensagem no histórico
-            idx = self.obter_indice_mensagem(cursor)
-            if idx is not None:
-                editar_action = menu.addAction("Editar Mensagem")
-                action = menu.exec(self.caixa_chat.mapToGlobal(pos))  # Corrigido para exec()
-                
-                if action == editar_action:
-                    self.editar_mensagem(idx)
-    
-    def obter_indice_mensagem(self, cursor):
-        # Obter o documento e o bloco atual
-        doc = self.caixa_chat.document()
-        block = doc.findBlock(cursor.position())
-        block_text = block.text().strip()
-        
-        # Verificar se é uma mensagem de usuário
-        if not block_text.startswith(("Você:", "Você (Editado):")):
-            return None
+        aba = self.aba
+        indice = aba.caixa_chat.indexAt(pos)
+        if not indice.isValid():
+            return
+        mensagem = aba.modelo_chat.mensagem(indice.row())
+        no_historico = mensagem.id in aba.posicao_historico
 
-        # Encontrar o índice da mensagem baseado no conteúdo
-        user_messages = [msg for msg in self.historico_chat if msg["role"] == "user"]
-        
-        # Procurar o conteúdo no histórico
-        for i, msg in enumerate(user_messages):
-            # Remover prefixos para comparação
-            if block_text.replace("Você:", "").replace("Você (Editado):", "").strip() == msg["content"]:
-                # Calcular índice completo (2 * índice do usuário)
-                return 2 * i
-                
-        return None
+        menu = QMenu()
+        copiar_action = menu.addAction("Copiar Mensagem")
+        editar_action = regenerar_action = None
+        if no_historico and mensagem.papel == "user":
+            editar_action = menu.addAction("Editar Mensagem")
+        elif no_historico and mensagem.papel == "assistant":
+            regenerar_action = menu.addAction("Regenerar Resposta")
 
-    def editar_mensagem(self, idx):
-        # Parar qualquer geração em andamento
-        self.parar_geracao()
-            
-        # Verificar se o índice é válido
-        if idx < 0 or idx >= len(self.historico_chat):
+        action = menu.exec(aba.caixa_chat.mapToGlobal(pos))
+        if action is None:
             return
-            
-        if self.historico_chat[idx]["role"] != "user":
+        if action == copiar_action:
+            self.copiar_texto(mensagem.conteudo)
+        elif action == editar_action:
+            self.editar_mensagem(mensagem.id)
+        elif action == regenerar_action:
+            self.regenerar_resposta(mensagem.id)
+
+    def editar_mensagem(self, id_mensagem: int):
+        aba = self.aba
+        # Parar a geração em andamento na aba
+        aba.parar_geracao()
+
+        posicao = aba.posicao_historico.get(id_mensagem)
+        if posicao is None or aba.historico_chat[posicao].papel != "user":
             return
             
-        # Obter a mensagem
-        mensagem_original = self.historico_chat[idx]["content"]
-        
         # Configurar estado de edição
-        self.editando = True
-        self.indice_edicao = idx
+        aba.editando = True
+        aba.id_edicao = id_mensagem
         
         # Colocar a mensagem na área de entrada para edição
-        self.entrada_usuario.setPlainText(mensagem_original)
+        self.entrada_usuario.setPlainText(aba.historico_chat[posicao].conteudo)
         self.entrada_usuario.setFocus()
 
+    def regenerar_resposta(self, id_mensagem: int):
+        aba = self.aba
+        aba.buffer_chat.descarregar()
+        posicao = aba.posicao_historico.get(id_mensagem)
+        if posicao is None or aba.historico_chat[posicao].papel != "assistant":
+            return
+
+        # Descartar a resposta e tudo que veio depois dela
+        aba.truncar_historico(posicao)
+        aba.buffer_chat.adicionar("(Regenerando resposta)", "info")
+        aba.iniciar_geracao()
+
+
+# Modelos carregados no servidor (/api/ps): tamanho, parte na VRAM e
+# expiração, com descarga em um clique. Só consulta enquanto está visível,
+# uma requisição por vez, e espaça as consultas enquanto nada muda
+class PainelCarregados(QWidget):
+    resultado = Signal(object, str)  # (modelos ou None, erro)
+    descarregado = Signal(str)
+
+    COLUNAS = ("Modelo", "Tamanho", "Processador", "Expira", "")
+
+    def __init__(self, interface, parent=None):
+        super().__init__(parent)
+        self.interface = interface
+        self.modelos = []
+        self.assinatura = None
+        self.intervalo = INTERVALO_MINIMO_MONITOR
+        self.consultando = False
+        self.repetir = False  # Consultar de novo assim que a atual terminar
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        self.rotulo = QLabel("Modelos carregados")
+        layout.addWidget(self.rotulo)
+
+        self.tabela = QTableWidget(0, len(self.COLUNAS))
+        self.tabela.setHorizontalHeaderLabels(self.COLUNAS)
+        self.tabela.verticalHeader().setVisible(False)
+        self.tabela.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabela.setSelectionMode(QAbstractItemView.NoSelection)
+        cabecalho = self.tabela.horizontalHeader()
+        cabecalho.setSectionResizeMode(QHeaderView.ResizeToContents)
+        cabecalho.setSectionResizeMode(0, QHeaderView.Stretch)
+        self.tabela.setFixedHeight(QFontMetrics(self.font()).lineSpacing() * 7)
+        layout.addWidget(self.tabela)
+
+        self.temporizador = QTimer(self)
+        self.temporizador.setSingleShot(True)
+        self.temporizador.timeout.connect(self.consultar)
+        self.resultado.connect(self.ao_receber)
+        self.descarregado.connect(self.ao_descarregar)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.intervalo = INTERVALO_MINIMO_MONITOR
+        self.consultar()
+
+    def hideEvent(self, event):
+        super().hideEvent(event)
+        self.temporizador.stop()
+
+    @Slot()
+    def consultar(self):
+        self.temporizador.stop()
+        if self.consultando:
+            self.repetir = True
+            return
+        self.consultando = True
+        Thread(target=self.buscar, daemon=True).start()
+
+    # Roda num thread separado
+    def buscar(self):
+        try:
+            self.resultado.emit(self.interface.buscar_carregados(), "")
+        except Exception as e:
+            self.resultado.emit(None, str(e))
+
+    @Slot(object, str)
+    def ao_receber(self, modelos: Optional[List[dict]], erro: str):
+        self.consultando = False
+        agora = time.time()
+        if modelos is None:
+            self.rotulo.setText(f"Modelos carregados: falha ao consultar ({erro})")
+            self.intervalo = INTERVALO_MAXIMO_MONITOR
+        else:
+            assinatura = tuple(sorted((m.get("name", ""), m.get("size", 0), m.get("size_vram", 0),
+                                       m.get("expires_at", "")) for m in modelos))
+            if assinatura != self.assinatura:
+                self.assinatura = assinatura
+                self.modelos = sorted(modelos, key=lambda m: m.get("name", ""))
+                self.preencher_tabela()
+                self.intervalo = INTERVALO_MINIMO_MONITOR
+            else:
+                self.intervalo = min(self.intervalo * 2, INTERVALO_MAXIMO_MONITOR)
+            # Consulta de novo logo após a próxima expiração, para a linha sumir
+            for restante in self.atualizar_expiracoes(agora):
+                self.intervalo = max(INTERVALO_MINIMO_MONITOR, min(self.intervalo, restante + 0.5))
+
+        if not self.isVisible():
+            return
+        if self.repetir:
+            self.repetir = False
+            self.consultar()
+        else:
+            self.temporizador.start(int(self.intervalo * 1000))
+
+    def preencher_tabela(self):
+        formatar = ProgressoDownload.formatar_bytes
+        self.tabela.setRowCount(len(self.modelos))
+        total = vram = 0
+        for linha, modelo in enumerate(self.modelos):
+            nome = modelo.get("name") or modelo.get("model", "")
+            tamanho, tamanho_vram = modelo.get("size", 0), modelo.get("size_vram", 0)
+            total += tamanho
+            vram += tamanho_vram
+            self.tabela.setItem(linha, 0, QTableWidgetItem(nome))
+            self.tabela.setItem(linha, 1, QTableWidgetItem(formatar(tamanho)))
+            self.tabela.setItem(linha, 2, QTableWidgetItem(self.texto_processador(tamanho, tamanho_vram)))
+            self.tabela.setItem(linha, 3, QTableWidgetItem())
+            botao = QPushButton("Descarregar")
+            botao.clicked.connect(lambda _=False, nome=nome, botao=botao: self.descarregar(nome, botao))
+            self.tabela.setCellWidget(linha, 4, botao)
+        if self.modelos:
+            self.rotulo.setText(f"Modelos carregados: {len(self.modelos)} — {formatar(total)}, "
+                                f"{formatar(vram)} na VRAM")
+        else:
+            self.rotulo.setText("Modelos carregados: nenhum")
+
+    # Atualiza a coluna de expiração e devolve os segundos até cada expiração
+    def atualizar_expiracoes(self, agora: float) -> List[float]:
+        restantes = []
+        for linha, modelo in enumerate(self.modelos):
+            expira = self.instante_expiracao(modelo.get("expires_at", ""))
+            item = self.tabela.item(linha, 3)
+            if expira is None:
+                item.setText("-")
+                continue
+            restante = expira - agora
+            if restante > 365 * 86400:
+                item.setText("nunca")  # keep_alive negativo
+                continue
+            restantes.append(restante)
+            item.setText(f"em {ProgressoDownload.formatar_duracao(restante)}" if restante > 0 else "expirando")
+            item.setToolTip(time.strftime("%d/%m %H:%M:%S", time.localtime(expira)))
+        return restantes
+
+    @staticmethod
+    def texto_processador(tamanho: int, tamanho_vram: int) -> str:
+        if not tamanho:
+            return "-"
+        gpu = round(100 * min(tamanho_vram, tamanho) / tamanho)
+        if gpu >= 100:
+            return "100% GPU"
+        if gpu <= 0:
+            return "100% CPU"
+        return f"{100 - gpu}% CPU / {gpu}% GPU"
+
+    # expires_at vem em RFC 3339, com nanossegundos e fuso (ex.: 2024-06-04T14:38:31.837534-07:00)
+    @staticmethod
+    def instante_expiracao(texto: str) -> Optional[float]:
+        achado = re.match(r"(\d{4}-\d\d-\d\dT\d\d:\d\d:\d\d)(?:\.(\d+))?(Z|[+-]\d\d:\d\d)?", texto or "")
+        if not achado:
+            return None
+        base, fracao, fuso = achado.groups()
+        fuso = "+00:00" if fuso in (None, "Z") else fuso
+        try:
+            instante = datetime.fromisoformat(base + fuso).timestamp()
+        except (ValueError, OverflowError, OSError):
+            return None
+        return instante + float(f"0.{fracao}") if fracao else instante
+
+    def descarregar(self, modelo: str, botao: QPushButton):
+        botao.setEnabled(False)
+        Thread(target=self._descarregar, args=(modelo,), daemon=True).start()
+
+    def _descarregar(self, modelo: str):
+        self.interface.descarregar_modelo(modelo)
+        self.descarregado.emit(modelo)
+
+    @Slot(str)
+    def ao_descarregar(self, modelo: str):
+        self.assinatura = None  # Refaz a tabela mesmo se a descarga falhou
+        self.intervalo = INTERVALO_MINIMO_MONITOR
+        if self.isVisible():
+            self.consultar()
+
 
 class JanelaGerenciamento(QDialog):
+    COLUNAS_DOWNLOAD = ("Modelo", "Estado", "Progresso", "Detalhes", "")
+
     def __init__(self, parent):
         super().__init__(parent)
         self.parent = parent
+        self.fila = parent.fila_downloads
+        self.linhas_download = {}  # id do item -> linha da tabela
         self.setWindowTitle("Gerenciamento de Modelos")
-        self.resize(400, 500)
+        self.resize(560, 780)
         
         layout = QVBoxLayout(self)
         layout.setContentsMargins(10, 10, 10, 10)
         
-        # Entrada para nome do modelo
+        # Entrada para nomes de modelos (um por linha, ou uma lista colada)
         frame_entrada = QWidget()
         layout_entrada = QHBoxLayout(frame_entrada)
         layout_entrada.setContentsMargins(0, 0, 0, 0)
         
-        self.entrada_nome_modelo = QLineEdit()
+        self.entrada_nome_modelo = QPlainTextEdit()
+        self.entrada_nome_modelo.setPlaceholderText("Nomes dos modelos, um por linha (ex.: llama3.2:3b)")
+        self.entrada_nome_modelo.setFixedHeight(QFontMetrics(self.font()).lineSpacing() * 4 + 12)
         layout_entrada.addWidget(self.entrada_nome_modelo)
         
         self.botao_baixar = QPushButton("Baixar")
-        layout_entrada.addWidget(self.botao_baixar)
+        layout_entrada.addWidget(self.botao_baixar, 0, Qt.AlignTop)
         self.botao_baixar.clicked.connect(self.baixar_modelo)
         
         layout.addWidget(frame_entrada)
         
+        # Fila de downloads: estado e progresso de cada modelo
+        self.tabela_downloads = QTableWidget(0, len(self.COLUNAS_DOWNLOAD))
+        self.tabela_downloads.setHorizontalHeaderLabels(self.COLUNAS_DOWNLOAD)
+        self.tabela_downloads.verticalHeader().setVisible(False)
+        self.tabela_downloads.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.tabela_downloads.setSelectionMode(QAbstractItemView.NoSelection)
+        cabecalho = self.tabela_downloads.horizontalHeader()
+        cabecalho.setSectionResizeMode(QHeaderView.ResizeToContents)
+        cabecalho.setSectionResizeMode(3, QHeaderView.Stretch)
+        layout.addWidget(self.tabela_downloads, 1)
+        
+        # Progresso agregado da fila (bytes totais, velocidade e tempo restante)
+        frame_agregado = QWidget()
+        layout_agregado = QHBoxLayout(frame_agregado)
+        layout_agregado.setContentsMargins(0, 0, 0, 0)
+        
+        self.progresso_download = QProgressBar()
+        self.progresso_download.setRange(0, 1000)
+        self.progresso_download.setTextVisible(False)
+        layout_agregado.addWidget(self.progresso_download, 1)
+        
+        self.botao_cancelar_todos = QPushButton("Cancelar Todos")
+        layout_agregado.addWidget(self.botao_cancelar_todos)
+        self.botao_cancelar_todos.clicked.connect(self.fila.cancelar_todos)
+        
+        self.botao_limpar_downloads = QPushButton("Limpar Finalizados")
+        layout_agregado.addWidget(self.botao_limpar_downloads)
+        self.botao_limpar_downloads.clicked.connect(self.limpar_downloads)
+        
+        layout.addWidget(frame_agregado)
+        
+        self.rotulo_download = QLabel()
+        layout.addWidget(self.rotulo_download)
+        
         # Link para biblioteca
         link = QLabel(
             '<a href="https://ollama.com/library" style="color: #80cbc4; text-decoration: underline;">'
@@ -827,24 +4858,39 @@ class JanelaGerenciamento(QDialog):
         
         layout.addWidget(frame_lista, 1)
         
+        # Modelos carregados na memória do servidor
+        self.painel_carregados = PainelCarregados(self.parent)
+        layout.addWidget(self.painel_carregados)
+        
         # Área de log
         self.caixa_log = QTextEdit()
         self.caixa_log.setReadOnly(True)
         layout.addWidget(self.caixa_log)
         
-        # Conectar sinais do pai
+        # Conectar sinais do pai e da fila de downloads
         self.parent.signals.update_log.connect(self.adicionar_log)
         self.parent.signals.update_model_list.connect(self.atualizar_lista_modelos_ui)
+        self.parent.signals.update_model_details.connect(self.atualizar_detalhes_modelo_ui)
+        self.fila.item_atualizado.connect(self.atualizar_item_download)
+        self.fila.log.connect(self.adicionar_log)
         
-        # Carregar modelos iniciais
+        # Downloads que começaram antes de a janela existir
+        for item in list(self.fila.itens):
+            self.atualizar_item_download(item)
+        self.atualizar_progresso_agregado()
+
+    # Recarrega a lista de modelos a cada vez que a janela é aberta
+    def showEvent(self, event):
+        super().showEvent(event)
         Thread(target=self.carregar_modelos_iniciais, daemon=True).start()
 
     def carregar_modelos_iniciais(self):
         try:
             modelos = self.parent.buscar_modelos()
             self.parent.signals.update_model_list.emit(modelos)
+            self.parent.carregar_detalhes_modelos(modelos)
         except Exception as e:
-            self.parent.adicionar_log(f"Erro ao carregar modelos: {str(e)}")
+            self.parent.signals.update_log.emit(f"Erro ao carregar modelos: {str(e)}", False)
 
     @Slot(str, bool)
     def adicionar_log(self, mensagem: Optional[str] = None, limpar: bool = False):
@@ -853,30 +4899,94 @@ class JanelaGerenciamento(QDialog):
         if mensagem:
             self.caixa_log.append(mensagem)
 
+    @Slot(object)
+    def atualizar_item_download(self, item: ItemDownload):
+        linha = self.linhas_download.get(item.id)
+        if linha is None:
+            linha = self.tabela_downloads.rowCount()
+            self.linhas_download[item.id] = linha
+            self.tabela_downloads.insertRow(linha)
+            self.tabela_downloads.setItem(linha, 0, QTableWidgetItem(item.nome))
+            self.tabela_downloads.setItem(linha, 1, QTableWidgetItem())
+            self.tabela_downloads.setItem(linha, 3, QTableWidgetItem())
+            barra = QProgressBar()
+            barra.setRange(0, 1000)
+            barra.setTextVisible(False)
+            self.tabela_downloads.setCellWidget(linha, 2, barra)
+            botao = QPushButton("Cancelar")
+            botao.clicked.connect(lambda _=False, item=item: self.fila.cancelar(item))
+            self.tabela_downloads.setCellWidget(linha, 4, botao)
+
+        estado = item.estado
+        if item.tentativas > 1 and not item.finalizado:
+            estado += f" ({item.tentativas}/{self.fila.tentativas})"
+        self.tabela_downloads.item(linha, 1).setText(estado)
+        detalhes = item.erro if item.estado in (ItemDownload.FALHOU, ItemDownload.AGUARDANDO) \
+            else item.progresso.resumo()
+        self.tabela_downloads.item(linha, 3).setText(detalhes)
+        self.tabela_downloads.item(linha, 3).setToolTip(detalhes)
+        fracao = 1.0 if item.estado == ItemDownload.CONCLUIDO else item.progresso.fracao()
+        barra = self.tabela_downloads.cellWidget(linha, 2)
+        if fracao is None and item.estado == ItemDownload.BAIXANDO:
+            barra.setRange(0, 0)  # Indeterminado até o tamanho ser conhecido
+        else:
+            barra.setRange(0, 1000)
+            barra.setValue(int((fracao or 0) * 1000))
+        self.tabela_downloads.cellWidget(linha, 4).setEnabled(not item.finalizado)
+        self.atualizar_progresso_agregado()
+
+    def atualizar_progresso_agregado(self):
+        itens = list(self.fila.itens)
+        concluido, total, velocidade = self.fila.agregado()
+        self.progresso_download.setValue(int(concluido / total * 1000) if total else 0)
+        finalizados = sum(1 for item in itens if item.finalizado)
+        texto = f"{finalizados}/{len(itens)} modelos"
+        if total:
+            formatar = ProgressoDownload.formatar_bytes
+            texto += f" — {formatar(concluido)} / {formatar(total)}"
+            if velocidade:
+                texto += f" — {formatar(velocidade)}/s"
+                restante = max(0, total - concluido) / velocidade
+                texto += f" — restante {ProgressoDownload.formatar_duracao(restante)}"
+        self.rotulo_download.setText(texto if itens else "")
+        self.botao_cancelar_todos.setEnabled(self.fila.ativos())
+
+    def limpar_downloads(self):
+        self.fila.remover_finalizados()
+        self.tabela_downloads.setRowCount(0)
+        self.linhas_download.clear()
+        for item in list(self.fila.itens):
+            self.atualizar_item_download(item)
+        self.atualizar_progresso_agregado()
+
     @Slot(list)
     def atualizar_lista_modelos_ui(self, modelos):
         self.lista_modelos.clear()
-        self.lista_modelos.addItems(modelos)
+        for modelo in modelos:
+            item = QListWidgetItem(self.parent.texto_modelo(modelo))
+            item.setData(Qt.UserRole, modelo)
+            self.lista_modelos.addItem(item)
+
+    @Slot(str, dict)
+    def atualizar_detalhes_modelo_ui(self, modelo: str, detalhes: dict):
+        for linha in range(self.lista_modelos.count()):
+            item = self.lista_modelos.item(linha)
+            if item.data(Qt.UserRole) == modelo:
+                item.setText(self.parent.texto_modelo(modelo))
 
     def baixar_modelo(self):
-        modelo = self.entrada_nome_modelo.text().strip()
-        if modelo.startswith("ollama run "):
-            modelo = modelo[11:]
-            
-        self.parent.signals.update_log.emit("", True)  # Limpar log
-        self.botao_baixar.setEnabled(False)
-        Thread(
-            target=self.parent.baixar_modelo,
-            daemon=True,
-            args=(modelo,)
-        ).start()
+        nomes = self.fila.separar_nomes(self.entrada_nome_modelo.toPlainText())
+        if not nomes:
+            return
+        self.entrada_nome_modelo.clear()
+        self.fila.adicionar(nomes)
 
     def excluir_modelo(self):
         item = self.lista_modelos.currentItem()
         if not item:
             return
             
-        modelo = item.text()
+        modelo = item.data(Qt.UserRole) or item.text()
         Thread(
             target=self.parent.excluir_modelo,
             daemon=True,
@@ -884,8 +4994,345 @@ class JanelaGerenciamento(QDialog):
         ).start()
 
 
+# Uma coluna da comparação: a resposta de um modelo, renderizada como no
+# chat, com o estado e as métricas da geração
+class ColunaComparacao(QWidget):
+    def __init__(self, modelo: str, fonte: str, parent=None):
+        super().__init__(parent)
+        self.modelo = modelo
+        self.geracao = Geracao()
+        self.geracao.modelo = modelo
+        self.metricas = None  # Derivadas das estatísticas do último trecho
+        self.encerrada = False  # Concluída, cancelada ou com erro
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        titulo = QLabel(modelo)
+        titulo.setStyleSheet(f"color: {DelegadoMensagem.COR_NOME_MODELO}; font-weight: bold;")
+        layout.addWidget(titulo)
+        self.rotulo_estado = QLabel("Na fila")
+        layout.addWidget(self.rotulo_estado)
+
+        self.modelo_chat = ModeloChat(self)
+        self.caixa, self.delegado = criar_caixa_chat(self.modelo_chat, fonte)
+        barra = self.caixa.verticalScrollBar()
+        barra.rangeChanged.connect(lambda minimo, maximo: barra.setValue(maximo))
+        layout.addWidget(self.caixa, 1)
+        self.rotulo_metricas = QLabel("-")
+        self.rotulo_metricas.setWordWrap(True)
+        layout.addWidget(self.rotulo_metricas)
+
+        self.buffer = BufferRenderizacao(self.renderizar, parent=self)
+        self.buffer.geracao_ativa = self.geracao.id
+        # O nome do modelo já está no título da coluna
+        self.resposta = Mensagem("assistant", tipo="modelo")
+        self.modelo_chat.aplicar_lote([(self.resposta, "nome_modelo")])
+
+    def renderizar(self, segmentos: List[Tuple[Any, str]]):
+        for indice in self.modelo_chat.aplicar_lote(segmentos):
+            self.delegado.sizeHintChanged.emit(indice)
+
+    # Cancela a geração e descarta o que ainda chegar dela
+    def cancelar(self, agendador: AgendadorGeracoes):
+        self.buffer.geracao_ativa = None
+        agendador.cancelar(self.geracao)
+
+    def mostrar_metricas(self, metricas: dict):
+        self.metricas = MetricasDesempenho.derivar(metricas)
+        total = self.metricas.get("total_duration")
+        carga = self.metricas.get("load_duration")
+        self.rotulo_metricas.setText(" · ".join((
+            f"1º token: {PainelDesempenho.formatar(self.metricas.get('ttft'), 's')}",
+            f"{PainelDesempenho.formatar(self.metricas.get('tokens_s'), 'tok/s')}",
+            f"total: {PainelDesempenho.formatar(total / 1e9 if total is not None else None, 's')}",
+            f"carga: {PainelDesempenho.formatar(carga / 1e9 if carga is not None else None, 's')}",
+        )))
+
+
+# Envia o mesmo prompt a vários modelos e mostra as respostas lado a lado.
+# Em paralelo, cada modelo tem seu thread (limitado pelo AgendadorGeracoes
+# como as abas); em sequência, um modelo só começa quando o anterior
+# termina, para não disputar a VRAM quando não cabem todos juntos
+class JanelaComparacao(QDialog):
+    estado_coluna = Signal(object, str)  # (ColunaComparacao, texto)
+    coluna_encerrada = Signal(object, str)  # (ColunaComparacao, "Cancelado" ou o erro)
+    coluna_concluida = Signal(object, dict)  # (ColunaComparacao, métricas)
+
+    def __init__(self, parent):
+        super().__init__(parent)
+        self.parent = parent
+        self.colunas = []
+        self.setWindowTitle("Comparar Modelos")
+        self.resize(1000, 680)
+
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(10, 10, 10, 10)
+
+        frame_entrada = QWidget()
+        layout_entrada = QHBoxLayout(frame_entrada)
+        layout_entrada.setContentsMargins(0, 0, 0, 0)
+
+        self.lista_modelos = QListWidget()
+        self.lista_modelos.setMaximumWidth(240)
+        self.lista_modelos.setFixedHeight(QFontMetrics(self.font()).lineSpacing() * 6 + 12)
+        for modelo in parent.modelos_disponiveis:
+            item = QListWidgetItem(modelo)
+            item.setFlags(item.flags() | Qt.ItemIsUserCheckable)
+            item.setCheckState(Qt.Checked if modelo == parent.modelo_selecionado() else Qt.Unchecked)
+            self.lista_modelos.addItem(item)
+        layout_entrada.addWidget(self.lista_modelos)
+
+        self.entrada_prompt = QPlainTextEdit()
+        self.entrada_prompt.setPlaceholderText("Prompt enviado a todos os modelos marcados")
+        self.entrada_prompt.setPlainText(parent.entrada_usuario.toPlainText().strip())
+        layout_entrada.addWidget(self.entrada_prompt, 1)
+
+        frame_botoes = QWidget()
+        layout_botoes = QVBoxLayout(frame_botoes)
+        layout_botoes.setContentsMargins(0, 0, 0, 0)
+        self.botao_comparar = QPushButton("Comparar")
+        self.botao_comparar.clicked.connect(self.comparar)
+        layout_botoes.addWidget(self.botao_comparar)
+        self.botao_parar = QPushButton("Parar")
+        self.botao_parar.setEnabled(False)
+        self.botao_parar.clicked.connect(self.parar)
+        layout_botoes.addWidget(self.botao_parar)
+        self.sequencial = QCheckBox("Um modelo por vez")
+        self.sequencial.setToolTip("Evita carregar todos os modelos na VRAM ao mesmo tempo")
+        layout_botoes.addWidget(self.sequencial)
+        layout_botoes.addStretch(1)
+        layout_entrada.addWidget(frame_botoes)
+        layout.addWidget(frame_entrada)
+
+        self.divisor_colunas = QSplitter(Qt.Horizontal)
+        layout.addWidget(self.divisor_colunas, 1)
+        self.rotulo_resumo = QLabel()
+        layout.addWidget(self.rotulo_resumo)
+
+        self.estado_coluna.connect(self.atualizar_estado_coluna)
+        self.coluna_encerrada.connect(self.encerrar_coluna)
+        self.coluna_concluida.connect(self.concluir_coluna)
+
+    def modelos_marcados(self) -> List[str]:
+        return [self.lista_modelos.item(linha).text() for linha in range(self.lista_modelos.count())
+                if self.lista_modelos.item(linha).checkState() == Qt.Checked]
+
+    def comparar(self):
+        prompt = self.entrada_prompt.toPlainText().strip()
+        modelos = self.modelos_marcados()
+        if not prompt or not modelos:
+            QMessageBox.warning(self, "Comparar Modelos", "Escreva um prompt e marque ao menos um modelo.")
+            return
+        self.parar()
+        for coluna in self.colunas:
+            coluna.setParent(None)
+            coluna.deleteLater()
+        self.colunas = [ColunaComparacao(modelo, self.parent.fonte_padrao) for modelo in modelos]
+        for coluna in self.colunas:
+            self.divisor_colunas.addWidget(coluna)
+        self.rotulo_resumo.clear()
+        self.botao_parar.setEnabled(True)
+
+        self.parent.atualizar_host()
+        mensagens = [Mensagem("user", prompt, "usuario").para_api()]
+        if self.parent.prompt_sistema is not None:
+            mensagens.insert(0, self.parent.prompt_sistema.para_api())
+        colunas = list(self.colunas)
+        if self.sequencial.isChecked():
+            Thread(target=self.gerar_em_sequencia, args=(colunas, mensagens), daemon=True).start()
+        else:
+            for coluna in colunas:
+                Thread(target=self.gerar, args=(coluna, mensagens), daemon=True).start()
+
+    # Roda no thread da geração de uma coluna
+    def gerar(self, coluna: ColunaComparacao, mensagens: List[dict]):
+        interface = self.parent
+        geracao = coluna.geracao
+        api_url = interface.pool.escolher(coluna.modelo)
+        if not interface.agendador.adquirir(api_url, geracao,
+                                            lambda _: self.estado_coluna.emit(coluna, "Aguardando vaga no host")):
+            self.coluna_encerrada.emit(coluna, "Cancelado")
+            return
+        interface.pool.registrar_uso(api_url, coluna.modelo)
+        if len(interface.pool.urls()) > 1:
+            self.estado_coluna.emit(coluna, f"Gerando em {AgendadorGeracoes.host(api_url)}")
+        else:
+            self.estado_coluna.emit(coluna, "Gerando")
+        try:
+            for parte in transmitir_chat(interface.cliente_http, api_url, coluna.modelo, mensagens,
+                                         geracao, keep_alive=interface.keep_alive(coluna.modelo),
+                                         opcoes=interface.opcoes_geracao or None):
+                coluna.buffer.adicionar(parte, "modelo", geracao.id)
+        except (ErroConexaoError, ErroServidorError) as e:
+            self.coluna_encerrada.emit(coluna, "Cancelado" if geracao.cancelada else f"Erro: {str(e)}")
+            return
+        finally:
+            interface.agendador.liberar(api_url)
+        if geracao.cancelada:
+            self.coluna_encerrada.emit(coluna, "Cancelado")
+            return
+        coluna.buffer.adicionar(coluna.resposta, "concluida", geracao.id)
+        self.coluna_concluida.emit(coluna, dict(geracao.metricas))
+
+    def gerar_em_sequencia(self, colunas: List[ColunaComparacao], mensagens: List[dict]):
+        for coluna in colunas:
+            self.gerar(coluna, mensagens)
+
+    def parar(self):
+        for coluna in self.colunas:
+            coluna.cancelar(self.parent.agendador)
+        self.botao_parar.setEnabled(False)
+
+    @Slot(object, str)
+    def atualizar_estado_coluna(self, coluna: ColunaComparacao, texto: str):
+        if coluna in self.colunas:
+            coluna.rotulo_estado.setText(texto)
+
+    # Parar fica ativo enquanto alguma coluna não terminou, de um jeito ou de outro
+    def verificar_fim(self):
+        if all(c.encerrada for c in self.colunas):
+            self.botao_parar.setEnabled(False)
+
+    @Slot(object, str)
+    def encerrar_coluna(self, coluna: ColunaComparacao, texto: str):
+        if coluna not in self.colunas:
+            return
+        coluna.rotulo_estado.setText(texto)
+        coluna.encerrada = True
+        self.verificar_fim()
+
+    @Slot(object, dict)
+    def concluir_coluna(self, coluna: ColunaComparacao, metricas: dict):
+        if coluna not in self.colunas:
+            return
+        coluna.rotulo_estado.setText("Concluído")
+        coluna.encerrada = True
+        coluna.mostrar_metricas(metricas)
+        self.parent.metricas.registrar(coluna.modelo, metricas)
+        self.verificar_fim()
+
+        concluidas = [c for c in self.colunas if c.metricas is not None]
+        if len(concluidas) > 1:
+            resumo = []
+            for campo, nome, escolher in (("tokens_s", "mais tok/s", max), ("ttft", "menor 1º token", min),
+                                          ("total_duration", "menor tempo total", min)):
+                candidatas = [c for c in concluidas if c.metricas.get(campo) is not None]
+                if candidatas:
+                    melhor = escolher(candidatas, key=lambda c: c.metricas[campo])
+                    resumo.append(f"{nome}: {melhor.modelo}")
+            self.rotulo_resumo.setText(" · ".join(resumo))
+
+    def closeEvent(self, event):
+        self.parar()
+        super().closeEvent(event)
+
+
+# O simulador e os benchmarks (simulador_ollama.py e benchmarks.py) só são
+# importados quando pedidos na linha de comando
 def main():
-    app = QApplication(sys.argv)
+    tempo_importacao = time.perf_counter() - _T_INICIO
+    parser = argparse.ArgumentParser(description="Ollama GUI")
+    parser.add_argument("--host", default="http://127.0.0.1:11434",
+                        help="servidor Ollama usado pelos benchmarks")
+    parser.add_argument("--bench-conexao", action="store_true",
+                        help="mede o tempo de conexão economizado pelo pool keep-alive")
+    parser.add_argument("--repeticoes", type=int, default=20,
+                        help="número de requisições por cenário do benchmark")
+    parser.add_argument("--bench", action="store_true",
+                        help="executa o benchmark de chat sem abrir a interface")
+    parser.add_argument("--modelos", default="",
+                        help="modelos do benchmark, separados por vírgula (padrão: todos do host)")
+    parser.add_argument("--prompt", action="append", default=[],
+                        help="prompt do benchmark (pode ser repetido)")
+    parser.add_argument("--prompts", help="arquivo com um prompt por linha")
+    parser.add_argument("--iteracoes", type=int, default=3,
+                        help="vezes que cada prompt é enviado por modelo")
+    parser.add_argument("--concorrencia", type=int, default=1,
+                        help="requisições simultâneas por modelo")
+    parser.add_argument("--aquecimento", type=int, default=1,
+                        help="requisições descartadas antes de medir cada modelo")
+    parser.add_argument("--json", dest="arquivo_json",
+                        help="grava o relatório em JSON ('-' para a saída padrão)")
+    parser.add_argument("--simulador", action="store_true",
+                        help="inicia um servidor local que imita a API do Ollama")
+    parser.add_argument("--porta", type=int, default=11435, help="porta do simulador")
+    parser.add_argument("--tokens-por-segundo", type=float, default=50.0,
+                        help="ritmo de geração do simulador")
+    parser.add_argument("--tokens-por-trecho", type=int, default=1,
+                        help="tokens em cada registro NDJSON do simulador")
+    parser.add_argument("--tokens-resposta", type=int, default=64,
+                        help="tamanho das respostas do simulador")
+    parser.add_argument("--latencia", type=float, default=0.0,
+                        help="atraso (s) antes de cada resposta do simulador")
+    parser.add_argument("--taxa-erro", type=float, default=0.0,
+                        help="fração de requisições do simulador que falham com 500")
+    parser.add_argument("--desconectar-apos", type=int,
+                        help="o simulador corta a conexão após N registros do stream")
+    parser.add_argument("--bench-render", action="store_true",
+                        help="benchmark de renderização do chat na plataforma offscreen do Qt")
+    parser.add_argument("--cenarios", default="tokens,codigo,turnos",
+                        help="cenários do benchmark de renderização")
+    parser.add_argument("--escala", type=float, default=1.0,
+                        help="multiplica o tamanho dos cenários de renderização")
+    parser.add_argument("--linha-base", help="relatório JSON anterior para detectar regressões")
+    parser.add_argument("--tolerancia", type=float, default=0.25,
+                        help="piora relativa aceita em relação à linha de base")
+    parser.add_argument("--bench-ndjson", action="store_true",
+                        help="mede a vazão de decodificação de streams NDJSON")
+    parser.add_argument("--stream-gravado", help="arquivo NDJSON gravado para o --bench-ndjson "
+                                                 "(padrão: stream de chat sintético)")
+    parser.add_argument("--registros-por-trecho", type=int, default=1,
+                        help="registros por trecho HTTP no --bench-ndjson (1 = chat, mais = pull)")
+    parser.add_argument("--tempo-inicio", action="store_true",
+                        help="mede o tempo até a janela aparecer e até ficar interativa e encerra")
+    args, argv_qt = parser.parse_known_args()
+
+    if args.bench_ndjson:
+        from benchmarks import benchmark_ndjson, gerar_stream_chat
+        if args.stream_gravado:
+            with open(args.stream_gravado, "rb") as arquivo:
+                dados = arquivo.read()
+        else:
+            dados = gerar_stream_chat()
+        relatorio = benchmark_ndjson(dados, registros_por_trecho=max(1, args.registros_por_trecho))
+        print(f"{relatorio['registros']} registros, {relatorio['bytes'] / 1e6:.1f} MB, "
+              f"{relatorio['registros_por_trecho']} por trecho")
+        for nome, r in relatorio["metodos"].items():
+            print(f"{nome:<22} {r['mb_s']:8.1f} MB/s {r['registros_s']:12.0f} registros/s")
+        if args.arquivo_json:
+            with open(args.arquivo_json, "w", encoding="utf-8") as arquivo:
+                json.dump(relatorio, arquivo, indent=2)
+        sys.exit(0)
+
+    if args.bench_render:
+        from benchmarks import main_benchmark_render
+        sys.exit(main_benchmark_render(args))
+
+    if args.simulador:
+        from simulador_ollama import ServidorOllamaSimulado
+        servidor = ServidorOllamaSimulado(
+            ("127.0.0.1", args.porta), tokens_por_segundo=args.tokens_por_segundo,
+            tokens_por_trecho=args.tokens_por_trecho, tokens_resposta=args.tokens_resposta,
+            latencia=args.latencia, taxa_erro=args.taxa_erro,
+            desconectar_apos=args.desconectar_apos, verboso=True
+        )
+        print(f"Simulador do Ollama em {servidor.url} (Ctrl+C para sair)")
+        try:
+            servidor.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            servidor.server_close()
+        sys.exit(0)
+
+    if args.bench_conexao:
+        from benchmarks import benchmark_conexao
+        sys.exit(benchmark_conexao(args.host, args.repeticoes))
+    if args.bench:
+        from benchmarks import main_benchmark
+        sys.exit(main_benchmark(args))
+
+    app = QApplication(sys.argv[:1] + argv_qt)
     app.setStyle(QStyleFactory.create("Fusion"))
     
     # Configurar paleta de cores - tema escuro
@@ -905,6 +5352,9 @@ def main():
     app.setPalette(palette)
     
     window = InterfaceOllama()
+    window.tempos_inicio["importacao"] = tempo_importacao
+    window.tempos_inicio["construcao"] = time.perf_counter() - _T_INICIO
+    window.relatar_tempo_inicio = args.tempo_inicio
     window.show()
     sys.exit(app.exec())
 
@@ -0,0 +1,312 @@
+# Servidor local que imita a API do Ollama (python ollama_gui.py --simulador),
+# usado pelos testes e pelos benchmarks. Só depende da biblioteca padrão
+import hashlib
+import http.server
+import json
+import random
+import socket
+import time
+from threading import Thread, Lock
+from typing import Optional, List
+
+# Servidor local que imita a API do Ollama, para testar o cliente sem GPU nem
+# modelos reais. Ritmo dos tokens, latência, erros e desconexões são configuráveis
+class ManipuladorOllamaSimulado(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    PALAVRAS = ("o", "modelo", "responde", "com", "texto", "simulado", "para", "medir", "a",
+                "interface", "sem", "depender", "de", "uma", "GPU", "real", "e", "dados", "fixos.")
+
+    def log_message(self, formato, *args):
+        if self.server.verboso:
+            super().log_message(formato, *args)
+
+    def _ler_json(self) -> dict:
+        tamanho = int(self.headers.get("Content-Length") or 0)
+        corpo = self.rfile.read(tamanho) if tamanho else b""
+        return json.loads(corpo) if corpo else {}
+
+    def _responder_json(self, dados: dict, status: int = 200):
+        corpo = json.dumps(dados).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(corpo)))
+        self.end_headers()
+        self.wfile.write(corpo)
+
+    def _iniciar_stream(self):
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _enviar_registro(self, dados: dict):
+        linha = json.dumps(dados).encode("utf-8") + b"\n"
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(linha), linha))
+        self.wfile.flush()
+
+    def _finalizar_stream(self):
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _desconectar(self):
+        self.close_connection = True
+        try:
+            self.connection.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+
+    # Latência e erros injetados valem para todos os endpoints
+    def _preambulo(self) -> bool:
+        if self.server.latencia:
+            time.sleep(self.server.latencia)
+        if self.server.taxa_erro and self.server.sorteio() < self.server.taxa_erro:
+            self._responder_json({"error": "erro simulado"}, 500)
+            return False
+        return True
+
+    def do_GET(self):
+        if not self._preambulo():
+            return
+        if self.path == "/api/tags":
+            self._responder_json({"models": self.server.listar_modelos()})
+        elif self.path == "/api/ps":
+            self._responder_json({"models": self.server.listar_carregados()})
+        else:
+            self._responder_json({"error": "não encontrado"}, 404)
+
+    def do_DELETE(self):
+        if not self._preambulo():
+            return
+        dados = self._ler_json()
+        if self.path == "/api/delete" and self.server.excluir(dados.get("name") or dados.get("model")):
+            self._responder_json({})
+        else:
+            self._responder_json({"error": "modelo não encontrado"}, 404)
+
+    def do_POST(self):
+        dados = self._ler_json()
+        if not self._preambulo():
+            return
+        rotas = {
+            "/api/chat": self._chat,
+            "/api/generate": self._chat,
+            "/api/pull": self._pull,
+            "/api/show": self._show,
+        }
+        rota = rotas.get(self.path)
+        if rota is None:
+            self._responder_json({"error": "não encontrado"}, 404)
+            return
+        try:
+            rota(dados)
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.registrar("desconexoes_cliente")
+
+    def _chat(self, dados: dict):
+        modelo = dados.get("model", "")
+        if not self.server.existe(modelo):
+            self._responder_json({"error": f"model '{modelo}' not found"}, 404)
+            return
+        carga = self.server.carregar(modelo, dados.get("keep_alive"))
+        mensagens = dados.get("messages") or []
+        prompt = dados.get("prompt")
+        if not mensagens and not prompt:
+            # Só carregar/descarregar o modelo, como o Ollama faz
+            self._responder_json({"model": modelo, "done": True, "load_duration": int(carga * 1e9)})
+            return
+
+        srv = self.server
+        total_tokens = int((dados.get("options") or {}).get("num_predict") or srv.tokens_resposta)
+        prompt_tokens = sum(len(str(m.get("content", "")).split()) for m in mensagens) or len(str(prompt).split())
+        stream = dados.get("stream", True)
+        inicio = time.perf_counter()
+
+        def registro(conteudo: str, final: bool = False) -> dict:
+            base = {"model": modelo, "created_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+                    "done": final}
+            if self.path == "/api/chat":
+                base["message"] = {"role": "assistant", "content": conteudo}
+            else:
+                base["response"] = conteudo
+            return base
+
+        def estatisticas() -> dict:
+            duracao = time.perf_counter() - inicio
+            return {
+                "done_reason": "stop",
+                "total_duration": int((duracao + carga) * 1e9),
+                "load_duration": int(carga * 1e9),
+                "prompt_eval_count": prompt_tokens,
+                "prompt_eval_duration": int(prompt_tokens / (srv.tokens_por_segundo * 10) * 1e9),
+                "eval_count": total_tokens,
+                "eval_duration": int(max(duracao, 1e-6) * 1e9),
+            }
+
+        palavras = [self.PALAVRAS[i % len(self.PALAVRAS)] + " " for i in range(total_tokens)]
+        if not stream:
+            time.sleep(total_tokens / srv.tokens_por_segundo)
+            final = registro("".join(palavras), True)
+            final.update(estatisticas())
+            self._responder_json(final)
+            return
+
+        self._iniciar_stream()
+        por_trecho = max(1, srv.tokens_por_trecho)
+        for numero, i in enumerate(range(0, total_tokens, por_trecho)):
+            if srv.desconectar_apos is not None and numero >= srv.desconectar_apos:
+                srv.registrar("desconexoes_simuladas")
+                self._desconectar()
+                return
+            # Ritmo calculado a partir do início, sem acumular atraso
+            alvo = inicio + (i + por_trecho) / srv.tokens_por_segundo
+            espera = alvo - time.perf_counter()
+            if espera > 0:
+                time.sleep(espera)
+            self._enviar_registro(registro("".join(palavras[i:i + por_trecho])))
+        final = registro("", True)
+        final.update(estatisticas())
+        self._enviar_registro(final)
+        self._finalizar_stream()
+        srv.registrar("respostas_completas")
+
+    def _pull(self, dados: dict):
+        modelo = dados.get("name") or dados.get("model") or ""
+        srv = self.server
+        self._iniciar_stream()
+        self._enviar_registro({"status": "pulling manifest"})
+        if modelo.startswith("inexistente"):
+            self._enviar_registro({"error": "pull model manifest: file does not exist"})
+            self._finalizar_stream()
+            return
+        camadas = [(f"sha256:{i:064x}", tamanho) for i, tamanho in enumerate(srv.camadas_pull, 1)]
+        enviados = 0
+        for digest, tamanho in camadas:
+            concluido = 0
+            passo = max(1, tamanho // srv.passos_pull)
+            while concluido < tamanho:
+                if srv.desconectar_apos is not None and enviados >= srv.desconectar_apos:
+                    srv.registrar("desconexoes_simuladas")
+                    self._desconectar()
+                    return
+                enviados += 1
+                concluido = min(tamanho, concluido + passo)
+                self._enviar_registro({"status": f"pulling {digest[7:19]}", "digest": digest,
+                                       "total": tamanho, "completed": concluido})
+                time.sleep(srv.intervalo_pull)
+        for status in ("verifying sha256 digest", "writing manifest", "success"):
+            self._enviar_registro({"status": status})
+        self._finalizar_stream()
+        srv.adicionar(modelo)
+
+    def _show(self, dados: dict):
+        modelo = dados.get("name") or dados.get("model") or ""
+        if not self.server.existe(modelo):
+            self._responder_json({"error": f"model '{modelo}' not found"}, 404)
+            return
+        self._responder_json({
+            "modelfile": f"FROM {modelo}",
+            "parameters": "temperature 0.8",
+            "details": {"format": "gguf", "family": "llama", "parameter_size": "7B",
+                        "quantization_level": "Q4_K_M"},
+            "model_info": {"general.architecture": "llama", "llama.context_length": 8192},
+        })
+
+
+class ServidorOllamaSimulado(http.server.ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, endereco=("127.0.0.1", 11435), modelos=("simulado:7b", "simulado:1b"),
+                 tokens_por_segundo: float = 50.0, tokens_por_trecho: int = 1, tokens_resposta: int = 64,
+                 latencia: float = 0.0, taxa_erro: float = 0.0, desconectar_apos: Optional[int] = None,
+                 tempo_carga: float = 0.5, semente: int = 0, verboso: bool = False):
+        super().__init__(endereco, ManipuladorOllamaSimulado)
+        self.tokens_por_segundo = max(0.001, tokens_por_segundo)
+        self.tokens_por_trecho = tokens_por_trecho
+        self.tokens_resposta = tokens_resposta
+        self.latencia = latencia
+        self.taxa_erro = taxa_erro
+        self.desconectar_apos = desconectar_apos
+        self.tempo_carga = tempo_carga
+        self.verboso = verboso
+        self.camadas_pull = (400_000_000, 12_000, 480)
+        self.passos_pull = 50
+        self.intervalo_pull = 0.01
+        self.contadores = {}
+        self._aleatorio = random.Random(semente)
+        self._modelos = {nome: 4_000_000_000 for nome in modelos}
+        self._carregados = {}  # modelo -> instante de expiração
+        self._trava = Lock()
+
+    @property
+    def url(self) -> str:
+        host, porta = self.server_address[:2]
+        return f"http://{host}:{porta}"
+
+    def sorteio(self) -> float:
+        with self._trava:
+            return self._aleatorio.random()
+
+    def registrar(self, contador: str):
+        with self._trava:
+            self.contadores[contador] = self.contadores.get(contador, 0) + 1
+
+    def existe(self, modelo: str) -> bool:
+        with self._trava:
+            return modelo in self._modelos
+
+    def adicionar(self, modelo: str):
+        with self._trava:
+            self._modelos.setdefault(modelo, 4_000_000_000)
+
+    def excluir(self, modelo: str) -> bool:
+        with self._trava:
+            self._carregados.pop(modelo, None)
+            return self._modelos.pop(modelo, None) is not None
+
+    # Retorna o tempo de carga simulado (zero se o modelo já estava carregado)
+    def carregar(self, modelo: str, keep_alive) -> float:
+        segundos = 300.0
+        if isinstance(keep_alive, (int, float)):
+            segundos = float(keep_alive)
+        elif isinstance(keep_alive, str) and keep_alive.endswith(("s", "m", "h")) and keep_alive[:-1].isdigit():
+            segundos = int(keep_alive[:-1]) * {"s": 1, "m": 60, "h": 3600}[keep_alive[-1]]
+        agora = time.time()
+        with self._trava:
+            carregado = self._carregados.get(modelo, 0) > agora
+            if segundos == 0:
+                self._carregados.pop(modelo, None)
+            else:
+                self._carregados[modelo] = agora + (segundos if segundos > 0 else 10 ** 9)
+        if carregado or segundos == 0:
+            return 0.0
+        time.sleep(self.tempo_carga)
+        return self.tempo_carga
+
+    def listar_modelos(self) -> List[dict]:
+        with self._trava:
+            modelos = dict(self._modelos)
+        return [{
+            "name": nome, "model": nome, "size": tamanho,
+            "digest": hashlib.sha256(nome.encode("utf-8")).hexdigest(),
+            "details": {"family": "llama", "parameter_size": "7B", "quantization_level": "Q4_K_M"},
+        } for nome, tamanho in modelos.items()]
+
+    def listar_carregados(self) -> List[dict]:
+        agora = time.time()
+        with self._trava:
+            carregados = {m: e for m, e in self._carregados.items() if e > agora}
+            self._carregados = carregados
+            modelos = dict(self._modelos)
+        return [{
+            "name": nome, "model": nome, "size": modelos.get(nome, 0),
+            "size_vram": modelos.get(nome, 0) // 2,
+            "expires_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime(min(expira, 4102444800))),
+        } for nome, expira in carregados.items()]
+
+
+def iniciar_simulador(porta: int = 0, **opcoes) -> ServidorOllamaSimulado:
+    servidor = ServidorOllamaSimulado(("127.0.0.1", porta), **opcoes)
+    Thread(target=servidor.serve_forever, daemon=True).start()
+    return servidor
@@ -0,0 +1,795 @@
+# Testes do cliente de chat contra o servidor simulado (simulador_ollama na
+# porta 0) e das peças que não dependem da interface: DecodificadorNDJSON,
+# percentil, CacheRespostas e AgendadorGeracoes. Rodar com: python -m pytest -q
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import urllib.error
+
+import pytest
+
+import ollama_gui as g
+from benchmarks import percentil
+from simulador_ollama import iniciar_simulador
+
+MODELO = "simulado:1b"
+MENSAGENS = [{"role": "user", "content": "olá"}]
+
+
+@pytest.fixture
+def simulador(request):
+    servidores = []
+
+    def iniciar(**opcoes):
+        opcoes.setdefault("modelos", (MODELO,))
+        opcoes.setdefault("tempo_carga", 0.0)
+        servidor = iniciar_simulador(0, **opcoes)
+        servidores.append(servidor)
+        return servidor
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.shutdown()
+        servidor.server_close()
+
+
+def conversar(servidor, geracao, cliente=None):
+    cliente = cliente or g.ClienteHTTP()
+    geracao.modelo = MODELO
+    return list(g.transmitir_chat(cliente, servidor.url, MODELO, MENSAGENS, geracao))
+
+
+# transmitir_chat
+
+def test_chat_completo(simulador):
+    servidor = simulador(tokens_por_segundo=1000, tokens_resposta=12)
+    geracao = g.Geracao()
+    partes = conversar(servidor, geracao)
+
+    assert len(partes) == 12
+    assert "".join(partes).strip()
+    assert geracao.metricas["eval_count"] == 12
+    for campo in ("ttfb", "ttft", "total_duration", "eval_duration"):
+        assert campo in geracao.metricas
+
+
+def test_cancelar_durante_carga(simulador):
+    servidor = simulador(tempo_carga=3.0)
+    geracao = g.Geracao()
+    threading.Timer(0.2, geracao.cancelar).start()
+
+    inicio = time.perf_counter()
+    partes = conversar(servidor, geracao)
+
+    # Parar derruba a conexão ainda sem os cabeçalhos, sem esperar a carga
+    assert partes == []
+    assert time.perf_counter() - inicio < 1.5
+
+
+def test_cancelar_no_meio_do_stream(simulador):
+    servidor = simulador(tokens_por_segundo=20, tokens_resposta=200)
+    cliente = g.ClienteHTTP()
+    geracao = g.Geracao()
+    threading.Timer(0.3, geracao.cancelar).start()
+
+    inicio = time.perf_counter()
+    partes = conversar(servidor, geracao, cliente)
+
+    assert 0 < len(partes) < 200
+    assert time.perf_counter() - inicio < 2.0
+    # A conexão derrubada não volta ao pool: a próxima conversa funciona
+    assert len(conversar(simulador(tokens_por_segundo=1000, tokens_resposta=3), g.Geracao(), cliente)) == 3
+
+
+def test_desconexao_no_meio_do_stream(simulador):
+    servidor = simulador(tokens_por_segundo=1000, tokens_resposta=20, desconectar_apos=3)
+    geracao = g.Geracao()
+    geracao.modelo = MODELO
+    partes = []
+
+    with pytest.raises(g.ErroConexaoError) as erro:
+        for parte in g.transmitir_chat(g.ClienteHTTP(), servidor.url, MODELO, MENSAGENS, geracao):
+            partes.append(parte)
+
+    # Falha de transporte: a que autoriza repetir em outro host
+    assert isinstance(erro.value, g.ErroTransporteError)
+    assert len(partes) == 3
+    assert servidor.contadores.get("desconexoes_simuladas") == 1
+
+
+def test_modelo_inexistente_nao_e_falha_de_transporte(simulador):
+    servidor = simulador()
+    geracao = g.Geracao()
+
+    with pytest.raises(g.ErroConexaoError) as erro:
+        list(g.transmitir_chat(g.ClienteHTTP(), servidor.url, "nao:existe", MENSAGENS, geracao))
+
+    assert not isinstance(erro.value, g.ErroTransporteError)
+
+
+# ClienteHTTP: repetição em conexão reaproveitada
+
+class ServidorRoteirizado:
+    RESPOSTA = b"HTTP/1.1 200 OK\r\nContent-Type: application/json\r\nContent-Length: 2\r\n\r\n{}"
+
+    # roteiro(n) decide o que fazer com a n-ésima requisição (1, 2...) de cada
+    # conexão: "responder", "fechar" sem responder ou "responder_e_fechar"
+    def __init__(self, roteiro):
+        self.roteiro = roteiro
+        self.requisicoes = []  # (conexão, método)
+        self.conexoes = 0
+        self._socket = socket.create_server(("127.0.0.1", 0))
+        self.url = "http://127.0.0.1:%d" % self._socket.getsockname()[1]
+        threading.Thread(target=self._aceitar, daemon=True).start()
+
+    def _aceitar(self):
+        while True:
+            try:
+                conexao, _ = self._socket.accept()
+            except OSError:
+                return
+            self.conexoes += 1
+            threading.Thread(target=self._atender, args=(conexao, self.conexoes), daemon=True).start()
+
+    def _atender(self, conexao, numero):
+        arquivo = conexao.makefile("rb")
+        with conexao, arquivo:
+            for n in itertools.count(1):
+                linha = arquivo.readline()
+                if not linha:
+                    return
+                tamanho = 0
+                while True:
+                    cabecalho = arquivo.readline()
+                    if cabecalho in (b"\r\n", b""):
+                        break
+                    nome, _, valor = cabecalho.partition(b":")
+                    if nome.lower() == b"content-length":
+                        tamanho = int(valor)
+                arquivo.read(tamanho)
+                self.requisicoes.append((numero, linha.split()[0].decode()))
+                acao = self.roteiro(n)
+                if acao != "fechar":
+                    conexao.sendall(self.RESPOSTA)
+                if acao != "responder":
+                    return
+
+    def fechar(self):
+        self._socket.close()
+
+
+@pytest.fixture
+def roteirizado():
+    servidores = []
+
+    def iniciar(roteiro):
+        servidores.append(ServidorRoteirizado(roteiro))
+        return servidores[-1]
+
+    yield iniciar
+    for servidor in servidores:
+        servidor.fechar()
+
+
+def ler(cliente, url, **opcoes):
+    with cliente.requisitar(url, **opcoes) as resposta:
+        return resposta.read()
+
+
+def test_post_nao_e_repetido_depois_de_enviado(roteirizado):
+    servidor = roteirizado(lambda n: "responder" if n == 1 else "fechar")
+    cliente = g.ClienteHTTP()
+    assert ler(cliente, servidor.url + "/api/tags") == b"{}"
+
+    # O servidor recebeu o POST e caiu: repetir poderia gerar duas vezes
+    with pytest.raises(urllib.error.URLError):
+        ler(cliente, servidor.url + "/api/chat", dados=b"{}")
+
+    assert servidor.requisicoes == [(1, "GET"), (1, "POST")]
+
+
+def test_get_e_repetido_em_conexao_nova(roteirizado):
+    servidor = roteirizado(lambda n: "responder" if n == 1 else "fechar")
+    cliente = g.ClienteHTTP()
+    assert ler(cliente, servidor.url + "/api/tags") == b"{}"
+
+    assert ler(cliente, servidor.url + "/api/tags") == b"{}"
+    assert servidor.requisicoes == [(1, "GET"), (1, "GET"), (2, "GET")]
+
+
+def test_conexao_ociosa_fechada_pelo_servidor_nao_e_usada(roteirizado):
+    servidor = roteirizado(lambda n: "responder_e_fechar")
+    cliente = g.ClienteHTTP()
+    assert ler(cliente, servidor.url + "/api/tags") == b"{}"
+    time.sleep(0.1)  # O fim da conexão chega ao cliente
+
+    assert ler(cliente, servidor.url + "/api/chat", dados=b"{}") == b"{}"
+    assert servidor.requisicoes == [(1, "GET"), (2, "POST")]
+
+
+# DecodificadorNDJSON
+
+class FonteEmPedacos:
+    def __init__(self, pedacos):
+        self.pedacos = list(pedacos)
+
+    def read1(self, tamanho):
+        return self.pedacos.pop(0) if self.pedacos else b""
+
+
+def dividir(dados: bytes, tamanho: int):
+    return [dados[i:i + tamanho] for i in range(0, len(dados), tamanho)]
+
+
+REGISTROS = [
+    {"message": {"content": "ação "}, "done": False},
+    {"message": {"content": "😀 emoji"}, "done": False},
+    {"message": {"content": ""}, "done": True, "eval_count": 2, "eval_duration": 1000},
+]
+
+
+@pytest.mark.parametrize("usar_orjson", [True, False])
+@pytest.mark.parametrize("tamanho", [1, 2, 3, 7, 64 * 1024])
+def test_decodificador_registros_divididos(usar_orjson, tamanho):
+    dados = b"".join(json.dumps(r, ensure_ascii=False).encode("utf-8") + b"\n" for r in REGISTROS)
+    fonte = FonteEmPedacos(dividir(dados, tamanho))
+
+    registros = list(g.DecodificadorNDJSON(fonte, usar_orjson=usar_orjson).registros())
+
+    assert registros == REGISTROS
+
+
+def test_decodificador_ultima_linha_sem_quebra_e_linhas_vazias():
+    dados = b'\n{"a": 1}\n\n  \n{"b": "\xc3\xa9"}'
+    fonte = FonteEmPedacos(dividir(dados, 5))
+
+    assert list(g.DecodificadorNDJSON(fonte).registros()) == [{"a": 1}, {"b": "é"}]
+
+
+def test_decodificador_eventos():
+    linhas = [
+        {"message": {"content": "oi"}, "done": False},
+        {"status": "pulling", "digest": "sha256:1", "total": 10, "completed": 5},
+        {"error": "falhou"},
+        {"message": {"content": ""}, "done": True, "eval_count": 1, "outro": 2},
+    ]
+    dados = b"".join(json.dumps(r).encode("utf-8") + b"\n" for r in linhas)
+
+    eventos = list(g.DecodificadorNDJSON(FonteEmPedacos([dados])).eventos())
+
+    assert [type(e) for e in eventos] == [g.EventoConteudo, g.EventoStatus, g.EventoErro, g.EventoConcluido]
+    assert eventos[0].texto == "oi"
+    assert (eventos[1].total, eventos[1].completed) == (10, 5)
+    assert eventos[2].mensagem == "falhou"
+    assert eventos[3].estatisticas == {"eval_count": 1}
+
+
+# percentil
+
+def test_percentil():
+    assert percentil([], 50) is None
+    assert percentil([7.0], 99) == 7.0
+    assert percentil([4, 1, 3, 2], 0) == 1
+    assert percentil([4, 1, 3, 2], 100) == 4
+    assert percentil([1, 2, 3, 4], 50) == pytest.approx(2.5)
+    assert percentil(list(range(101)), 95) == pytest.approx(95)
+
+
+# CacheRespostas
+
+def test_cache_chave():
+    chave = g.CacheRespostas.chave("digest", MENSAGENS, {"seed": 1, "temperature": 0})
+
+    assert chave == g.CacheRespostas.chave("digest", MENSAGENS, {"temperature": 0, "seed": 1})
+    assert chave != g.CacheRespostas.chave("outro", MENSAGENS, {"seed": 1, "temperature": 0})
+    assert chave != g.CacheRespostas.chave("digest", MENSAGENS, {"seed": 2, "temperature": 0})
+    assert chave != g.CacheRespostas.chave("digest", [{"role": "user", "content": "oi"}],
+                                          {"seed": 1, "temperature": 0})
+    assert g.CacheRespostas.chave("digest", MENSAGENS, None) == g.CacheRespostas.chave("digest", MENSAGENS, {})
+
+
+def test_cache_deterministica():
+    assert g.CacheRespostas.deterministica({"seed": 3})
+    assert g.CacheRespostas.deterministica({"temperature": 0})
+    assert not g.CacheRespostas.deterministica({"temperature": 0.7})
+    assert not g.CacheRespostas.deterministica(None)
+
+
+def test_cache_lru_em_memoria():
+    cache = g.CacheRespostas(None, max_memoria=2)
+    metricas = {"total_duration": 2_000_000_000, "ttft": 0.1}
+    cache.guardar("a", "A", metricas)
+    cache.guardar("b", "B", metricas)
+    assert cache.obter("a") == ("A", {"total_duration": 2_000_000_000})  # "a" passa a ser a mais recente
+
+    cache.guardar("c", "C", metricas)
+
+    assert cache.obter("b") is None
+    assert cache.obter("a")[0] == "A"
+    assert cache.obter("c")[0] == "C"
+    assert (cache.acertos, cache.faltas) == (3, 1)
+    assert cache.segundos_poupados == pytest.approx(6.0)
+
+
+def test_cache_em_disco(tmp_path):
+    caminho = str(tmp_path / "respostas.db")
+    cache = g.CacheRespostas(caminho, max_memoria=1, max_bytes=10)
+    cache.guardar("a", "12345", {})
+    cache.guardar("b", "67890", {})
+    assert cache.obter("a") == ("12345", {})  # Saiu da memória, veio do disco
+
+    cache.guardar("c", "abcde", {})  # Passa de 10 bytes: sai a usada há mais tempo ("b")
+
+    outro = g.CacheRespostas(caminho)
+    assert outro.obter("b") is None
+    assert outro.obter("a")[0] == "12345"
+    assert outro.obter("c")[0] == "abcde"
+
+
+# Identidade das mensagens no arquivo e no banco
+
+@pytest.fixture
+def armazem(tmp_path):
+    armazem = g.ArmazemConversas(str(tmp_path / "conversas.db"))
+    armazem.abrir()
+    yield armazem
+    armazem.fechar()
+
+
+def test_arquivo_mensagens_mantem_id():
+    arquivo = g.ArquivoMensagens()
+    mensagens = [g.Mensagem("user", "pergunta", "usuario"), g.Mensagem("assistant", "resposta", "modelo")]
+    arquivo.acrescentar(mensagens)
+
+    relidas = arquivo.ler(0, 2)
+    arquivo.fechar()
+
+    assert [m.id for m in relidas] == [m.id for m in mensagens]
+    assert [m.conteudo for m in relidas] == ["pergunta", "resposta"]
+    assert not relidas[1].aberta
+
+
+def test_armazem_mantem_id_ao_reler(armazem):
+    sessao = armazem.criar_sessao("teste")
+    gravada = g.Mensagem("user", "gravada nesta execução", "usuario")
+    armazem.gravar(sessao, 0, gravada)
+    armazem.sincronizar()
+
+    primeira = armazem.ler_mensagens(sessao, 0, 1)[0]
+    segunda = armazem.ler_mensagens(sessao, 0, 1)[0]
+
+    assert primeira.id == segunda.id == gravada.id
+    assert primeira is not segunda
+
+
+def test_armazem_id_novo_para_mensagens_de_outra_execucao(armazem, tmp_path):
+    sessao = armazem.criar_sessao("teste")
+    armazem.gravar(sessao, 0, g.Mensagem("user", "antiga", "usuario"))
+    armazem.fechar()
+
+    # Ids não vão para o banco: outra execução gera os seus, sempre os mesmos
+    outro = g.ArmazemConversas(str(tmp_path / "conversas.db"))
+    outro.abrir()
+    try:
+        primeira = outro.ler_mensagens(sessao, 0, 1)[0]
+        assert outro.ler_mensagens(sessao, 0, 1)[0].id == primeira.id
+        assert g.Mensagem("user").id != primeira.id
+    finally:
+        outro.fechar()
+
+
+# AgendadorGeracoes
+
+HOST = "http://127.0.0.1:11434"
+
+
+def esperar(condicao, segundos=5.0):
+    prazo = time.monotonic() + segundos
+    while not condicao() and time.monotonic() < prazo:
+        time.sleep(0.005)
+    return condicao()
+
+
+def na_fila(agendador, geracao, obtidas, url=HOST, ao_esperar=None):
+    def adquirir():
+        obtidas.append((geracao, agendador.adquirir(url, geracao, ao_esperar)))
+
+    thread = threading.Thread(target=adquirir, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_agendador_libera_vagas_na_ordem_da_fila():
+    agendador = g.AgendadorGeracoes(limite=1)
+    assert agendador.adquirir(HOST, g.Geracao())
+    geracoes, obtidas, threads = [g.Geracao() for _ in range(3)], [], []
+    for i, geracao in enumerate(geracoes, 1):
+        threads.append(na_fila(agendador, geracao, obtidas))
+        assert esperar(lambda: agendador.ocupacao(HOST) == (1, i))
+
+    for i in range(1, 4):
+        agendador.liberar(HOST)
+        assert esperar(lambda: len(obtidas) == i)
+        assert agendador.ocupacao(HOST) == (1, 3 - i)
+    for thread in threads:
+        thread.join(1)
+
+    assert obtidas == [(geracao, True) for geracao in geracoes]
+
+
+def test_agendador_avisa_quantas_estao_na_frente():
+    agendador = g.AgendadorGeracoes(limite=1)
+    avisos = []
+    assert agendador.adquirir(HOST, g.Geracao(), avisos.append)
+    na_fila(agendador, g.Geracao(), [], ao_esperar=avisos.append)
+    assert esperar(lambda: avisos == [0])
+    na_fila(agendador, g.Geracao(), [], ao_esperar=avisos.append)
+
+    assert esperar(lambda: avisos == [0, 1])
+
+
+def test_agendador_cancelar_tira_da_fila():
+    agendador = g.AgendadorGeracoes(limite=1)
+    assert agendador.adquirir(HOST, g.Geracao())
+    primeira, segunda, obtidas = g.Geracao(), g.Geracao(), []
+    thread = na_fila(agendador, primeira, obtidas)
+    assert esperar(lambda: agendador.ocupacao(HOST) == (1, 1))
+    na_fila(agendador, segunda, obtidas)
+    assert esperar(lambda: agendador.ocupacao(HOST) == (1, 2))
+
+    inicio = time.perf_counter()
+    agendador.cancelar(primeira)
+    thread.join(1)
+
+    # Sai na hora, sem ocupar vaga nem segurar quem estava atrás
+    assert obtidas == [(primeira, False)]
+    assert time.perf_counter() - inicio < 0.4
+    assert agendador.ocupacao(HOST) == (1, 1)
+    agendador.liberar(HOST)
+    assert esperar(lambda: obtidas == [(primeira, False), (segunda, True)])
+
+
+def test_agendador_definir_limite_acorda_quem_espera():
+    agendador = g.AgendadorGeracoes(limite=1)
+    assert agendador.adquirir(HOST, g.Geracao())
+    obtidas = []
+    na_fila(agendador, g.Geracao(), obtidas)
+    assert esperar(lambda: agendador.ocupacao(HOST) == (1, 1))
+
+    agendador.definir_limite(2)
+
+    assert esperar(lambda: len(obtidas) == 1)
+    assert agendador.ocupacao(HOST) == (2, 0)
+    agendador.definir_limite(0)
+    assert agendador.limite == 1
+
+
+def test_agendador_limite_por_host():
+    agendador = g.AgendadorGeracoes(limite=1)
+    assert agendador.adquirir(HOST, g.Geracao())
+
+    # Outro host tem as próprias vagas; maiúsculas não fazem outro host
+    assert agendador.adquirir("http://outro:11434/api/chat", g.Geracao())
+    assert agendador.ocupacao("http://OUTRO:11434") == (1, 0)
+    assert agendador.ocupacao(HOST) == (1, 0)
+
+
+# PoolHosts.escolher
+
+A, B, C = "http://a:11434", "http://b:11434", "http://c:11434"
+
+
+def pool_sondado(sondagens, limite=2):
+    def sondar(url):
+        if isinstance(sondagens[url], Exception):
+            raise sondagens[url]
+        return sondagens[url]
+
+    pool = g.PoolHosts(g.AgendadorGeracoes(limite), sondar)
+    pool.definir(list(sondagens))
+    for estado in pool.estados():
+        pool.sondar(estado)
+    return pool
+
+
+def test_pool_prefere_host_com_o_modelo_carregado():
+    pool = pool_sondado({A: ([MODELO], []), B: ([MODELO], [MODELO]), C: ([MODELO], [])})
+
+    assert pool.escolher(MODELO) == B
+    assert pool.escolher(MODELO, excluir=[B]) == A
+
+
+def test_pool_prefere_o_menos_ocupado():
+    pool = pool_sondado({A: ([MODELO], []), B: ([MODELO], []), C: ([MODELO], [])})
+    pool.agendador.adquirir(A, g.Geracao())
+    pool.agendador.adquirir(B, g.Geracao())
+
+    assert pool.escolher(MODELO) == C
+
+
+def test_pool_host_lotado_so_se_nao_houver_outro():
+    pool = pool_sondado({A: ([MODELO], [MODELO]), B: ([MODELO], [])}, limite=1)
+    assert pool.escolher(MODELO) == A
+    pool.agendador.adquirir(A, g.Geracao())
+
+    # Modelo carregado não compensa esperar vaga
+    assert pool.escolher(MODELO) == B
+    pool.agendador.adquirir(B, g.Geracao())
+    assert pool.escolher(MODELO) == A
+
+
+def test_pool_ignora_host_fora_do_ar_ou_sem_o_modelo():
+    pool = pool_sondado({A: g.ErroTransporteError("recusada"), B: (["outro:7b"], []), C: ([MODELO], [])})
+
+    assert pool.escolher(MODELO) == C
+    assert pool.escolher(MODELO, excluir=[C]) == B
+    assert pool.escolher(MODELO, excluir=[B, C]) == A  # Nenhum saudável: tenta assim mesmo
+    assert pool.escolher(MODELO, excluir=[A, B, C]) is None
+
+
+# Aba de chat (Qt na plataforma offscreen)
+
+@pytest.fixture(scope="module")
+def app():
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PySide6.QtWidgets import QApplication
+    return QApplication.instance() or QApplication([])
+
+
+def processar(app, condicao=lambda: False, segundos=10.0):
+    prazo = time.monotonic() + segundos
+    while not condicao() and time.monotonic() < prazo:
+        app.processEvents()
+        time.sleep(0.005)
+
+
+@pytest.fixture
+def interface(app, simulador, tmp_path):
+    servidor = simulador(tokens_por_segundo=40, tokens_resposta=30)
+    janela = g.InterfaceOllama(caminho_conversas=str(tmp_path / "conversas.db"))
+    janela.preaquecer_modelos = False
+    janela.entrada_host.setText(servidor.url)
+    janela.atualizar_modelos()
+    processar(app, lambda: janela.armazem is not None and janela.modelos_disponiveis)
+    yield janela
+    janela.close()
+
+
+def conversa_gravada(armazem, mensagens: int) -> int:
+    sessao = armazem.criar_sessao("longa", MODELO)
+    for posicao in range(mensagens):
+        papel, tipo = ("user", "usuario") if posicao % 2 == 0 else ("assistant", "modelo")
+        mensagem = g.Mensagem(papel, f"mensagem {posicao}", tipo)
+        mensagem.aberta = False
+        armazem.gravar(sessao, posicao, mensagem)
+    armazem.sincronizar()
+    return sessao
+
+
+def enviar(interface, aba, texto):
+    interface.abas.setCurrentWidget(aba)
+    aba.modelo = MODELO
+    interface.entrada_usuario.setPlainText(texto)
+    interface.ao_clicar_enviar()
+
+
+def ultima(aba) -> g.Mensagem:
+    return aba.modelo_chat.mensagem(aba.modelo_chat.rowCount() - 1)
+
+
+# Com esperar_resposta=False o salto acontece antes de a pergunta ser exibida
+@pytest.mark.parametrize("esperar_resposta", [True, False])
+def test_resultado_de_busca_durante_a_resposta_nao_a_interrompe(app, interface, esperar_resposta):
+    sessao = conversa_gravada(interface.armazem, 120)
+    aba = interface.abrir_sessao(sessao)
+    enviar(interface, aba, "pergunta")
+    if esperar_resposta:
+        processar(app, lambda: ultima(aba).papel == "assistant" and ultima(aba).conteudo)
+
+    interface.ir_para_mensagem(sessao, 5)
+    assert aba.modelo_chat.posteriores
+    processar(app, lambda: aba.estado == g.AbaChat.OCIOSA)
+
+    assert not aba.geracao_atual.cancelada
+    aba.ir_para_fim_chat()
+    resposta = ultima(aba)
+    assert resposta.papel == "assistant" and not resposta.aberta
+    assert len(resposta.conteudo.split()) == 30
+    assert resposta.id in aba.posicao_historico
+    interface.armazem.sincronizar()
+    gravadas = interface.armazem.ler_mensagens(sessao, 120, 123)
+    assert [m.conteudo for m in gravadas] == ["pergunta", resposta.conteudo]
+
+
+def test_enviar_com_resultado_de_busca_aberto(app, interface):
+    sessao = conversa_gravada(interface.armazem, 120)
+    aba = interface.abrir_sessao(sessao)
+    interface.ir_para_mensagem(sessao, 5)
+    assert aba.modelo_chat.posteriores
+
+    enviar(interface, aba, "depois da busca")
+    processar(app, lambda: aba.estado == g.AbaChat.OCIOSA and not ultima(aba).aberta)
+
+    assert not aba.geracao_atual.cancelada
+    assert aba.modelo_chat.posteriores == 0
+    pergunta = aba.modelo_chat.mensagem(aba.modelo_chat.rowCount() - 2)
+    assert pergunta.conteudo == "depois da busca"
+    assert len(ultima(aba).conteudo.split()) == 30
+    assert aba.modelo_chat.anteriores + aba.modelo_chat.rowCount() == 122
+
+
+def test_conversa_reaberta_envia_o_que_cabe_no_orcamento(app, interface):
+    sessao = conversa_gravada(interface.armazem, 120)
+    aba = interface.abrir_sessao(sessao)
+
+    # Só a última página é exibida, mas o histórico inteiro cabe no orçamento
+    assert aba.modelo_chat.rowCount() == g.LOTE_ARQUIVO_CHAT
+    assert [m.conteudo for m in aba.historico_chat] == [f"mensagem {i}" for i in range(120)]
+    mensagens = aba.contexto.preparar(aba.historico_chat)[0]
+    assert len(mensagens) == 120
+
+
+def test_conversa_reaberta_le_do_banco_ate_encher_o_orcamento(app, interface):
+    sessao = interface.armazem.criar_sessao("longa", MODELO)
+    for posicao in range(300):
+        papel = "user" if posicao % 2 == 0 else "assistant"
+        interface.armazem.gravar(sessao, posicao, g.Mensagem(papel, f"{posicao} " + "x" * 396, "info"))
+    interface.armazem.sincronizar()
+    interface.aba.contexto.orcamento = 8000  # ~77 mensagens de ~104 tokens
+
+    aba = interface.abrir_sessao(sessao)
+
+    _, janela, omitidas, _ = aba.contexto._janela(aba.historico_chat)
+    assert len(janela) > g.LOTE_ARQUIVO_CHAT
+    assert omitidas  # Parou de ler logo depois de encher o orçamento
+    assert len(aba.historico_chat) < 300
+    assert aba.historico_chat[-1].conteudo.startswith("299 ")
+
+
+# Repetição em outro host do pool (gerar_resposta_ia)
+
+def com_pool(interface, urls):
+    # Sondagem sempre bem-sucedida: a escolha segue a ordem dos hosts
+    interface.pool.sondar_host = lambda url: ([MODELO], [])
+    interface.pool.definir(urls)
+
+
+def test_repete_em_outro_host_antes_do_primeiro_token(app, interface, simulador):
+    servidor = simulador(tokens_por_segundo=1000, tokens_resposta=10)
+    com_pool(interface, ["http://127.0.0.1:9", servidor.url])
+    aba = interface.aba
+
+    enviar(interface, aba, "pergunta")
+    processar(app, lambda: aba.estado == g.AbaChat.OCIOSA)
+    aba.buffer_chat.descarregar()
+
+    resposta = ultima(aba)
+    assert resposta.papel == "assistant" and not resposta.aberta
+    assert len(resposta.conteudo.split()) == 10
+    assert servidor.contadores.get("respostas_completas") == 1
+
+
+def test_nao_repete_depois_do_primeiro_token(app, interface, simulador):
+    falho = simulador(tokens_por_segundo=1000, tokens_resposta=10, desconectar_apos=3)
+    reserva = simulador(tokens_por_segundo=1000, tokens_resposta=10)
+    com_pool(interface, [falho.url, reserva.url])
+    aba = interface.aba
+
+    enviar(interface, aba, "pergunta")
+    processar(app, lambda: aba.estado == g.AbaChat.OCIOSA)
+    aba.buffer_chat.descarregar()
+
+    # O texto parcial fica e o erro aparece; o outro host não é chamado
+    assert falho.contadores.get("desconexoes_simuladas") == 1
+    assert not reserva.contadores.get("respostas_completas")
+    mensagens = [aba.modelo_chat.mensagem(i) for i in range(aba.modelo_chat.rowCount())]
+    assert [m.tipo for m in mensagens] == ["usuario", "modelo", "erro"]
+    assert len(mensagens[1].conteudo.split()) == 3
+    assert "encerrada" in mensagens[2].conteudo
+
+
+# Índice de busca e gravação em lote do ArmazemConversas
+
+def indexadas(armazem, palavra: str) -> list:
+    conexao = sqlite3.connect(armazem.caminho)
+    try:
+        return [rowid for (rowid,) in conexao.execute(
+            "SELECT rowid FROM busca WHERE busca MATCH ? ORDER BY rowid", (palavra,))]
+    finally:
+        conexao.close()
+
+
+def test_busca_acompanha_a_resposta_regravada(armazem):
+    sessao = armazem.criar_sessao("teste")
+    armazem.gravar(sessao, 0, g.Mensagem("user", "pergunta sobre girassóis", "usuario"))
+    resposta = g.Mensagem("assistant", "esboço inicial", "modelo")
+    armazem.gravar(sessao, 1, resposta)
+    armazem.sincronizar()
+    assert [r[:2] for r in armazem.buscar("esboço")] == [(sessao, 1)]
+
+    resposta.conteudo = "texto definitivo"
+    armazem.gravar(sessao, 1, resposta)
+    armazem.sincronizar()
+
+    # A versão anterior sai do índice: nada de resultados antigos
+    assert armazem.buscar("esboço") == []
+    assert indexadas(armazem, "esboço") == []
+    assert [r[:2] for r in armazem.buscar("definitivo")] == [(sessao, 1)]
+    assert [r[:2] for r in armazem.buscar("girassois")] == [(sessao, 0)]  # Sem acentos
+
+
+def test_busca_ignora_mensagens_que_nao_sao_da_conversa(armazem):
+    sessao = armazem.criar_sessao("teste")
+    armazem.gravar(sessao, 0, g.Mensagem(None, "aviso do sistema", "info"))
+    armazem.sincronizar()
+
+    assert armazem.buscar("aviso") == []
+
+
+def test_excluir_sessao_tira_do_indice(armazem):
+    sessao = armazem.criar_sessao("apagar")
+    outra = armazem.criar_sessao("manter")
+    armazem.gravar(sessao, 0, g.Mensagem("user", "palavra comum", "usuario"))
+    armazem.gravar(outra, 0, g.Mensagem("user", "palavra comum", "usuario"))
+    armazem.sincronizar()
+    assert len(armazem.buscar("palavra")) == 2
+
+    armazem.excluir_sessao(sessao)
+    armazem.sincronizar()
+
+    assert [r[:2] for r in armazem.buscar("palavra")] == [(outra, 0)]
+    assert indexadas(armazem, "palavra") == [outra << 32]
+
+
+def test_banco_anterior_ao_indice_e_indexado(tmp_path):
+    caminho = str(tmp_path / "conversas.db")
+    antigo = g.ArmazemConversas(caminho)
+    antigo.abrir()
+    sessoes = [antigo.criar_sessao(f"antiga {i}") for i in range(3)]
+    for sessao in sessoes:
+        antigo.gravar(sessao, 0, g.Mensagem("user", f"pergunta antiga {sessao}", "usuario"))
+    antigo.fechar()
+    conexao = sqlite3.connect(caminho)
+    conexao.executescript("DROP TABLE busca; DROP TABLE busca_pendente;")
+    conexao.close()
+
+    armazem = g.ArmazemConversas(caminho)
+    armazem.abrir()
+    try:
+        nova = armazem.criar_sessao("nova")
+        armazem.gravar(nova, 0, g.Mensagem("user", "pergunta nova", "usuario"))
+        armazem.sincronizar()
+        prazo = time.monotonic() + 5
+        while len(armazem.buscar("pergunta")) < 4 and time.monotonic() < prazo:
+            time.sleep(0.01)
+
+        assert sorted(r[0] for r in armazem.buscar("pergunta")) == sessoes + [nova]
+        assert indexadas(armazem, "antiga") == [sessao << 32 for sessao in sessoes]
+        assert armazem._conexao.execute("SELECT COUNT(*) FROM busca_pendente").fetchone()[0] == 0
+    finally:
+        armazem.fechar()
+
+
+def test_gravacao_junta_versoes_da_mesma_mensagem(armazem, monkeypatch):
+    gravados = []
+    gravar_mensagem = armazem._gravar_mensagem
+    monkeypatch.setattr(armazem, "_gravar_mensagem",
+                        lambda conexao, registro: (gravados.append(registro["conteudo"]),
+                                                   gravar_mensagem(conexao, registro)))
+    sessao = armazem.criar_sessao("teste")
+    resposta = g.Mensagem("assistant", "", "modelo")
+
+    # Uma resposta em streaming: várias versões dentro do mesmo intervalo
+    for i in range(50):
+        resposta.conteudo += f"parte{i} "
+        armazem.gravar(sessao, 0, resposta)
+    armazem.sincronizar()
+
+    assert gravados == [resposta.conteudo]
+    assert armazem.ler_mensagens(sessao, 0, 1)[0].conteudo == resposta.conteudo
+    assert armazem.listar_sessoes()[0][3] == 1
+    assert indexadas(armazem, "parte49") == [sessao << 32]